@@ -20,6 +20,7 @@ ui_options = {'dark_mode' : True, # Dark mode: Renders the UI dark if enabled
               'enable_loading_buttons' : True,
               'window_pos': (100, 100), # position of the main window on the screen, top left corner.
               'usb_webcam': False, # open USB web-camera in a separate window
+              'max_display_fps': 20, # camera window refresh rate: frames acquired faster are not displayed (the newest one is)
                }
 
 logging_level = 'INFO' # 'DEBUG' for ultra-detailed, 'INFO' for general logging level
@@ -104,6 +105,10 @@ camera_parameters = {'x_pixels' : 1024,
                      'y_pixel_size_in_microns' : 6.5,
                      'subsampling' : [1,2,4]}
 
+The DemoCamera generates sample-like frames with shot noise from precomputed buffers (more than 1000 fps at 2048x2048),
+e.g. to benchmark the image writer. Optional parameters: 'demo_fps' (maximum frame rate, 0 for no limit),
+'demo_bit_depth' (e.g. 12 or 16) and 'demo_seed' (random seed, the same seed gives the same frames).
+
 For a Hamamatsu Orca Flash 4.0 V2 or V3, the following parameters are necessary:
 
 camera_parameters = {'x_pixels' : 2048,
@@ -175,6 +180,9 @@ camera_parameters = {'x_pixels' : 1024,
                      'trigger_mode' : 1, # it is unclear if this is the external lightsheeet mode - how to check this?
                      'trigger_polarity' : 2, # positive pulse
                      'trigger_source' : 2, # external
+                     'demo_fps' : 0, # DemoCamera only: maximum frame rate, 0 for no limit
+                     'demo_bit_depth' : 16, # DemoCamera only
+                     'demo_seed' : 0, # DemoCamera only: random seed of the synthetic frames
                     }
 
 binning_dict = {'1x1': (1,1), '2x2':(2,2), '4x4':(4,4)}
@@ -325,10 +333,130 @@ Imaris can open these files if no subsampling and no compression is used.
 '''
 hdf5 = {'subsamp': ((1, 1, 1),), #((1, 1, 1),) no subsamp, ((1, 1, 1), (1, 4, 4)) for 2-level (z,y,x) subsamp.
         'compression': None, # None, 'gzip', 'lzf'
+        'compression_workers': 4, # 0: serial compression, >0: number of threads compressing 'gzip' chunks in parallel
         'flip_xyz': (True, True, False),  # match BigStitcher coordinates to mesoSPIM axes.
         'transpose_xy': False, # Flip X vs Y axes
         }
 
+'''
+OME-Zarr parameters, if this format (.zarr) is used for data saving (optional).
+Requires zarr package: pip install "zarr<3"
+Each view (tile, channel, illumination, angle) is saved as a multiscale image, pyramid levels are computed during acquisition.
+Full-resolution planes are buffered in RAM until a z-chunk is complete: chunks[0] * x_pixels * y_pixels * 2 bytes.
+'''
+zarr = {'chunks': (16, 256, 256), # (z,y,x) chunk size of the full-resolution level
+        'levels': 4, # number of pyramid levels, including full resolution
+        'downsampling': (2, 2, 2), # (z,y,x) downsampling factors between consecutive levels
+        'compression': 'zstd', # None, 'zstd', 'lz4', 'blosclz'
+        'clevel': 3, # compression level
+        }
+
+'''
+Image writer parameters (optional).
+Opt-in: if 'async_writing' is True, frames are passed from the camera thread to a separate writer thread
+through a bounded queue, so that disk hiccups do not stall frame retrieval from the camera.
+By default (False), frames are written in the camera thread.
+If the queue is full, the camera thread waits for the writer (backpressure statistics are saved in the metadata file).
+Each queued frame takes x_pixels * y_pixels * 2 bytes of RAM, the frame buffers are recycled (at most queue_depth + 2 are allocated).
+The .raw files are preallocated and written sequentially frame by frame.
+TIFF frames are collected in batches of 'tiff_batch_size' frames (x_pixels * y_pixels * 2 bytes each)
+and written with a single call, the TIFF headers and ImageJ metadata are written once per file.
+Opt-in: with 'disk_benchmark_mb' > 0 (e.g. 256), the sustained write speed of the target disks is tested once per session
+before an acquisition list is started, and compared to the data rate (frame size / sweeptime, including the resolution
+levels of .h5 and .zarr files).
+If 'target_folders' are given, the files of an acquisition list are distributed over them (one subfolder named like the
+acquisition folder per target); a manifest <first file>_manifest.json in the acquisition folder lists the location of every file.
+'''
+writer_parameters = {'async_writing': False, # True: frames are written in a separate writer thread
+                     'queue_depth': 64, # max number of frames waiting to be written
+                     'raw_direct_io': False, # .raw files: bypass the OS file cache (O_DIRECT, Linux only)
+                     'tiff_batch_size': 16, # .tif/.btf files: number of frames written at once
+                     'disk_benchmark_mb': 0, # size of the pre-flight write test, run once per disk and session, 0 to skip
+                     'disk_speed_check': 'warn', # 'warn' or 'refuse' to start if a disk is slower than the data rate, 'off' to skip the test
+                     'target_folders': [], # e.g. ['D:/data', 'E:/data']: files are distributed over these disks, [] to write into the acquisition folders
+                     'striping': 'round_robin', # 'round_robin' or 'free_space': how files are distributed over the target folders
+                     }
+
+'''
+Background conversion of .raw stacks (optional).
+Every finished .raw stack is converted into a file of 'target_format' ('.h5', '.zarr', '.tiff' or '.btf') next to it,
+with the pyramid levels and compression of the hdf5 and zarr parameters above, while the next stacks are acquired.
+The conversions run in 'n_workers' processes at low priority, each reading at most 'max_read_mb_s' (0: no limit),
+and pause while the image writer queue is more than half full. The .raw files are kept.
+'''
+conversion = {'enabled': False,
+              'target_format': '.h5',
+              'n_workers': 1,
+              'max_read_mb_s': 200,
+              }
+
+'''
+Acquisition order planner (optional), 'Optimize Order' button of the Acquisition Manager.
+Estimated durations of the overhead between acquisitions, used to reorder the table.
+If 'keep_channel_order' is True, the acquisitions of every tile keep their order in the table.
+'''
+acquisition_planner = {'stage_speed_um_s': 2000,
+                       'rotation_speed_deg_s': 10,
+                       'rotation_s': 5, # fixed overhead of a rotation
+                       'filter_change_s': 1,
+                       'zoom_change_s': 3,
+                       'keep_channel_order': True,
+                       }
+
+'''
+Pipelined stack transitions: the stage move, filter and zoom change for the next stack start
+while the files of the previous stack are flushed and closed in the camera thread.
+The duration of each phase between stacks and the dead time are written to the log.
+Opt-in: set to True to enable, stack transitions are sequential by default.
+'''
+pipelined_stack_transitions = False
+
+'''
+Continuous stacks: the NI tasks are started once per stack, the camera and the stage are triggered at every sweep
+(pulse trains, the waveforms are regenerated) and the frames are collected while they arrive,
+instead of starting, waiting for and stopping the tasks and moving the stage for every plane.
+Requires stage steps by TTL ('TigerASI' stages with 'ttl_motion_enabled': True), simulated with the 'DemoStage'.
+The lasers stay enabled during the stack (as laser_blanking = 'stacks') and stacks cannot be paused, only stopped.
+Opt-in: set to True to enable, the planes are acquired one by one by default.
+'''
+continuous_stacks = False
+
+'''
+Timing trace (optional): the core, camera, image writer, waveform and serial workers record the duration
+of every phase (move, filter, snap, write, flush, close etc.) into a ring buffer of 'max_events' spans.
+The spans of each acquisition list are saved into the log folder as *_trace.json,
+which can be opened in https://ui.perfetto.dev or chrome://tracing.
+Opt-in: set 'enabled' to True to record the trace, nothing is recorded by default.
+'''
+timing_trace = {'enabled': False,
+                'max_events': 200000,
+                }
+
+'''
+Acquisition time prediction (optional): the duration of the acquisitions is predicted from the costs of every operation
+(time per plane, stage moves, rotations, filter and zoom changes, file closing), learned from the previous acquisitions
+for every stage and filter wheel type and file format. The costs are saved in 'history_file' (relative to the mesoSPIM folder,
+None: not saved). 'learning_rate' is the weight of the last acquisition in the learned averages.
+'''
+time_prediction = {'history_file': 'log/acquisition_time_history.json',
+                   'learning_rate': 0.2,
+                   }
+
+'''
+Remote control (optional): local HTTP server to queue acquisition lists, start, stop and pause them,
+change the state, move the stages and follow the progress from other programs (see src/mesoSPIM_RemoteControl.py).
+Keep 'host' at '127.0.0.1' unless the network is trusted; other hosts require a 'token'.
+If 'token' is set, requests need the header 'Authorization: Bearer <token>'.
+POST requests must be JSON (header 'Content-Type: application/json'), requests from web pages of other sites are refused.
+Frames are published downsampled to at most 'max_frame_size' pixels per side.
+'''
+remote_control = {'enabled': False,
+                  'host': '127.0.0.1',
+                  'port': 8642,
+                  'token': None,
+                  'max_frame_size': 512,
+                  }
+
 scale_galvo_amp_with_zoom = True # If e.g. 'galvo_l_amplitude' is defined at zoom '1x', rescale the amplitude when zoom is interactively changed
 
 '''                                                                  
@@ -18,7 +18,6 @@ import importlib.util
 from PyQt5 import QtWidgets
 package_directory = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(package_directory)) # this is critical for 'from mesoSPIM.src.mesoSPIM_MainWindow import mesoSPIM_MainWindow' to work in both script and package form.
-from mesoSPIM.src.mesoSPIM_MainWindow import mesoSPIM_MainWindow
 
 
 def load_config_UI(current_path):
@@ -87,6 +86,12 @@ def get_parser():
                         help='Start a ipython console')
     parser.add_argument('-D', '--demo', action='store_true',
                         help='Start in demo mode')
+    parser.add_argument('--config', default=None,
+                        help='Path of the config file, instead of choosing it')
+    parser.add_argument('--headless', default=None, metavar='TABLE',
+                        help='Run the saved acquisition table without user interface, then exit')
+    parser.add_argument('--resume', action='store_true',
+                        help='Headless mode: continue the acquisition table after the acquisitions finished in a previous run')
     return parser
 
 
@@ -110,20 +115,24 @@ def get_logger(cfg, package_directory):
     return logger
 
 
-def main(embed_console=False, demo_mode=False):
+def main(embed_console=False, demo_mode=False, config_path=None, headless_table=None, resume=False):
     """
     Load a configuration file according to the following rules:
-    1. If the user asked for demo mode, load the `demo_config.py` file
-    2. Else, ff the user did not ask for demo mode:
+    1. If the user gave a config file path, load that
+    2. If the user asked for demo mode, load the `demo_config.py` file
+    3. Else, ff the user did not ask for demo mode:
      - if there is only one non-demo config file, load that.
-     - if there are multiple config files, bring up the UI loader.
+     - if there are multiple config files, bring up the UI loader (not in headless mode).
     """
     print('Starting control software')
     demo_fname = os.path.join(package_directory, 'config', 'demo_config.py')
     if not os.path.exists(demo_fname):
         raise ValueError(f"Demo file not found: {demo_fname}")
 
-    if demo_mode:
+    if config_path is not None:
+        config_fname = config_path
+        cfg = load_config_from_file(config_fname)
+    elif demo_mode:
         config_fname = demo_fname
         cfg = load_config_from_file(config_fname)
     else:
@@ -135,10 +144,19 @@ def main(embed_console=False, demo_mode=False):
         elif len(all_configs_no_demo) == 1:
             config_fname = os.path.join(package_directory, all_configs_no_demo[0])
             cfg = load_config_from_file(config_fname)
+        elif headless_table is not None:
+            raise ValueError('Several config files found, please choose one with --config')
         else:
             cfg, config_fname = load_config_UI(os.path.join(package_directory, 'config'))
     logger = get_logger(cfg, package_directory)
     logger.info(f'Config file loaded: {config_fname}')
+
+    if headless_table is not None:
+        ''' The user interface modules are not loaded in headless mode '''
+        from mesoSPIM.src.mesoSPIM_Headless import run_headless
+        sys.exit(run_headless(package_directory, cfg, headless_table, resume))
+
+    from mesoSPIM.src.mesoSPIM_MainWindow import mesoSPIM_MainWindow
     app = QtWidgets.QApplication(sys.argv)
     dark_mode_check(cfg, app)
     stage_referencing_check(cfg)
@@ -160,7 +178,8 @@ def main(embed_console=False, demo_mode=False):
 
 def run():
     args = get_parser().parse_args()
-    main(embed_console=args.console, demo_mode=args.demo)
+    main(embed_console=args.console, demo_mode=args.demo, config_path=args.config,
+         headless_table=args.headless, resume=args.resume)
 
 
 if __name__ == '__main__':
@@ -278,6 +278,7 @@ class HamamatsuCamera(object):
         self.last_frame_number = 0
         self.properties = None
         self.max_backlog = 0
+        self.buffer_overruns = 0
         self.number_image_buffers = 0
 
         self.acquisition_mode = "run_till_abort"
@@ -639,6 +640,7 @@ class HamamatsuCamera(object):
         backlog = cur_frame_number - self.last_frame_number
         if (backlog > self.number_image_buffers):
             print(">> Warning! hamamatsu camera frame buffer overrun detected!")
+            self.buffer_overruns += backlog - self.number_image_buffers
         if (backlog > self.max_backlog):
             self.max_backlog = backlog
         self.last_frame_number = cur_frame_number
@@ -819,9 +821,12 @@ class HamamatsuCameraMR(HamamatsuCamera):
              is now shared there is the possibility that downstream code
              will try and access the same bit of memory at the same time
              as the camera and this could end badly.
-    FIXME: Use lockbits (and unlockbits) to avoid memory clashes?
-           This would probably also involve some kind of reference
-           counting scheme.
+    The camera writes into the buffers cyclically, it cannot skip buffers
+    still in use: mesoSPIM_Camera copies (rotates) every frame into a
+    reference counted frame buffer (utils/frame_ring.py) before calling
+    getFrames() again, so frames are only overwritten if the backlog
+    exceeds the number of buffers. These frames are counted in
+    buffer_overruns.
     """
     def __init__(self, **kwds):
         super().__init__(**kwds)
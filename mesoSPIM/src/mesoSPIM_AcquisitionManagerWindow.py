@@ -13,6 +13,7 @@ from PyQt5.uic import loadUi
 from .mesoSPIM_State import mesoSPIM_StateSingleton
 from .utils.utility_functions import format_data_size
 from .utils.models import AcquisitionModel
+from .utils.acquisitions import AcquisitionList
 
 from .utils.delegates import (ComboDelegate,
                         SliderDelegate,
@@ -34,6 +35,7 @@ from .utils.filename_wizard import FilenameWizard
 from .utils.focus_tracking_wizard import FocusTrackingWizard
 from .utils.image_processing_wizard import ImageProcessingWizard
 from .utils.utility_functions import convert_seconds_to_string
+from .utils.acquisition_planner import optimize_acquisition_list, get_costs
 
 logger = logging.getLogger(__name__)
 
@@ -126,6 +128,7 @@ class mesoSPIM_AcquisitionManagerWindow(QtWidgets.QWidget):
         self.DeleteAllButton.clicked.connect(self.delete_all_rows)
         # self.SetRotationPointButton.clicked.connect(lambda bool: self.set_rotation_point() if bool is True else self.delete_rotation_point())
         self.SetFoldersButton.clicked.connect(self.set_folder_names)
+        self.OptimizeOrderButton.clicked.connect(self.optimize_acquisition_order)
 
         font = QtGui.QFont()
         font.setPointSize(14)
@@ -292,8 +295,9 @@ class mesoSPIM_AcquisitionManagerWindow(QtWidgets.QWidget):
             exec(string_to_execute)
 
     def update_acquisition_time_prediction(self):
+        ''' Learned from the previous acquisitions: moves, filter and zoom changes, file closing, see utils/time_prediction.py '''
         framerate = self.state['current_framerate']
-        total_time = self.state['acq_list'].get_acquisition_time(framerate)
+        total_time = float(self.parent.core.time_predictor.predict(self.state['acq_list'], framerate).sum())
         self.state['predicted_acq_list_time'] = total_time
         self.state['remaining_acq_list_time'] = total_time
         time_string = convert_seconds_to_string(total_time)
@@ -335,6 +339,35 @@ class mesoSPIM_AcquisitionManagerWindow(QtWidgets.QWidget):
             except:
                 self.sig_warning.emit('Table cannot be loaded - incompatible file format (Probably created by a previous version of the mesoSPIM software)!')
 
+    def optimize_acquisition_order(self):
+        '''
+        Plans an acquisition order with less overhead (rotations, filter and zoom changes, stage travel),
+        displays the predicted time saved and reorders the table if the user clicks 'Yes'
+        '''
+        keep_channel_order = self.cfg.acquisition_planner.get('keep_channel_order', True) if hasattr(self.cfg, 'acquisition_planner') else True
+        acq_list = self.model.get_acquisition_list()
+        planned_list, overhead_before, overhead_after = optimize_acquisition_list(acq_list, get_costs(self.cfg), keep_channel_order)
+        if planned_list is acq_list:
+            QtWidgets.QMessageBox.information(self, 'mesoSPIM Acquisition Order',
+                    f'No better acquisition order found, estimated overhead: {convert_seconds_to_string(overhead_before)}')
+            return
+        reply = QtWidgets.QMessageBox.question(self, 'mesoSPIM Acquisition Order',
+                f'Estimated overhead (rotations, filter and zoom changes, stage travel): \n'
+                f'Current order: {convert_seconds_to_string(overhead_before)} \n'
+                f'Optimized order: {convert_seconds_to_string(overhead_after)} \n'
+                f'Time saved: {convert_seconds_to_string(overhead_before - overhead_after)} \n\n'
+                f'Do you want to reorder the table?',
+                QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No)
+        if reply == QtWidgets.QMessageBox.Yes:
+            self.set_acquisition_list(planned_list)
+
+    @QtCore.pyqtSlot(AcquisitionList)
+    def set_acquisition_list(self, acq_list):
+        '''Replaces the table, e.g. by the reordered list or a list sent by the remote control'''
+        self.model.setTable(acq_list)
+        self.set_state()
+        self.update_acquisition_time_prediction()
+
     def run_tiling_wizard(self):
         wizard = MulticolorTilingWizard(self)
 
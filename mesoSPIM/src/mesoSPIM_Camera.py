@@ -3,6 +3,7 @@ mesoSPIM Camera class, intended to run in its own thread
 '''
 
 import time
+import threading
 import numpy as np
 
 import logging
@@ -18,6 +19,9 @@ except:
 from .mesoSPIM_State import mesoSPIM_StateSingleton
 from .mesoSPIM_ImageWriter import mesoSPIM_ImageWriter
 from .utils.acquisitions import AcquisitionList, Acquisition
+from .utils.timing_trace import trace
+from .utils.synthetic_frames import SyntheticFrameSource
+from .utils.frame_path import rotate_frame, downsample_frame, DisplayGovernor, MAX_DISPLAY_FPS
 
 
 class mesoSPIM_Camera(QtCore.QObject):
@@ -26,6 +30,7 @@ class mesoSPIM_Camera(QtCore.QObject):
     sig_finished = QtCore.pyqtSignal()
     sig_update_gui_from_state = QtCore.pyqtSignal(bool)
     sig_status_message = QtCore.pyqtSignal(str)
+    sig_frames_collected = QtCore.pyqtSignal(int) # continuous stacks: frames of the stack collected so far
 
     def __init__(self, parent = None):
         super().__init__()
@@ -36,6 +41,9 @@ class mesoSPIM_Camera(QtCore.QObject):
         self.state = mesoSPIM_StateSingleton()
         self.image_writer = mesoSPIM_ImageWriter(self)
         self.stopflag = False
+        ''' Continuous stacks: set by the core (in its thread) to stop collecting frames '''
+        self.collect_stop_event = threading.Event()
+        self.end_image_series_duration = 0
 
         self.x_pixels = self.cfg.camera_parameters['x_pixels']
         self.y_pixels = self.cfg.camera_parameters['y_pixels']
@@ -54,15 +62,25 @@ class mesoSPIM_Camera(QtCore.QObject):
 
         self.camera_display_live_subsampling = self.cfg.startup['camera_display_live_subsampling']
         self.camera_display_acquisition_subsampling = self.cfg.startup['camera_display_acquisition_subsampling']
+        ''' Display frame rate limit, the camera window acknowledges displayed frames (see mesoSPIM_Core) '''
+        if hasattr(self.cfg, 'ui_options'):
+            max_display_fps = self.cfg.ui_options.get('max_display_fps', MAX_DISPLAY_FPS)
+        else:
+            max_display_fps = MAX_DISPLAY_FPS
+        self.display_governor = DisplayGovernor(max_display_fps)
 
         ''' Wiring signals '''
         self.parent.sig_state_request.connect(self.state_request_handler) # from mesoSPIM_Core() to mesoSPIM_Camera()
         self.parent.sig_prepare_image_series.connect(self.prepare_image_series, type=QtCore.Qt.BlockingQueuedConnection)
         self.parent.sig_add_images_to_image_series.connect(self.add_images_to_series)
         self.parent.sig_add_images_to_image_series_and_wait_until_done.connect(self.add_images_to_series, type=QtCore.Qt.BlockingQueuedConnection)
+        self.parent.sig_collect_images_in_series.connect(self.collect_images_in_series, type=QtCore.Qt.QueuedConnection)
         self.parent.sig_write_metadata.connect(self.image_writer.write_metadata, type=QtCore.Qt.QueuedConnection)
         # The following connection can cause problems when disk is too slow (e.g. writing TIFF files on HDD drive):
         self.parent.sig_end_image_series.connect(self.end_image_series, type=QtCore.Qt.BlockingQueuedConnection)
+        ''' Pipelined stack transitions: the series is closed while the core prepares the next stack '''
+        self.parent.sig_end_image_series_nowait.connect(self.end_image_series, type=QtCore.Qt.QueuedConnection)
+        self.parent.sig_wait_until_camera_done.connect(self.wait_until_done, type=QtCore.Qt.BlockingQueuedConnection)
 
         self.parent.sig_prepare_live.connect(self.prepare_live, type=QtCore.Qt.BlockingQueuedConnection)
         self.parent.sig_get_live_image.connect(self.get_live_image)
@@ -155,6 +173,7 @@ class mesoSPIM_Camera(QtCore.QObject):
         Row is a row in a AcquisitionList
         '''
         logger.info('Camera: Preparing Image Series')
+        t_start = time.perf_counter()
         self.stopflag = False
 
         self.image_writer.prepare_acquisition(acq, acq_list)
@@ -164,7 +183,9 @@ class mesoSPIM_Camera(QtCore.QObject):
 
         self.camera.initialize_image_series()
         self.cur_image = 0
+        self.display_governor.reset_statistics()
         logger.info(f'Camera: Finished Preparing Image Series')
+        trace.add_span('prepare', 'camera', t_start, filename=acq['filename'])
         self.start_time = time.time()
 
     @QtCore.pyqtSlot(Acquisition, AcquisitionList)
@@ -174,35 +195,64 @@ class mesoSPIM_Camera(QtCore.QObject):
 
         if self.stopflag is False:
             if self.cur_image < self.max_frame:
-                images = self.camera.get_images_in_series()
+                with trace.span('get images', 'camera'):
+                    images = self.camera.get_images_in_series()
                 for image in images:
-                    image = np.rot90(image)
-                    self.sig_camera_frame.emit(image[0:self.x_pixels:self.camera_display_acquisition_subsampling,
-                                               0:self.y_pixels:self.camera_display_acquisition_subsampling])
-                    self.image_writer.write_image(image, acq, acq_list)
+                    ''' Rotated once into a recycled frame buffer, the display frame is subsampled from it.
+                    The frame is handed over to the writer without copy, which releases it once written '''
+                    frame = self.image_writer.acquire_frame(image.shape[::-1], image.dtype)
+                    rotate_frame(image, out=frame.data)
+                    if self.display_governor.is_due(force=self.cur_image == self.max_frame - 1):
+                        self.sig_camera_frame.emit(downsample_frame(frame.data, self.camera_display_acquisition_subsampling))
+                    self.image_writer.write_image(frame, acq, acq_list)
                     self.cur_image += 1
 
+    @QtCore.pyqtSlot(Acquisition, AcquisitionList)
+    def collect_images_in_series(self, acq, acq_list):
+        ''' Continuous stacks: the frames are collected while the hardware triggers them, until the stack is
+        complete or the core sets collect_stop_event. The number of frames is reported to the core by
+        sig_frames_collected. The slots queued meanwhile (e.g. end_image_series) run afterwards. '''
+        t_start = time.perf_counter()
+        while not self.collect_stop_event.is_set() and self.stopflag is False and self.cur_image < self.max_frame:
+            n_frames = self.cur_image
+            self.add_images_to_series(acq, acq_list)
+            if self.cur_image > n_frames:
+                self.sig_frames_collected.emit(self.cur_image)
+        if self.collect_stop_event.is_set():
+            self.stopflag = True
+        trace.add_span('collect images', 'camera', t_start, filename=acq['filename'], planes=self.cur_image)
+
     @QtCore.pyqtSlot(Acquisition, AcquisitionList)
     def end_image_series(self, acq, acq_list):
         logger.info("end_image_series() started")
+        t_start = time.perf_counter()
         try:
-            self.camera.close_image_series()
+            with trace.span('close', 'camera'):
+                self.camera.close_image_series()
             logger.info("self.camera.close_image_series()")
         except Exception as e:
             logger.error(f'Camera: Image Series could not be closed: {e}')
 
         self.image_writer.end_acquisition(acq, acq_list)
+        self.end_image_series_duration = time.perf_counter() - t_start
+        trace.add_span('end image series', 'camera', t_start, self.end_image_series_duration, filename=acq['filename'])
 
         self.end_time = time.time()
         framerate = (self.cur_image + 1)/(self.end_time - self.start_time)
-        logger.info(f'Camera: Framerate: {framerate:.2f}')
+        logger.info(f'Camera: Framerate: {framerate:.2f}, {self.display_governor.get_summary()}')
         self.sig_finished.emit()
 
+    @QtCore.pyqtSlot()
+    def wait_until_done(self):
+        ''' Called by a blocking signal: returns when all requests queued before it (e.g. end_image_series) are done '''
+        pass
+
     @QtCore.pyqtSlot(bool)
     def snap_image(self, write_flag=True):
         """"Snap an image and display it"""
         image = self.camera.get_image()
-        image = np.rot90(image)[::self.camera_display_acquisition_subsampling, ::self.camera_display_acquisition_subsampling]
+        image = downsample_frame(np.rot90(image), self.camera_display_acquisition_subsampling)
+        self.display_governor.is_due(force=True)
         self.sig_camera_frame.emit(image)
         if write_flag:
             self.image_writer.write_snap_image(image)
@@ -211,6 +261,7 @@ class mesoSPIM_Camera(QtCore.QObject):
     def prepare_live(self):
         self.camera.initialize_live_mode()
         self.live_image_count = 0
+        self.display_governor.reset_statistics()
         self.start_time = time.time()
         logger.info('Camera: Preparing Live Mode')
 
@@ -219,10 +270,9 @@ class mesoSPIM_Camera(QtCore.QObject):
         images = self.camera.get_live_image()
 
         for image in images:
-            image = np.rot90(image)
-
-            self.sig_camera_frame.emit(image[0:self.x_pixels:self.camera_display_live_subsampling,
-                                       0:self.y_pixels:self.camera_display_live_subsampling])
+            ''' Live frames are only displayed: the subsampled pixels are rotated, not the full frame '''
+            if self.display_governor.is_due():
+                self.sig_camera_frame.emit(downsample_frame(np.rot90(image), self.camera_display_live_subsampling))
             self.live_image_count += 1
             #self.sig_camera_status.emit(str(self.live_image_count))
 
@@ -231,7 +281,7 @@ class mesoSPIM_Camera(QtCore.QObject):
         self.camera.close_live_mode()
         self.end_time = time.time()
         framerate = (self.live_image_count + 1)/(self.end_time - self.start_time)
-        logger.info(f'Camera: Finished Live Mode: Framerate: {framerate:.2f}')
+        logger.info(f'Camera: Finished Live Mode: Framerate: {framerate:.2f}, {self.display_governor.get_summary()}')
 
 
 class mesoSPIM_GenericCamera(QtCore.QObject):
@@ -305,13 +355,16 @@ class mesoSPIM_GenericCamera(QtCore.QObject):
 
 
 class mesoSPIM_DemoCamera(mesoSPIM_GenericCamera):
+    ''' Synthetic frames (utils/synthetic_frames.py), optionally paced at camera_parameters['demo_fps'] '''
     def __init__(self, parent = None):
         super().__init__(parent)
 
-        self.count = 0
-
-        self.line = np.linspace(0,6*np.pi,self.x_pixels)
-        self.line = 400*np.sin(self.line)+1200
+        self.fps = self.cfg.camera_parameters.get('demo_fps', 0)
+        self.bit_depth = self.cfg.camera_parameters.get('demo_bit_depth', 16)
+        self.seed = self.cfg.camera_parameters.get('demo_seed', 0)
+        self.next_frame_time = 0
+        self.trigger_period = 0
+        self.create_frame_source()
 
     def open_camera(self):
         logger.info('Initialized Demo Camera')
@@ -324,17 +377,31 @@ class mesoSPIM_DemoCamera(mesoSPIM_GenericCamera):
         self.y_binning = int(binning_string[2])
         self.x_pixels = int(self.x_pixels / self.x_binning)
         self.y_pixels = int(self.y_pixels / self.y_binning)
-        ''' Changing the number of pixels also affects the random image, so we need to update self.line '''
-        self.line = np.linspace(0,6*np.pi,self.x_pixels)
-        self.line = 400*np.sin(self.line)+1200
+        ''' Changing the number of pixels also affects the synthetic frames, so we need to update them '''
+        self.create_frame_source()
         self.state['camera_binning'] = str(self.x_binning)+'x'+str(self.y_binning)
 
+    def create_frame_source(self):
+        self.frame_source = SyntheticFrameSource((self.y_pixels, self.x_pixels), bit_depth=self.bit_depth, seed=self.seed)
+
     def _create_random_image(self):
-        data = np.array([np.roll(self.line, 4*i+self.count) for i in range(0, self.y_pixels)], dtype='uint16')
-        data = data + (np.random.normal(size=(self.x_pixels, self.y_pixels))*100)
-        data = np.around(data).astype('uint16')
-        self.count += 20
-        return data
+        ''' With a frame rate, frames are returned at most every 1/fps s, like a free-running camera,
+        and in series at most one frame per sweep, like a triggered camera '''
+        period = max(1 / self.fps if self.fps > 0 else 0, self.trigger_period)
+        if period > 0:
+            delay = self.next_frame_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            ''' Frames at a fixed period, unless frames were missed because the caller was late '''
+            now = time.perf_counter()
+            self.next_frame_time = (self.next_frame_time if now - self.next_frame_time < period else now) + period
+        return self.frame_source.get_frame()
+
+    def initialize_image_series(self):
+        self.trigger_period = self.state['sweeptime']
+
+    def close_image_series(self):
+        self.trigger_period = 0
 
     def get_images_in_series(self):
         return [self._create_random_image()]
@@ -410,6 +477,9 @@ class mesoSPIM_HamamatsuCamera(mesoSPIM_GenericCamera):
 
     def close_image_series(self):
         self.hcam.stopAcquisition()
+        if self.hcam.buffer_overruns > 0:
+            logger.warning(f'Hamamatsu camera: {self.hcam.buffer_overruns} frames overwritten in the camera buffers before they were read')
+            self.hcam.buffer_overruns = 0
 
     def get_image(self):
         [frames, _] = self.hcam.getFrames()
@@ -15,6 +15,7 @@ logger = logging.getLogger(__name__)
 class mesoSPIM_CameraWindow(QtWidgets.QWidget):
     sig_update_roi = QtCore.pyqtSignal(tuple)
     sig_update_status = QtCore.pyqtSignal()
+    sig_frame_displayed = QtCore.pyqtSignal()
 
     def __init__(self, parent=None):
         super().__init__()
@@ -152,4 +153,5 @@ class mesoSPIM_CameraWindow(QtWidgets.QWidget):
             self.x_image_width, self.y_image_width = w, h
             self.vLine.setPos(self.x_image_width/2.), self.hLine.setPos(self.y_image_width/2.)
         self.draw_crosshairs()
+        self.sig_frame_displayed.emit()
 
@@ -8,6 +8,7 @@ import time
 import platform
 import io
 import traceback
+import numpy as np
 
 import logging
 logger = logging.getLogger(__name__)
@@ -37,6 +38,12 @@ from .mesoSPIM_Serial import mesoSPIM_Serial
 from .mesoSPIM_WaveFormGenerator import mesoSPIM_WaveFormGenerator, mesoSPIM_DemoWaveFormGenerator
 
 from .utils.acquisitions import AcquisitionList, Acquisition
+from .utils.acquisition_journal import AcquisitionJournal, get_journal_progress
+from .utils.disk_benchmark import measure_write_speed, get_required_write_speed
+from .utils.omezarr_writer import get_missing_packages
+from .utils.striping import stripe_acquisition_list, write_manifest, get_existing_parent
+from .utils.timing_trace import trace
+from .utils.time_prediction import AcquisitionTimePredictor
 from .utils.utility_functions import convert_seconds_to_string, format_data_size
 
 
@@ -60,7 +67,10 @@ class mesoSPIM_Core(QtCore.QObject):
     sig_prepare_image_series = QtCore.pyqtSignal(Acquisition, AcquisitionList)
     sig_add_images_to_image_series = QtCore.pyqtSignal(Acquisition, AcquisitionList)
     sig_add_images_to_image_series_and_wait_until_done = QtCore.pyqtSignal(Acquisition, AcquisitionList)
+    sig_collect_images_in_series = QtCore.pyqtSignal(Acquisition, AcquisitionList)
     sig_end_image_series = QtCore.pyqtSignal(Acquisition, AcquisitionList)
+    sig_end_image_series_nowait = QtCore.pyqtSignal(Acquisition, AcquisitionList)
+    sig_wait_until_camera_done = QtCore.pyqtSignal()
     sig_write_metadata = QtCore.pyqtSignal(Acquisition, AcquisitionList)
 
     sig_prepare_live = QtCore.pyqtSignal()
@@ -83,6 +93,7 @@ class mesoSPIM_Core(QtCore.QObject):
     sig_go_to_rotation_position = QtCore.pyqtSignal()
     sig_go_to_rotation_position_and_wait_until_done = QtCore.pyqtSignal()
     sig_polling_stage_position_start, sig_polling_stage_position_stop = QtCore.pyqtSignal(), QtCore.pyqtSignal()
+    sig_wait_until_serial_done = QtCore.pyqtSignal()
 
     ''' ETL-related signals '''
     sig_save_etl_config = QtCore.pyqtSignal()
@@ -124,7 +135,16 @@ class mesoSPIM_Core(QtCore.QObject):
         self.camera_worker.moveToThread(self.camera_thread)
         self.camera_worker.sig_update_gui_from_state.connect(self.sig_update_gui_from_state.emit)
         self.camera_worker.sig_status_message.connect(self.send_status_message_to_gui)
-        self.camera_worker.sig_camera_frame.connect(self.parent.camera_window.set_image)
+        self.camera_worker.image_writer.sig_writer_error.connect(self.writer_error)
+        self.camera_worker.sig_frames_collected.connect(self.frames_collected)
+        self.writer_failed = False
+        ''' Without Main Window (headless mode), no frames are displayed '''
+        if self.parent.camera_window is not None:
+            self.camera_worker.sig_camera_frame.connect(self.parent.camera_window.set_image)
+            ''' Frames are emitted only when the camera window has displayed the previous ones '''
+            self.camera_worker.display_governor.max_pending = 2
+            self.parent.camera_window.sig_frame_displayed.connect(self.camera_worker.display_governor.frame_displayed,
+                                                                  type=QtCore.Qt.DirectConnection)
         #logger.info('Camera worker thread affinity after moveToThread? Answer:'+str(id(self.camera_worker.thread())))
         ''' Set the serial thread up '''
         #self.serial_thread = QtCore.QThread()
@@ -197,6 +217,48 @@ class mesoSPIM_Core(QtCore.QObject):
         else:
             self.TTL_mode_enabled_in_cfg = False
 
+        ''' Pre-flight disk write test, see check_disk_write_speed(), and striping of files over several disks '''
+        if hasattr(self.cfg, 'writer_parameters'):
+            self.disk_benchmark_mb = self.cfg.writer_parameters.get('disk_benchmark_mb', 0)
+            self.disk_speed_check = self.cfg.writer_parameters.get('disk_speed_check', 'warn')
+            self.target_folders = self.cfg.writer_parameters.get('target_folders', [])
+            self.striping_mode = self.cfg.writer_parameters.get('striping', 'round_robin')
+        else:
+            self.disk_benchmark_mb = 0
+            self.disk_speed_check = 'warn'
+            self.target_folders = []
+            self.striping_mode = 'round_robin'
+        ''' Measured write speeds in MB/s by device, the benchmark runs once per disk and session '''
+        self.disk_write_speeds = {}
+
+        ''' Pipelined stack transitions: the next stack is prepared while the files of the previous one are closed '''
+        self.pipelined_transitions = self.cfg.pipelined_stack_transitions if hasattr(self.cfg, 'pipelined_stack_transitions') else False
+        self.pending_acquisition = None
+
+        ''' Continuous stacks: the NI tasks run for the whole stack and the stage is stepped by its TTL input,
+        the demo stage is stepped by the core as the frames arrive '''
+        self.continuous_stacks = self.cfg.continuous_stacks if hasattr(self.cfg, 'continuous_stacks') else False
+        self.simulated_stage_steps = self.cfg.stage_parameters['stage_type'] == 'DemoStage'
+        if self.continuous_stacks and not (self.TTL_mode_enabled_in_cfg or self.simulated_stage_steps):
+            logger.warning("Core: 'continuous_stacks' requires TTL stage motion ('TigerASI' with 'ttl_motion_enabled'), "
+                           "the planes are acquired one by one")
+            self.continuous_stacks = False
+        ''' Running continuous stack: planes reported so far, and the local event loop waiting for the frames '''
+        self.continuous_stack = self.collection_loop = self.frame_timer = None
+
+        ''' Timing trace of the acquisition lists, see utils/timing_trace.py '''
+        if hasattr(self.cfg, 'timing_trace'):
+            trace.configure(enabled=self.cfg.timing_trace.get('enabled', False),
+                            max_events=self.cfg.timing_trace.get('max_events', 100000))
+
+        ''' Prediction of the acquisition time, learned from the previous acquisitions, see utils/time_prediction.py '''
+        time_prediction = self.cfg.time_prediction if hasattr(self.cfg, 'time_prediction') else {}
+        history_file = time_prediction.get('history_file', 'log/acquisition_time_history.json')
+        self.time_predictor = AcquisitionTimePredictor(self.cfg,
+                                                       os.path.join(self.package_directory, history_file) if history_file else None,
+                                                       time_prediction.get('learning_rate', 0.2))
+        self.predicted_remaining_time = 0
+
         self.metadata_file = None
         # self.acquisition_list_rotation_position = {}
         self.state['state'] = 'idle'
@@ -296,6 +358,11 @@ class mesoSPIM_Core(QtCore.QObject):
             self.sig_state_request.emit({'state':'run_acquisition_list'})
             self.start(row = None)
 
+        elif state == 'resume_acquisition_list':
+            self.state['state'] = 'run_acquisition_list'
+            self.sig_state_request.emit({'state':'run_acquisition_list'})
+            self.start(row = None, resume=True)
+
         elif state == 'preview_acquisition_with_z_update':
             self.state['state'] = 'preview_acquisition'
             self.preview_acquisition(z_update=True)
@@ -322,11 +389,24 @@ class mesoSPIM_Core(QtCore.QObject):
     def stop(self):
         self.stopflag = True
         ''' This stopflag is a bit risky, needs to be updated'''
+        ''' Continuous stacks: the camera thread stops collecting frames, the core stops waiting for them '''
+        self.camera_worker.collect_stop_event.set()
+        if self.collection_loop is not None:
+            self.collection_loop.quit()
         self.camera_worker.image_writer.abort_writing()
         self.state['state'] = 'idle'
         self.sig_update_gui_from_state.emit(False)
         self.sig_finished.emit()
 
+    @QtCore.pyqtSlot(str)
+    def writer_error(self, message):
+        '''A stack could not be written (e.g. disk full): the acquisition list is stopped, the stack is not finished'''
+        logger.error(f'Core: writing failed, stopping: {message}')
+        self.writer_failed = True
+        self.sig_warning.emit(f'Writing failed - stopping! \n{message}')
+        if self.state['state'] in ('run_acquisition_list', 'run_selected_acquisition'):
+            self.stop()
+
     @QtCore.pyqtSlot(bool)
     def pause(self, boolean):
         self.pauseflag = boolean
@@ -507,13 +587,15 @@ class mesoSPIM_Core(QtCore.QObject):
         self.waveformer.stop_tasks()
         self.waveformer.close_tasks()
 
-    def prepare_image_series(self):
-        '''Prepares an image series without waveform update'''
-        self.waveformer.create_tasks()
-        self.waveformer.write_waveforms_to_tasks()
+    def prepare_image_series(self, planes=None):
+        '''Prepares an image series without waveform update, planes: continuous stack of this number of planes'''
+        with trace.span('write waveforms', 'waveform'):
+            self.waveformer.create_tasks(planes)
+            self.waveformer.write_waveforms_to_tasks()
 
     def snap_image_in_series(self, laser_blanking=True):
         '''Snaps and image from a series without waveform update'''
+        t_start = time.perf_counter()
         laser = self.state['laser']
         if laser_blanking:
             self.laserenabler.enable(laser)
@@ -522,10 +604,12 @@ class mesoSPIM_Core(QtCore.QObject):
         self.waveformer.stop_tasks()
         if laser_blanking:
             self.laserenabler.disable_all()
+        trace.add_span('snap', 'waveform', t_start)
 
     def close_image_series(self):
         '''Cleans up after series without waveform update'''
-        self.waveformer.close_tasks()
+        with trace.span('close tasks', 'waveform'):
+            self.waveformer.close_tasks()
         logger.info("close_image_series() finished")
 
     def live(self):
@@ -552,22 +636,37 @@ class mesoSPIM_Core(QtCore.QObject):
         self.sig_end_live.emit()
         self.sig_finished.emit()
 
-    def start(self, row=None):
+    def start(self, row=None, resume=False):
+        '''Run an acquisition list, or the acquisition in the given row.
+        With resume=True, the acquisition list is continued after the last acquisition finished in a previous run.'''
         self.stopflag = False
         if row is None:
             acq_list = self.state['acq_list']
         else:
             acquisition = self.state['acq_list'][row]
             acq_list = AcquisitionList([acquisition])
-            
+
         nonexisting_folders_list = acq_list.check_for_nonexisting_folders()
-        filename_list = acq_list.check_for_existing_filenames()
+        logical_acq_list = acq_list
+        if self.target_folders and not nonexisting_folders_list:
+            ''' Files are distributed over several disks, the folders of the acquisition list hold the manifest '''
+            acq_list = stripe_acquisition_list(logical_acq_list, self.target_folders, self.striping_mode,
+                                               frame_bytes=self.get_frame_bytes(),
+                                               resume=resume)
+        completed_acquisitions, resume_errors = [], []
+        if resume:
+            completed_acquisitions, resume_errors, filename_list = self.check_resume(acq_list)
+        else:
+            filename_list = acq_list.check_for_existing_filenames()
         duplicates_list = acq_list.check_for_duplicated_filenames()
         files_without_extensions = acq_list.check_filename_extensions()
-        free_disk_space_bytes = self.get_free_disk_space(acq_list)
-        total_required_bytes = self.get_required_disk_space(acq_list)
+        missing_packages = self.check_file_format_packages(acq_list)
+        insufficient_disk_space_list = self.check_free_disk_space(acq_list, completed_acquisitions)
 
-        if nonexisting_folders_list:
+        if resume_errors:
+            self.sig_warning.emit('The acquisition list cannot be resumed - stopping! \n'+self.list_to_string_with_carriage_return(resume_errors))
+            self.sig_finished.emit()
+        elif nonexisting_folders_list:
             self.sig_warning.emit('The following folders do not exist - stopping! \n'+self.list_to_string_with_carriage_return(nonexisting_folders_list))
             self.sig_finished.emit()
         elif filename_list:
@@ -577,58 +676,236 @@ class mesoSPIM_Core(QtCore.QObject):
             self.sig_warning.emit('The following filenames are duplicated - stopping! \n' +self.list_to_string_with_carriage_return(duplicates_list))
             self.sig_finished.emit()
         elif files_without_extensions:
-            self.sig_warning.emit('Some files have no extensions (.raw, .tiff, .h5) - stopping! \n' + self.list_to_string_with_carriage_return(files_without_extensions))
+            self.sig_warning.emit('Some files have no extensions (.raw, .tiff, .h5, .zarr) - stopping! \n' + self.list_to_string_with_carriage_return(files_without_extensions))
             self.sig_finished.emit()
-        elif free_disk_space_bytes < total_required_bytes * 1.1:
+        elif missing_packages:
+            self.sig_warning.emit('The following packages are required to write .zarr files, install them with '
+                                  'pip install "zarr<3" - stopping! \n' + self.list_to_string_with_carriage_return(missing_packages))
+            self.sig_finished.emit()
+        elif insufficient_disk_space_list:
             self.sig_warning.emit(f'Insufficient disk space: \n'
-                                  f'Free {format_data_size(free_disk_space_bytes)} \n'
-                                  f'Required {format_data_size(total_required_bytes)}. \n'
-                                  f'Stopping! \n')
+                                  + self.list_to_string_with_carriage_return(insufficient_disk_space_list)
+                                  + f'Stopping! \n')
             self.sig_finished.emit()
         else:
-            self.sig_update_gui_from_state.emit(True)
-            self.prepare_acquisition_list(acq_list)
-            self.run_acquisition_list(acq_list)
-            self.close_acquisition_list(acq_list)
-            self.sig_update_gui_from_state.emit(False)
-
-    def get_free_disk_space(self, acq_list):
-        """Take the disk location of the first file and compute the free disk space"""
-        filename0 = os.path.realpath(acq_list.get_all_filenames()[0])
-        disk_name = os.path.splitdrive(filename0)[0]
+            slow_disks_list = self.check_disk_write_speed(acq_list, completed_acquisitions)
+            if slow_disks_list and self.disk_speed_check == 'refuse':
+                self.sig_warning.emit('The write speed of the following disks is too low for the acquisition - stopping! \n'
+                                      + self.list_to_string_with_carriage_return(slow_disks_list))
+                self.sig_finished.emit()
+            else:
+                if slow_disks_list:
+                    self.sig_warning.emit('The write speed of the following disks may be too low, '
+                                          'the acquisition can fall behind the camera: \n'
+                                          + self.list_to_string_with_carriage_return(slow_disks_list))
+                if acq_list is not logical_acq_list:
+                    write_manifest(logical_acq_list, acq_list, self.striping_mode)
+                self.sig_update_gui_from_state.emit(True)
+                self.camera_worker.image_writer.set_resume_state(resume, completed_acquisitions)
+                self.prepare_acquisition_list(acq_list, resume, completed_acquisitions)
+                self.run_acquisition_list(acq_list)
+                self.close_acquisition_list(acq_list)
+                self.sig_update_gui_from_state.emit(False)
+
+    def check_file_format_packages(self, acq_list):
+        """Returns the missing optional packages needed by the file formats of the acquisition list"""
+        if any(os.path.splitext(acq['filename'])[1] == '.zarr' for acq in acq_list):
+            return get_missing_packages()
+        return []
+
+    def get_free_disk_space(self, folder):
+        """Compute the free disk space of the disk holding the folder"""
+        folder = os.path.realpath(folder)
         if platform.system() == 'Windows':
             free_bytes = ctypes.c_ulonglong(0)
-            ctypes.windll.kernel32.GetDiskFreeSpaceExW(ctypes.c_wchar_p(disk_name), None, None, ctypes.pointer(free_bytes))
-            print(f"Free disk {disk_name} space {format_data_size(free_bytes.value)}")
+            ctypes.windll.kernel32.GetDiskFreeSpaceExW(ctypes.c_wchar_p(folder), None, None, ctypes.pointer(free_bytes))
+            print(f"Free disk {folder} space {format_data_size(free_bytes.value)}")
             return free_bytes.value
         else: # non-Windows case, untested!
-            st = os.statvfs(disk_name)
+            st = os.statvfs(folder)
             return st.f_bavail * st.f_frsize
 
-    def get_required_disk_space(self, acq_list):
-        """"Compute total image data size from the acquisition list, in bytes"""
+    def get_frame_bytes(self):
         BYTES_PER_PIXEL = 2 # 16-bit camera
-        px_per_image = self.camera_worker.x_pixels * self.camera_worker.y_pixels
-        total_bytes_required = acq_list.get_image_count() * px_per_image * BYTES_PER_PIXEL
+        return self.camera_worker.x_pixels * self.camera_worker.y_pixels * BYTES_PER_PIXEL
+
+    def get_required_disk_space(self, acq_list, completed_acquisitions=()):
+        """"Compute total image data size from the acquisition list, in bytes"""
+        image_count = acq_list.get_image_count() - sum(acq_list[i].get_image_count() for i in completed_acquisitions)
+        total_bytes_required = image_count * self.get_frame_bytes()
         return total_bytes_required
 
-    def prepare_acquisition_list(self, acq_list):
+    def check_free_disk_space(self, acq_list, completed_acquisitions=()):
+        """Compare the free and required space of every disk the acquisition list is written to.
+
+        Returns:
+            list of disks with insufficient free space
+        """
+        required_bytes, disk_folders = {}, {}
+        for i, acq in enumerate(acq_list):
+            if i in completed_acquisitions:
+                continue
+            ''' Physical folders of striped lists are created after the checks '''
+            folder = get_existing_parent(acq['folder'])
+            disk = os.stat(folder).st_dev
+            disk_folders.setdefault(disk, folder)
+            required_bytes[disk] = required_bytes.get(disk, 0) + acq.get_image_count() * self.get_frame_bytes()
+        insufficient_disk_space_list = []
+        for disk, required in required_bytes.items():
+            free = self.get_free_disk_space(disk_folders[disk])
+            if free < required * 1.1:
+                insufficient_disk_space_list.append(f'{disk_folders[disk]}: Free {format_data_size(free)}, '
+                                                    f'Required {format_data_size(required)}')
+        return insufficient_disk_space_list
+
+    def check_disk_write_speed(self, acq_list, completed_acquisitions=()):
+        '''Pre-flight write test of every target disk, compared to the data rate of the acquisition.
+        Every disk (device) is tested once per session, folders on the same disk share the result.
+
+        Returns:
+            list of folders (with measured and required speed) which cannot sustain the data rate
+        '''
+        if self.disk_benchmark_mb <= 0 or self.disk_speed_check == 'off':
+            return []
+        frame_bytes = self.get_frame_bytes()
+        ''' One frame per sweep during a stack '''
+        frame_rate = 1. / self.state['sweeptime']
+        required_speeds = get_required_write_speed(acq_list, frame_bytes, frame_rate, self.cfg, completed_acquisitions)
+        slow_disks_list = []
+        for folder, required_speed in required_speeds.items():
+            try:
+                existing_folder = get_existing_parent(folder)
+                device = os.stat(existing_folder).st_dev
+                if device not in self.disk_write_speeds:
+                    self.sig_status_message.emit(f'Testing disk write speed: {existing_folder}')
+                    self.disk_write_speeds[device] = measure_write_speed(existing_folder, size_mb=self.disk_benchmark_mb)
+            except OSError as e:
+                logger.error(f'Disk benchmark failed in {folder}: {e}')
+                continue
+            speed = self.disk_write_speeds[device]
+            if speed < required_speed * 1.2:
+                slow_disks_list.append(f'{folder}: {speed:.0f} MB/s, required {required_speed:.0f} MB/s')
+        return slow_disks_list
+
+    def check_resume(self, acq_list):
+        '''Check whether an interrupted acquisition list can be resumed, using its journal.
+
+        Returns:
+            (completed_acquisitions, errors, existing_filenames): indices of the finished acquisitions,
+            a list of error messages (e.g. incomplete files) and files which would be overwritten.
+            The file of the interrupted acquisition is overwritten, this is intended.
+        '''
+        completed_acquisitions, interrupted, message = get_journal_progress(acq_list)
+        if message:
+            return [], [message], []
+        errors = []
+        for i in completed_acquisitions:
+            error = self.camera_worker.image_writer.validate_acquisition(acq_list[i], acq_list)
+            if error:
+                errors.append(error)
+        existing_filenames = []
+        for i, filename in enumerate(acq_list.get_all_filenames()):
+            if i not in completed_acquisitions and i != interrupted and not acq_list.is_single_file_format(filename):
+                if os.path.exists(filename):
+                    existing_filenames.append(filename)
+        logger.info(f'Core: Resuming acquisition list, {len(completed_acquisitions)} of {len(acq_list)} acquisitions finished, '
+                    f'interrupted acquisition: {interrupted}')
+        return completed_acquisitions, errors, existing_filenames
+
+    def prepare_acquisition_list(self, acq_list, resume=False, completed_acquisitions=()):
         ''' Housekeeping: Prepare the acquisition list '''
         self.image_count = 0
         self.acquisition_count = 0
-        self.total_acquisition_count = len(acq_list)
-        self.total_image_count = acq_list.get_image_count()
+        self.completed_acquisitions = list(completed_acquisitions)
+        self.total_acquisition_count = len(acq_list) - len(self.completed_acquisitions)
+        self.total_image_count = acq_list.get_image_count() - sum(acq_list[i].get_image_count() for i in self.completed_acquisitions)
+        self.journal = AcquisitionJournal(acq_list, resume=resume)
+        self.pending_acquisition = None
+        self.writer_failed = False
+        self.dead_times = []
+        trace.clear()
+        self.update_time_prediction(acq_list, -1)
+        self.state['predicted_acq_list_time'] = self.predicted_remaining_time
         self.start_time = time.time()
 
     def run_acquisition_list(self, acq_list):
-        for acq in acq_list:
+        previous_image_acq_end_time = previous_acq = None
+        for i, acq in enumerate(acq_list):
             if not self.stopflag:
+                if i in self.completed_acquisitions:
+                    logger.info(f'Core: Skipping Acquisition with Filename: {acq["filename"]}, finished in a previous run')
+                    continue
+                self.acquisition_index = i
+                self.journal.acquisition_started(i, acq)
+                self.update_time_prediction(acq_list, i)
+                t_start = time.time()
+                self.state['predicted_acq_list_time'] = t_start - self.start_time + self.predicted_durations[i] + self.predicted_remaining_time
                 self.prepare_acquisition(acq, acq_list)
-                self.run_acquisition(acq, acq_list)
+                if self.continuous_stacks:
+                    self.run_continuous_acquisition(acq, acq_list)
+                else:
+                    self.run_acquisition(acq, acq_list)
                 self.close_acquisition(acq, acq_list)
+                ''' A write error of this stack is reported before its files are closed '''
+                QtWidgets.QApplication.processEvents()
+                if self.stopflag or self.writer_failed:
+                    self.journal.acquisition_aborted(i, acq)
+                else:
+                    if self.pending_acquisition is None:
+                        self.journal.acquisition_finished(i, acq)
+                    self.time_predictor.learn_acquisition(acq, previous_acq, self.phase_timing,
+                                                          self.image_acq_end_time - self.image_acq_start_time,
+                                                          self.state['current_framerate'])
+                    logger.info(f'Core: acquisition took {time.time() - t_start:.1f} s, predicted {self.predicted_durations[i]:.1f} s')
+                self.log_transition_timing(previous_image_acq_end_time)
+                previous_image_acq_end_time, previous_acq = self.image_acq_end_time, acq
+        self.wait_for_image_series_end()
+        if self.dead_times:
+            logger.info(f'Core: dead time between stacks: total {sum(self.dead_times):.1f} s, '
+                        f'mean {sum(self.dead_times) / len(self.dead_times):.2f} s, pipelined transitions: {self.pipelined_transitions}')
+
+    def update_time_prediction(self, acq_list, index):
+        '''Predict the duration of every acquisition with the costs learned so far,
+        and the time of the acquisitions after the one with the given index'''
+        self.predicted_durations = self.time_predictor.predict(acq_list, self.state['current_framerate'])
+        remaining = np.ones(len(acq_list), dtype=bool)
+        remaining[:index + 1] = False
+        remaining[self.completed_acquisitions] = False
+        self.predicted_remaining_time = float(self.predicted_durations[remaining].sum())
+
+    def wait_for_image_series_end(self):
+        '''Pipelined stack transitions: wait until the camera thread has closed the files of the previous stack.
+
+        Returns:
+            waiting time in seconds
+        '''
+        if self.pending_acquisition is None:
+            return 0.
+        t_start = time.time()
+        self.sig_wait_until_camera_done.emit()
+        index, acq = self.pending_acquisition
+        self.pending_acquisition = None
+        QtWidgets.QApplication.processEvents()
+        if self.writer_failed:
+            self.journal.acquisition_aborted(index, acq)
+        else:
+            self.journal.acquisition_finished(index, acq)
+        return time.time() - t_start
+
+    def log_transition_timing(self, previous_image_acq_end_time=None):
+        ''' Duration of the phases between stacks, the dead time is the time without images between two stacks '''
+        timing = ', '.join(f'{phase} {duration:.2f} s' for phase, duration in self.phase_timing.items())
+        if previous_image_acq_end_time is not None:
+            dead_time = self.image_acq_start_time - previous_image_acq_end_time
+            self.dead_times.append(dead_time)
+            timing += f', dead time before stack {dead_time:.2f} s'
+        logger.info(f'Core: stack timing: {timing}')
 
     def close_acquisition_list(self, acq_list):
         self.sig_status_message.emit('Closing Acquisition List')
+        self.journal.close(finished=not self.stopflag)
+        self.export_timing_trace()
+        self.time_predictor.save()
         if not self.stopflag:
             current_rotation = self.state['position']['theta_pos']
             startpoint = acq_list.get_startpoint()
@@ -652,9 +929,22 @@ class mesoSPIM_Core(QtCore.QObject):
             self.sig_state_request.emit({'etl_l_offset' : acq_list[0]['etl_l_offset']})
             self.sig_state_request.emit({'etl_r_offset' : acq_list[0]['etl_r_offset']})
             self.set_intensity(acq_list[0]['intensity'])
-            time.sleep(0.1) # tiny sleep period to allow Main Window indicators to catch up
+            ''' The Main Window indicators are updated once the serial requests above are done '''
+            self.sig_wait_until_serial_done.emit()
             self.sig_finished.emit()
 
+    def export_timing_trace(self):
+        '''Save the timing trace of the acquisition list into the log folder, see utils/timing_trace.py'''
+        if trace.enabled:
+            path = os.path.join(self.package_directory, 'log', time.strftime("%Y%m%d-%H%M%S") + '_trace.json')
+            try:
+                trace.export(path)
+                summary = sorted(trace.get_summary().items(), key=lambda item: -item[1][0])
+                logger.info('Core: timing trace totals: ' + ', '.join(f'{category}/{name} {total:.1f} s ({count}x)'
+                                                                     for (category, name), (total, count) in summary))
+            except Exception as e:
+                logger.error(f'Timing trace could not be saved: {e}')
+
     def preview_acquisition(self, z_update=True):
         self.stopflag = False
         row = self.state['selected_row']
@@ -718,6 +1008,8 @@ class mesoSPIM_Core(QtCore.QObject):
         startpoint = acq.get_startpoint()
         target_rotation = startpoint['theta_abs']
         self.acq_start_time_string = time.strftime("%Y%m%d-%H%M%S")
+        self.phase_timing = {}
+        t_phase = time.perf_counter()
 
         self.sig_status_message.emit('Going to start position')
         ''' Check if sample has to be rotated, allow some tolerance '''
@@ -726,6 +1018,7 @@ class mesoSPIM_Core(QtCore.QObject):
             self.move_absolute({'theta_abs':target_rotation}, wait_until_done=True)
         
         self.move_absolute(startpoint, wait_until_done=True)
+        t_phase = self.end_phase('move', t_phase)
         self.sig_status_message.emit('Setting Filter & Shutter')
         self.set_shutterconfig(acq['shutterconfig'])
         self.set_filter(acq['filter'], wait_until_done=True)
@@ -733,8 +1026,6 @@ class mesoSPIM_Core(QtCore.QObject):
         self.set_zoom(acq['zoom'], wait_until_done=False, update_etl=False)
         self.set_intensity(acq['intensity'], wait_until_done=True)
         self.set_laser(acq['laser'], wait_until_done=True, update_etl=False)
-        ''' This is for the GUI to update properly, otherwise ETL values for previous laser might be displayed '''
-        QtWidgets.QApplication.processEvents(QtCore.QEventLoop.AllEvents, 1)
 
         self.sig_state_request.emit({'etl_l_amplitude' : acq['etl_l_amplitude']})
         self.sig_state_request.emit({'etl_r_amplitude' : acq['etl_r_amplitude']})
@@ -743,21 +1034,34 @@ class mesoSPIM_Core(QtCore.QObject):
         self.f_step_generator = acq.get_focus_stepsize_generator()
 
         if self.TTL_mode_enabled_in_cfg is True:
-            ''' The relative movement has to be carried out once with the ASI-controller '''
-            self.move_relative(acq.get_delta_z_and_delta_f_dict(inverted=True))
-            time.sleep(0.1)
-            self.move_relative(acq.get_delta_z_and_delta_f_dict())
-            time.sleep(0.1)
-            self.sig_state_request.emit({'ttl_movement_enabled_during_acq' : True})
-            time.sleep(0.05)
+            ''' The relative movement has to be carried out once with the ASI-controller.
+            Each request returns when the serial worker is done with it. '''
+            self.move_relative(acq.get_delta_z_and_delta_f_dict(inverted=True), wait_until_done=True)
+            self.move_relative(acq.get_delta_z_and_delta_f_dict(), wait_until_done=True)
+            self.sig_state_request_and_wait_until_done.emit({'ttl_movement_enabled_during_acq' : True})
 
         # stop asking stages about their positions, to avoid messing up serial comm during acquisition:
         self.sig_polling_stage_position_stop.emit()
+        t_phase = self.end_phase('filter, zoom, laser', t_phase)
+
+        if self.pending_acquisition is not None:
+            self.sig_status_message.emit('Waiting for the files of the previous stack')
+            self.wait_for_image_series_end()
+            t_phase = self.end_phase('waiting for previous stack files', t_phase)
+            self.phase_timing['closing previous stack files (overlapped)'] = self.camera_worker.end_image_series_duration
 
         self.sig_status_message.emit('Preparing camera: Allocating memory')
         self.sig_prepare_image_series.emit(acq, acq_list)
-        self.prepare_image_series()
+        self.prepare_image_series(acq.get_image_count() if self.continuous_stacks else None)
         self.sig_write_metadata.emit(acq, acq_list)
+        self.end_phase('camera preparation', t_phase)
+
+    def end_phase(self, phase, t_start):
+        '''Record the duration of a phase between stacks, returns the start time of the next phase'''
+        t_end = time.perf_counter()
+        self.phase_timing[phase] = t_end - t_start
+        trace.add_span(phase, 'core', t_start, t_end - t_start)
+        return t_end
 
     def run_acquisition(self, acq, acq_list):
         steps = acq.get_image_count()
@@ -765,6 +1069,7 @@ class mesoSPIM_Core(QtCore.QObject):
         self.open_shutters()
         self.image_acq_start_time = time.time()
         self.image_acq_start_time_string = time.strftime("%Y%m%d-%H%M%S")
+        t_start = time.perf_counter()
 
         move_dict = acq.get_delta_dict()
         laser = self.state['laser']
@@ -802,54 +1107,133 @@ class mesoSPIM_Core(QtCore.QObject):
                 
                 QtWidgets.QApplication.processEvents(QtCore.QEventLoop.AllEvents, 1)
                 self.image_count += 1
+                self.update_progress(i, steps)
+        self.laserenabler.disable_all()
+        self.image_acq_end_time = time.time()
+        self.image_acq_end_time_string = time.strftime("%Y%m%d-%H%M%S")
+        trace.add_span('acquire', 'core', t_start, filename=acq['filename'], planes=steps)
+
+        self.close_shutters()
+
+    def run_continuous_acquisition(self, acq, acq_list):
+        '''Continuous stack: the waveform tasks are started and triggered once (see prepare_image_series()),
+        the camera and the stage are triggered by the hardware at every sweep. The camera thread collects
+        the frames of the whole stack and reports their number, the core waits in a local event loop
+        and reports the progress (see frames_collected()). A stack can be stopped, not paused.'''
+        steps = acq.get_image_count()
+        self.sig_status_message.emit('Running Acquisition')
+        self.open_shutters()
+        self.image_acq_start_time = time.time()
+        self.image_acq_start_time_string = time.strftime("%Y%m%d-%H%M%S")
+        t_start = time.perf_counter()
 
-                ''' Keep track of passed time and predict remaining time '''
-                time_passed = time.time() - self.start_time
-                time_remaining = self.state['predicted_acq_list_time'] - time_passed
-
-                ''' If the time to set up everything is longer than the predicted 
-                acq time, the remaining time turns negative - here a different 
-                calcuation should be employed here: '''
-                if time_remaining < 0:
-                    time_passed = time.time() - self.image_acq_start_time
-                    time_remaining = self.state['predicted_acq_list_time'] - time_passed
-
-                self.state['remaining_acq_list_time'] = time_remaining
-                framerate = self.image_count / time_passed
-
-                ''' Every 100 images, update the predicted acquisition time '''
-                if self.image_count % 100 == 0:
-                    framerate = self.image_count / time_passed
-                    self.state['predicted_acq_list_time'] = self.total_image_count / framerate
-
-                self.send_progress(self.acquisition_count,
-                                   self.total_acquisition_count,
-                                   i,
-                                   steps,
-                                   self.total_image_count,
-                                   self.image_count,
-                                   convert_seconds_to_string(time_passed),
-                                   convert_seconds_to_string(time_remaining))
+        self.continuous_stack = {'steps': steps, 'planes': 0, 'move_dict': acq.get_delta_dict()}
+        self.laserenabler.enable(self.state['laser'])
+        self.camera_worker.collect_stop_event.clear()
+        self.sig_collect_images_in_series.emit(acq, acq_list)
+        self.waveformer.start_tasks()
+        self.waveformer.trigger_tasks()
+        ''' No new frame for this long: triggers were lost, e.g. the camera is slower than the sweeps '''
+        self.frame_timer = QtCore.QTimer()
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setInterval(int(max(2., 10 * self.state['sweeptime']) * 1000))
+        self.frame_timer.timeout.connect(self.frames_timeout)
+        self.collection_loop = QtCore.QEventLoop()
+        if self.stopflag is False:
+            self.frame_timer.start()
+            self.collection_loop.exec_()
+        self.frame_timer.stop()
+        self.continuous_stack = self.collection_loop = self.frame_timer = None
+
+        self.waveformer.stop_tasks()
         self.laserenabler.disable_all()
+        if self.stopflag is True:
+            ''' stop() has set collect_stop_event: the camera thread stops collecting before it closes the series '''
+            self.close_image_series()
+            self.sig_end_image_series.emit(acq, acq_list)
+            self.sig_finished.emit()
         self.image_acq_end_time = time.time()
         self.image_acq_end_time_string = time.strftime("%Y%m%d-%H%M%S")
+        trace.add_span('acquire', 'core', t_start, filename=acq['filename'], planes=steps, continuous=True)
 
         self.close_shutters()
 
+    @QtCore.pyqtSlot(int)
+    def frames_collected(self, frames):
+        '''Continuous stacks: progress (and steps of the demo stage) for the frames collected by the camera thread'''
+        stack = self.continuous_stack
+        if stack is None:
+            return
+        for plane in range(stack['planes'], frames):
+            if self.simulated_stage_steps:
+                f_step = self.f_step_generator.__next__()
+                if f_step != 0:
+                    stack['move_dict'].update({'f_rel':f_step})
+                self.move_relative(stack['move_dict'])
+            self.image_count += 1
+            self.update_progress(plane, stack['steps'])
+        stack['planes'] = max(stack['planes'], frames)
+        self.frame_timer.start()
+        if stack['planes'] >= stack['steps']:
+            self.collection_loop.quit()
+
+    @QtCore.pyqtSlot()
+    def frames_timeout(self):
+        planes, steps = self.continuous_stack['planes'], self.continuous_stack['steps']
+        logger.error(f'Core: no frame within {self.frame_timer.interval() / 1000:.1f} s, {planes} of {steps} planes acquired')
+        self.sig_warning.emit(f'The camera stopped delivering frames after {planes} of {steps} planes - stopping!')
+        self.stop()
+
+    def update_progress(self, i, steps):
+        '''Keep track of passed time and predict remaining time, after plane i of the stack'''
+        time_passed = time.time() - self.start_time
+        time_remaining = self.state['predicted_acq_list_time'] - time_passed
+
+        ''' If the time to set up everything is longer than the predicted
+        acq time, the remaining time turns negative - here a different
+        calcuation should be employed here: '''
+        if time_remaining < 0:
+            time_passed = time.time() - self.image_acq_start_time
+            time_remaining = self.state['predicted_acq_list_time'] - time_passed
+
+        self.state['remaining_acq_list_time'] = time_remaining
+
+        ''' Every 100 images, update the predicted acquisition time and the journal '''
+        if self.image_count % 100 == 0:
+            plane_time = (time.time() - self.image_acq_start_time) / (i + 1)
+            self.state['predicted_acq_list_time'] = (time.time() - self.start_time + (steps - i - 1) * plane_time
+                                                     + self.predicted_remaining_time)
+            self.journal.planes_acquired(self.acquisition_index, i + 1)
+
+        self.send_progress(self.acquisition_count,
+                           self.total_acquisition_count,
+                           i,
+                           steps,
+                           self.total_image_count,
+                           self.image_count,
+                           convert_seconds_to_string(time_passed),
+                           convert_seconds_to_string(time_remaining))
+
     def close_acquisition(self, acq, acq_list):
         self.sig_status_message.emit('Closing Acquisition: Saving data & freeing up memory')
+        t_phase = time.perf_counter()
         if self.stopflag is False:
             # self.move_absolute(acq.get_startpoint(), wait_until_done=True)
             self.close_image_series()
-            self.sig_end_image_series.emit(acq, acq_list)
+            if self.pipelined_transitions:
+                ''' The camera thread closes the files while the next stack is prepared, see wait_for_image_series_end() '''
+                self.sig_end_image_series_nowait.emit(acq, acq_list)
+                self.pending_acquisition = (self.acquisition_index, acq)
+            else:
+                self.sig_end_image_series.emit(acq, acq_list)
 
         if self.TTL_mode_enabled_in_cfg is True:
-            time.sleep(0.05) # add some buffer time for serial execution
-            self.sig_state_request.emit({'ttl_movement_enabled_during_acq' : False})
-            time.sleep(0.05)  # buffer time
+            ''' Queued after the last moves of the stack, returns when the serial worker has disabled TTL motion '''
+            self.sig_state_request_and_wait_until_done.emit({'ttl_movement_enabled_during_acq' : False})
 
         # resume asking stages about their position
         self.sig_polling_stage_position_start.emit()
+        self.end_phase('closing', t_phase)
 
         self.acq_end_time = time.time()
         img_total_time = self.image_acq_end_time - self.image_acq_start_time
@@ -890,7 +1274,6 @@ class mesoSPIM_Core(QtCore.QObject):
         old_r_amp = self.state['etl_r_amplitude']
         self.sig_state_request.emit({'etl_l_amplitude' : 0})
         self.sig_state_request.emit({'etl_r_amplitude' : 0})
-        time.sleep(0.05)
 
         self.sig_prepare_live.emit()
 
@@ -0,0 +1,153 @@
+'''
+mesoSPIM_Headless.py
+========================================
+
+Runs a saved acquisition list without the graphical user interface,
+e.g. for long unattended acquisitions or benchmarks in demo mode:
+
+    python mesoSPIM_Control.py --demo --headless table.json
+
+The core runs in its own thread as with the Main Window, the serial devices in the main thread.
+No windows are created and no frames are displayed. The progress is printed and logged,
+Ctrl+C stops the acquisition.
+'''
+import sys
+import time
+import signal
+import logging
+from PyQt5 import QtCore
+
+from .mesoSPIM_State import mesoSPIM_StateSingleton
+from .mesoSPIM_Core import mesoSPIM_Core
+from .utils.acquisition_io import load_acquisition_list
+from .utils.conversion_queue import ConversionQueue
+from .utils.utility_functions import convert_seconds_to_string
+
+logger = logging.getLogger(__name__)
+
+
+class mesoSPIM_HeadlessJob(QtCore.QObject):
+    '''Starts the acquisition list in the core thread, reports when it is done and if it was finished'''
+    sig_done = QtCore.pyqtSignal(bool)
+
+    def __init__(self, core, resume=False):
+        super().__init__()
+        self.core = core
+        self.resume = resume
+
+    @QtCore.pyqtSlot()
+    def run(self):
+        ''' The acquisition list is not started if the checks fail (e.g. existing files), then there is no new journal '''
+        journal = getattr(self.core, 'journal', None)
+        self.core.set_state('resume_acquisition_list' if self.resume else 'run_acquisition_list')
+        self.sig_done.emit(getattr(self.core, 'journal', None) is not journal and not self.core.stopflag)
+
+
+class mesoSPIM_HeadlessRunner(QtCore.QObject):
+    '''Replaces the Main Window as parent of the core: provides the signals the core connects to'''
+    sig_state_request = QtCore.pyqtSignal(dict)
+    sig_execute_script = QtCore.pyqtSignal(str)
+    sig_move_relative = QtCore.pyqtSignal(dict)
+    sig_move_absolute = QtCore.pyqtSignal(dict)
+    sig_zero_axes = QtCore.pyqtSignal(list)
+    sig_unzero_axes = QtCore.pyqtSignal(list)
+    sig_stop_movement = QtCore.pyqtSignal()
+    sig_load_sample = QtCore.pyqtSignal()
+    sig_unload_sample = QtCore.pyqtSignal()
+    sig_save_etl_config = QtCore.pyqtSignal()
+    sig_start = QtCore.pyqtSignal()
+
+    def __init__(self, package_directory, config, table_path, resume=False, progress_interval=10):
+        super().__init__()
+        self.cfg = config
+        self.package_directory = package_directory
+        self.camera_window = None
+        self.progress_interval = progress_interval
+        self.last_progress_time = 0
+        self.exit_code = 0
+
+        self.state = mesoSPIM_StateSingleton()
+        self.state['acq_list'] = load_acquisition_list(table_path)
+        logger.info(f'Headless: acquisition list {table_path} loaded, {len(self.state["acq_list"])} acquisitions')
+
+        self.core_thread = QtCore.QThread()
+        self.core = mesoSPIM_Core(self.cfg, self)
+        self.core.moveToThread(self.core_thread)
+        self.core.waveformer.moveToThread(self.core_thread)
+        self.core.sig_status_message.connect(self.print_message)
+        self.core.sig_warning.connect(self.print_warning)
+        self.core.sig_progress.connect(self.print_progress)
+
+        self.job = mesoSPIM_HeadlessJob(self.core, resume)
+        self.job.moveToThread(self.core_thread)
+        self.sig_start.connect(self.job.run)
+        self.job.sig_done.connect(self.finish)
+
+        self.conversion_queue = None
+        if hasattr(self.cfg, 'conversion') and self.cfg.conversion.get('enabled', False):
+            self.conversion_queue = ConversionQueue(n_workers=self.cfg.conversion.get('n_workers', 1))
+            self.conversion_queue.sig_progress.connect(self.print_message)
+            self.core.camera_worker.image_writer.sig_conversion_job.connect(self.conversion_queue.add_job)
+            self.core.camera_worker.image_writer.sig_writer_backlog.connect(self.conversion_queue.set_paused)
+
+        self.core_thread.start(QtCore.QThread.HighPriority)
+
+    def start(self):
+        self.start_time = time.time()
+        self.sig_start.emit()
+
+    def stop(self):
+        print('Stopping the acquisition...')
+        self.sig_state_request.emit({'state': 'idle'})
+
+    @QtCore.pyqtSlot(str)
+    def print_message(self, string):
+        logger.info(f'Headless: {string}')
+        print(string)
+
+    @QtCore.pyqtSlot(str)
+    def print_warning(self, string):
+        logger.warning(f'Headless: {string}')
+        print('WARNING: ' + string, file=sys.stderr)
+
+    @QtCore.pyqtSlot(dict)
+    def print_progress(self, progress):
+        ''' At most every progress_interval seconds '''
+        if time.time() - self.last_progress_time < self.progress_interval:
+            return
+        self.last_progress_time = time.time()
+        print(f"Acquisition {progress['current_acq'] + 1}/{progress['total_acqs']}, "
+              f"plane {progress['current_image_in_acq'] + 1}/{progress['images_in_acq']}, "
+              f"total {progress['image_counter']}/{progress['total_image_count']} planes, "
+              f"elapsed {progress['time_passed_string']}, remaining {progress['remaining_time_string']}")
+
+    @QtCore.pyqtSlot(bool)
+    def finish(self, finished):
+        self.exit_code = 0 if finished else 1
+        self.print_message(f"Acquisition list {'finished' if finished else 'stopped'} after "
+                           f"{convert_seconds_to_string(time.time() - self.start_time)}")
+        self.exit_when_conversions_done()
+
+    def exit_when_conversions_done(self):
+        if self.conversion_queue is not None and self.conversion_queue.futures:
+            QtCore.QTimer.singleShot(1000, self.exit_when_conversions_done)
+            return
+        if self.conversion_queue is not None:
+            self.conversion_queue.shutdown()
+        for thread in (self.core.camera_thread, self.core_thread):
+            thread.quit()
+            thread.wait()
+        QtCore.QCoreApplication.exit(self.exit_code)
+
+
+def run_headless(package_directory, config, table_path, resume=False):
+    '''Run the acquisition list saved in table_path, returns the exit code (0: finished)'''
+    app = QtCore.QCoreApplication(sys.argv)
+    runner = mesoSPIM_HeadlessRunner(package_directory, config, table_path, resume)
+    ''' Python handles Ctrl+C only while it runs, the timer wakes it up regularly '''
+    signal.signal(signal.SIGINT, lambda *args: runner.stop())
+    timer = QtCore.QTimer()
+    timer.timeout.connect(lambda: None)
+    timer.start(200)
+    QtCore.QTimer.singleShot(0, runner.start)
+    return app.exec_()
@@ -4,6 +4,8 @@ mesoSPIM Image Writer class, intended to run in the Camera Thread and handle fil
 
 import os
 import time
+import queue
+import threading
 import numpy as np
 import tifffile
 import logging
@@ -14,9 +16,20 @@ from distutils.version import StrictVersion
 from .mesoSPIM_State import mesoSPIM_StateSingleton
 import npy2bdv
 from .utils.acquisitions import AcquisitionList, Acquisition
+from .utils.omezarr_writer import OMEZarrWriter, get_view_name, read_finished_views
+from .utils.parallel_bdv_writer import ParallelBdvWriter
+from .utils.raw_writer import RawWriter
+from .utils.tiff_batch_writer import TiffBatchWriter
+from .utils.frame_ring import FrameRing, FrameSlot
+from .utils.projections import StackProjector, get_projection_modes
+from .utils.timing_trace import trace
 
 
 class mesoSPIM_ImageWriter(QtCore.QObject):
+    sig_conversion_job = QtCore.pyqtSignal(dict) # a finished .raw stack to be converted in the background
+    sig_writer_backlog = QtCore.pyqtSignal(bool) # True while the writer queue is more than half full
+    sig_writer_error = QtCore.pyqtSignal(str) # the first error of a stack, the following frames are discarded
+
     def __init__(self, parent=None):
         '''Image and metadata writer class. Parent is mesoSPIM_Camera() object'''
         super().__init__()
@@ -38,9 +51,36 @@ class mesoSPIM_ImageWriter(QtCore.QObject):
         self.y_pixels = int(self.y_pixels / self.y_binning)
 
         self.file_extension = ''
-        self.bdv_writer = self.tiff_writer = self.tiff_mip_writer = self.mip_image = None
+        self.bdv_writer = self.zarr_writer = self.raw_writer = self.tiff_writer = self.projector = None
         self.tiff_aliases = ('.tif', '.tiff')
         self.bigtiff_aliases = ('.btf', '.tf2', '.tf8')
+        self.metadata_file = None
+
+        ''' Asynchronous writing: frames are passed to a writer thread via a bounded queue '''
+        if hasattr(self.cfg, 'writer_parameters'):
+            self.async_writing = self.cfg.writer_parameters.get('async_writing', False)
+            self.queue_depth = self.cfg.writer_parameters.get('queue_depth', 64)
+            self.raw_direct_io = self.cfg.writer_parameters.get('raw_direct_io', False)
+            self.tiff_batch_size = self.cfg.writer_parameters.get('tiff_batch_size', 1)
+        else:
+            self.async_writing = False
+            self.queue_depth = 64
+            self.raw_direct_io = False
+            self.tiff_batch_size = 1
+        self.frame_queue = self.writer_thread = self.writer_error = None
+        self.writer_backlog = False
+        self.frame_ring = None
+
+        ''' Background conversion of finished .raw stacks, see utils/conversion_queue.py '''
+        if hasattr(self.cfg, 'conversion') and self.cfg.conversion.get('enabled', False):
+            self.conversion_format = self.cfg.conversion.get('target_format', '.h5')
+            self.conversion_max_read_mb_s = self.cfg.conversion.get('max_read_mb_s', 0)
+        else:
+            self.conversion_format = None
+        self.resuming = False
+        self.completed_acquisitions = []
+        self.abort_event = threading.Event()
+        self.reset_writer_statistics()
         self.check_versions()
 
     def check_versions(self):
@@ -74,66 +114,298 @@ class mesoSPIM_ImageWriter(QtCore.QObject):
                 subsamp = self.cfg.hdf5['subsamp']
                 compression = self.cfg.hdf5['compression']
                 flip_flags = self.cfg.hdf5['flip_xyz']
+                compression_workers = self.cfg.hdf5.get('compression_workers', 0)
             else:
                 subsamp = ((1, 1, 1),)
                 compression = None
                 flip_flags = (False, False, False)
+                compression_workers = 0
             # create writer object if the view is first in the list
-            if acq == acq_list[0]:
-                self.bdv_writer = npy2bdv.BdvWriter(self.path,
-                                                    nilluminations=acq_list.get_n_shutter_configs(),
-                                                    nchannels=acq_list.get_n_lasers(),
-                                                    nangles=acq_list.get_n_angles(),
-                                                    ntiles=acq_list.get_n_tiles(),
-                                                    blockdim=((1, 256, 256),),
-                                                    subsamp=subsamp,
-                                                    compression=compression)
+            if self.is_first_acquisition(acq, acq_list):
+                bdv_kwargs = dict(nilluminations=acq_list.get_n_shutter_configs(),
+                                  nchannels=acq_list.get_n_lasers(),
+                                  nangles=acq_list.get_n_angles(),
+                                  ntiles=acq_list.get_n_tiles(),
+                                  blockdim=((1, 256, 256),),
+                                  subsamp=subsamp,
+                                  compression=compression)
+                if self.resuming:
+                    ''' Resumed acquisition list: keep the finished views of the existing file '''
+                    self.bdv_writer = ParallelBdvWriter(self.path, n_workers=compression_workers, resume=True, **bdv_kwargs)
+                    for index in self.completed_acquisitions:
+                        done_acq = acq_list[index]
+                        self.bdv_writer.append_existing_view(virtual_stack_dim=(done_acq.get_image_count(), self.x_pixels, self.y_pixels),
+                                                             **self.get_bdv_view_parameters(done_acq, acq_list, flip_flags))
+                elif compression is not None and compression_workers > 0:
+                    self.bdv_writer = ParallelBdvWriter(self.path, n_workers=compression_workers, **bdv_kwargs)
+                else:
+                    self.bdv_writer = npy2bdv.BdvWriter(self.path, **bdv_kwargs)
             # x and y need to be exchanged to account for the image rotation
             shape = (self.max_frame, self.x_pixels, self.y_pixels)
-            px_size_um = self.cfg.pixelsize[acq['zoom']]
-            sign_xyz = (1 - np.array(flip_flags)) * 2 - 1
-            if hasattr(self.cfg, "hdf5") and ('transpose_xy' in self.cfg.hdf5.keys()) and self.cfg.hdf5['transpose_xy']:
-                tile_translation = (sign_xyz[1] * acq['y_pos'] / px_size_um,
-                                    sign_xyz[0] * acq['x_pos'] / px_size_um,
-                                    sign_xyz[2] * acq['z_start'] / acq['z_step'])
-            else:
-                tile_translation = (sign_xyz[0] * acq['x_pos'] / px_size_um,
-                                    sign_xyz[1] * acq['y_pos'] / px_size_um,
-                                    sign_xyz[2] * acq['z_start'] / acq['z_step'])
-            affine_matrix = np.array(((1.0, 0.0, 0.0, tile_translation[0]),
-                                      (0.0, 1.0, 0.0, tile_translation[1]),
-                                      (0.0, 0.0, 1.0, tile_translation[2])))
             self.bdv_writer.append_view(stack=None, virtual_stack_dim=shape,
-                                        illumination=acq_list.find_value_index(acq['shutterconfig'], 'shutterconfig'),
-                                        channel=acq_list.find_value_index(acq['laser'], 'laser'),
-                                        angle=acq_list.find_value_index(acq['rot'], 'rot'),
-                                        tile=acq_list.get_tile_index(acq),
-                                        voxel_units='um',
-                                        voxel_size_xyz=(px_size_um, px_size_um, acq['z_step']),
-                                        calibration=(1.0, 1.0, acq['z_step']/px_size_um),
-                                        m_affine=affine_matrix,
-                                        name_affine="Translation to Regular Grid"
-                                        )
+                                        **self.get_bdv_view_parameters(acq, acq_list, flip_flags))
+        elif self.file_extension == '.zarr':
+            if hasattr(self.cfg, "zarr"):
+                zarr_cfg = self.cfg.zarr
+            else:
+                zarr_cfg = {}
+            # create writer object if the view is first in the list
+            if self.is_first_acquisition(acq, acq_list):
+                self.zarr_writer = OMEZarrWriter(self.path,
+                                                 chunks=zarr_cfg.get('chunks', (16, 256, 256)),
+                                                 n_levels=zarr_cfg.get('levels', 4),
+                                                 downsampling=zarr_cfg.get('downsampling', (2, 2, 2)),
+                                                 compression=zarr_cfg.get('compression', 'zstd'),
+                                                 clevel=zarr_cfg.get('clevel', 3),
+                                                 resume=self.resuming)
+            # x and y need to be exchanged to account for the image rotation
+            shape = (self.max_frame, self.x_pixels, self.y_pixels)
+            px_size_um = self.cfg.pixelsize[acq['zoom']]
+            self.zarr_writer.append_view(shape,
+                                         tile=acq_list.get_tile_index(acq),
+                                         channel=acq_list.find_value_index(acq['laser'], 'laser'),
+                                         illumination=acq_list.find_value_index(acq['shutterconfig'], 'shutterconfig'),
+                                         angle=acq_list.find_value_index(acq['rot'], 'rot'),
+                                         voxel_size_zyx=(abs(acq['z_step']), px_size_um, px_size_um),
+                                         translation_zyx=(acq['z_start'], acq['y_pos'], acq['x_pos']),
+                                         view_attrs={'laser': acq['laser'], 'filter': acq['filter'],
+                                                     'shutterconfig': acq['shutterconfig'], 'rot': acq['rot'],
+                                                     'zoom': acq['zoom'], 'x_pos': acq['x_pos'], 'y_pos': acq['y_pos'],
+                                                     'z_start': acq['z_start'], 'z_end': acq['z_end'],
+                                                     'z_step': acq['z_step']})
         elif self.file_extension == '.raw':
-            self.fsize = self.x_pixels*self.y_pixels
-            self.xy_stack = np.memmap(self.path, mode="write", dtype=np.uint16, shape=self.fsize * self.max_frame)
-
-        elif self.file_extension in self.tiff_aliases:
-            self.tiff_writer = tifffile.TiffWriter(self.path, imagej=True)
+            self.raw_writer = RawWriter(self.path, (self.x_pixels, self.y_pixels), self.max_frame, direct_io=self.raw_direct_io)
 
-        elif self.file_extension in self.bigtiff_aliases:
-            self.tiff_writer = tifffile.TiffWriter(self.path, bigtiff=True)
+        elif self.file_extension in self.tiff_aliases + self.bigtiff_aliases:
+            xy_res = (1./self.cfg.pixelsize[acq['zoom']], 1./self.cfg.pixelsize[acq['zoom']])
+            self.tiff_writer = TiffBatchWriter(self.path, (self.x_pixels, self.y_pixels), self.max_frame,
+                                               batch_size=self.tiff_batch_size,
+                                               bigtiff=self.file_extension in self.bigtiff_aliases,
+                                               resolution=xy_res, metadata={'spacing': acq['z_step'], 'unit': 'um'})
 
-        if acq['processing'] == 'MAX' and self.file_extension in (('.raw',) + self.tiff_aliases + self.bigtiff_aliases):
-            self.tiff_mip_writer = tifffile.TiffWriter(self.file_root + "_MAX.tiff", imagej=True)
-            self.mip_image = np.zeros((self.y_pixels, self.x_pixels), 'uint16')
+        projection_modes = get_projection_modes(acq['processing'])
+        if projection_modes:
+            # x and y need to be exchanged to account for the image rotation
+            self.projector = StackProjector((self.max_frame, self.x_pixels, self.y_pixels), projection_modes)
+            if acq_list.is_single_file_format(acq['filename']):
+                ''' All views share the file name, projection files are named by view '''
+                self.projection_file_root = self.file_root + '_' + get_view_name(acq_list.get_tile_index(acq),
+                                                                                 acq_list.find_value_index(acq['laser'], 'laser'),
+                                                                                 acq_list.find_value_index(acq['shutterconfig'], 'shutterconfig'),
+                                                                                 acq_list.find_value_index(acq['rot'], 'rot'))
+            else:
+                self.projection_file_root = self.file_root
+        else:
+            self.projector = None
 
         self.cur_image = 0
         self.running = True
+        self.abort_event.clear()
+        self.writer_error = None
+        self.reset_writer_statistics()
+        if self.async_writing:
+            self.start_writer_thread()
+
+    def get_bdv_view_parameters(self, acq, acq_list, flip_flags):
+        '''View attributes and transformation of an acquisition, as npy2bdv.BdvWriter.append_view() arguments'''
+        px_size_um = self.cfg.pixelsize[acq['zoom']]
+        sign_xyz = (1 - np.array(flip_flags)) * 2 - 1
+        if hasattr(self.cfg, "hdf5") and ('transpose_xy' in self.cfg.hdf5.keys()) and self.cfg.hdf5['transpose_xy']:
+            tile_translation = (sign_xyz[1] * acq['y_pos'] / px_size_um,
+                                sign_xyz[0] * acq['x_pos'] / px_size_um,
+                                sign_xyz[2] * acq['z_start'] / acq['z_step'])
+        else:
+            tile_translation = (sign_xyz[0] * acq['x_pos'] / px_size_um,
+                                sign_xyz[1] * acq['y_pos'] / px_size_um,
+                                sign_xyz[2] * acq['z_start'] / acq['z_step'])
+        affine_matrix = np.array(((1.0, 0.0, 0.0, tile_translation[0]),
+                                  (0.0, 1.0, 0.0, tile_translation[1]),
+                                  (0.0, 0.0, 1.0, tile_translation[2])))
+        return dict(illumination=acq_list.find_value_index(acq['shutterconfig'], 'shutterconfig'),
+                    channel=acq_list.find_value_index(acq['laser'], 'laser'),
+                    angle=acq_list.find_value_index(acq['rot'], 'rot'),
+                    tile=acq_list.get_tile_index(acq),
+                    voxel_units='um',
+                    voxel_size_xyz=(px_size_um, px_size_um, acq['z_step']),
+                    calibration=(1.0, 1.0, acq['z_step']/px_size_um),
+                    m_affine=affine_matrix,
+                    name_affine="Translation to Regular Grid")
+
+    def set_resume_state(self, resuming, completed_acquisitions=()):
+        '''Set before an acquisition list is started. When an interrupted acquisition list is resumed,
+        files are appended to, and completed_acquisitions are the indices of acquisitions finished previously.'''
+        self.resuming = resuming
+        self.completed_acquisitions = list(completed_acquisitions)
+
+    def is_first_acquisition(self, acq, acq_list):
+        '''True for the first acquisition written to disk: acq_list[0], or the first unfinished one when resuming'''
+        remaining = [a for i, a in enumerate(acq_list) if i not in self.completed_acquisitions]
+        return acq == remaining[0]
+
+    def validate_acquisition(self, acq, acq_list):
+        '''Check that the file of a finished acquisition is complete, before an acquisition list is resumed.
+
+        Returns:
+            An error message, or '' if the file is valid.
+        '''
+        path = os.path.realpath(acq['folder'] + '/' + acq['filename'])
+        extension = os.path.splitext(path)[1]
+        # x and y need to be exchanged to account for the image rotation
+        shape = (acq.get_image_count(), self.parent.x_pixels, self.parent.y_pixels)
+        if not os.path.exists(path):
+            return f'{path}: file not found'
+        try:
+            if extension == '.raw':
+                expected_size = int(np.prod(shape)) * 2
+                if os.path.getsize(path) != expected_size:
+                    return f'{path}: size {os.path.getsize(path)} bytes, expected {expected_size} bytes'
+            elif extension in self.tiff_aliases + self.bigtiff_aliases:
+                with tifffile.TiffFile(path) as tif:
+                    if tif.series[0].shape != shape:
+                        return f'{path}: stack shape {tif.series[0].shape}, expected {shape}'
+            elif extension == '.h5':
+                import h5py
+                isetup = np.ravel_multi_index((acq_list.find_value_index(acq['shutterconfig'], 'shutterconfig'),
+                                               acq_list.find_value_index(acq['laser'], 'laser'),
+                                               acq_list.get_tile_index(acq),
+                                               acq_list.find_value_index(acq['rot'], 'rot')),
+                                              (acq_list.get_n_shutter_configs(), acq_list.get_n_lasers(),
+                                               acq_list.get_n_tiles(), acq_list.get_n_angles()))
+                dataset_name = f't00000/s{isetup:02d}/0/cells'
+                with h5py.File(path, 'r') as file:
+                    if dataset_name not in file:
+                        return f'{path}: view {dataset_name} not found'
+                    if file[dataset_name].shape != shape:
+                        return f'{path}: view {dataset_name} shape {file[dataset_name].shape}, expected {shape}'
+            elif extension == '.zarr':
+                view_name = get_view_name(acq_list.get_tile_index(acq),
+                                          acq_list.find_value_index(acq['laser'], 'laser'),
+                                          acq_list.find_value_index(acq['shutterconfig'], 'shutterconfig'),
+                                          acq_list.find_value_index(acq['rot'], 'rot'))
+                if view_name not in read_finished_views(path):
+                    return f'{path}: view {view_name} is incomplete'
+        except Exception as e:
+            return f'{path}: file cannot be read ({e})'
+        return ''
+
+    def reset_writer_statistics(self):
+        self.writer_stats = {'frames_queued': 0,
+                             'max_queue_depth': 0,
+                             'blocked_puts': 0,
+                             'time_blocked': 0.0,
+                             'time_writing': 0.0,
+                             'bytes_written': 0,
+                             }
+        if self.frame_ring is not None:
+            self.frame_ring.reset_statistics()
+
+    def start_writer_thread(self):
+        '''Start a writer thread that consumes frames from a bounded queue.
+
+        The queue depth limits the memory used by waiting frames. If the queue is full,
+        write_image() blocks the camera thread until the writer catches up (backpressure).
+        '''
+        self.frame_queue = queue.Queue(maxsize=self.queue_depth)
+        self.writer_thread = threading.Thread(target=self._writer_loop, name='mesoSPIM_ImageWriter', daemon=True)
+        self.writer_thread.start()
+        logger.info(f'Image Writer: writer thread started, queue depth {self.queue_depth}')
+
+    def _writer_loop(self):
+        while True:
+            item = self.frame_queue.get()
+            try:
+                if item is None:
+                    break
+                frame, acq, acq_list = item
+                try:
+                    if not self.abort_event.is_set():  # discard frames still queued after abort
+                        self.write_plane(frame.data, acq, acq_list)
+                finally:
+                    frame.release()
+            except Exception as e:
+                self.report_writer_error(e)
+            finally:
+                self.frame_queue.task_done()
+
+    def report_writer_error(self, error):
+        '''The first write error of a stack: the following frames are discarded and the core stops the acquisition'''
+        logger.error(f'Image Writer: write error: {error}')
+        if self.writer_error is None:
+            self.writer_error = error
+            self.abort_event.set()
+            self.sig_writer_error.emit(f'{self.filename}: {error}')
+
+    def stop_writer_thread(self, drain=True):
+        '''Stop the writer thread.
+
+        Args:
+            drain (bool): if True, all queued frames are written before the thread exits,
+            otherwise the queued frames are discarded (e.g. when acquisition is aborted).
+        '''
+        if self.writer_thread is None:
+            return
+        if not drain:
+            self.abort_event.set()
+        self.frame_queue.put(None)
+        self.writer_thread.join()
+        self.writer_thread = None
+        logger.info(f'Image Writer: writer thread stopped, statistics: {self.writer_stats}, '
+                    f'frame buffers: {self.frame_ring.stats if self.frame_ring is not None else None}')
+
+    def acquire_frame(self, shape, dtype=np.uint16):
+        '''Buffer for the next rotated camera frame (FrameSlot), see mesoSPIM_Camera.add_images_to_series().
+
+        The buffers are recycled from a ring: queue_depth + 2 slots with asynchronous writing (the queued frames,
+        the frame being written and the next camera frame), 1 slot otherwise. The caller hands its reference over
+        to write_image(), the slot is released when the frame is written. The .zarr writer keeps planes
+        for the z-downsampling: they get their own buffers.
+        '''
+        if self.file_extension == '.zarr':
+            return FrameSlot.unpooled(shape, dtype)
+        n_slots = self.queue_depth + 2 if self.writer_thread is not None else 1
+        if self.frame_ring is None or self.frame_ring.n_slots != n_slots or not self.frame_ring.fits(shape, dtype):
+            self.frame_ring = FrameRing(n_slots, shape, dtype)
+        return self.frame_ring.acquire()
+
+    def write_image(self, frame, acq, acq_list):
+        '''Write a single plane (FrameSlot from acquire_frame()), or put it into the writer queue
+        if asynchronous writing is enabled. The frame is released once it is written.'''
+        if self.running and self.abort_event.is_set():
+            frame.release()
+        elif self.running:
+            if self.writer_thread is not None:
+                item = (frame, acq, acq_list)
+                try:
+                    self.frame_queue.put_nowait(item)
+                except queue.Full:
+                    t_start = time.time()
+                    self.frame_queue.put(item)
+                    self.writer_stats['blocked_puts'] += 1
+                    self.writer_stats['time_blocked'] += time.time() - t_start
+                self.writer_stats['frames_queued'] += 1
+                self.writer_stats['max_queue_depth'] = max(self.writer_stats['max_queue_depth'], self.frame_queue.qsize())
+                self.set_writer_backlog(self.frame_queue.qsize() > self.queue_depth // 2)
+            else:
+                try:
+                    self.write_plane(frame.data, acq, acq_list)
+                except Exception as e:
+                    self.report_writer_error(e)
+                finally:
+                    frame.release()
+        else:
+            frame.release()
+            logger.info("No image, running terminated")
+
+    def set_writer_backlog(self, backlog):
+        ''' Signals only changes, background conversions are paused during a backlog '''
+        if backlog != self.writer_backlog:
+            self.writer_backlog = backlog
+            self.sig_writer_backlog.emit(backlog)
 
-    def write_image(self, image, acq, acq_list):
+    def write_plane(self, image, acq, acq_list):
+        '''Write a single plane to disk, in the thread that calls it.'''
+        t_start = time.perf_counter()
         if self.running:
-            xy_res = (1./self.cfg.pixelsize[acq['zoom']], 1./self.cfg.pixelsize[acq['zoom']])
             if self.file_extension == '.h5':
                 self.bdv_writer.append_plane(plane=image, z=self.cur_image,
                                              illumination=acq_list.find_value_index(acq['shutterconfig'], 'shutterconfig'),
@@ -141,39 +413,51 @@ class mesoSPIM_ImageWriter(QtCore.QObject):
                                              angle=acq_list.find_value_index(acq['rot'], 'rot'),
                                              tile=acq_list.get_tile_index(acq)
                                              )
+            elif self.file_extension == '.zarr':
+                self.zarr_writer.append_plane(image)
             elif self.file_extension == '.raw':
-                self.xy_stack[self.cur_image*self.fsize:(self.cur_image+1)*self.fsize] = image.flatten()
+                self.raw_writer.write(image)
             elif self.file_extension in self.tiff_aliases + self.bigtiff_aliases:
-                self.tiff_writer.write(image[np.newaxis,...], contiguous=True, resolution=xy_res,
-                                       metadata={'spacing': acq['z_step'], 'unit': 'um'})
+                self.tiff_writer.write(image)
 
-            if acq['processing'] == 'MAX' and self.file_extension in (('.raw',) + self.tiff_aliases + self.bigtiff_aliases):
-                self.mip_image = np.maximum(self.mip_image, image)
+            if self.projector is not None:
+                self.projector.add_plane(image)
 
             self.cur_image += 1
-        else:
-            logger.info("No image, running terminated")
+            self.writer_stats['bytes_written'] += image.nbytes
+            duration = time.perf_counter() - t_start
+            self.writer_stats['time_writing'] += duration
+            trace.add_span('write', 'writer', t_start, duration)
 
     def abort_writing(self):
         """Terminate writing and close all files if STOP button is pressed"""
         if self.running:
+            self.running = False
+            self.stop_writer_thread(drain=False)
+            self.set_writer_backlog(False)
             try:
                 if self.file_extension == '.h5':
                     self.bdv_writer.close()
+                elif self.file_extension == '.zarr':
+                    self.zarr_writer.close(complete=False)
                 elif self.file_extension == '.raw':
-                    del self.xy_stack
+                    self.raw_writer.close()
                 elif self.file_extension in (self.tiff_aliases + self.bigtiff_aliases):
                     self.tiff_writer.close()
                 self.metadata_file.close()
             except Exception as e:
                 logger.error(f'{e}')
             print("Writing terminated, files closed")
-            self.running = False
         else:
             pass
 
     def end_acquisition(self, acq, acq_list):
         logger.info("end_acquisition() started")
+        with trace.span('flush', 'writer'):
+            self.stop_writer_thread(drain=True)
+        if self.writer_error is not None:
+            logger.error(f'Image Writer: {self.path} is incomplete, writing failed: {self.writer_error}')
+        t_start = time.perf_counter()
         if self.file_extension == '.h5':
             if acq == acq_list[-1]:
                 try:
@@ -187,9 +471,21 @@ class mesoSPIM_ImageWriter(QtCore.QObject):
                     self.bdv_writer.close()
                 except:
                     logger.error(f'HDF5 file could not be closed: {sys.exc_info()}')
+        elif self.file_extension == '.zarr':
+            try:
+                self.zarr_writer.close_view()
+                if acq == acq_list[-1]:
+                    self.zarr_writer.set_attribute_labels('channel', acq_list.get_unique_attr_list('laser'))
+                    self.zarr_writer.set_attribute_labels('illumination', acq_list.get_unique_attr_list('shutterconfig'))
+                    self.zarr_writer.set_attribute_labels('angle', acq_list.get_unique_attr_list('rot'))
+                    self.zarr_writer.close()
+            except Exception as e:
+                logger.error(f'OME-Zarr file could not be closed: {e}')
         elif self.file_extension == '.raw':
             try:
-                del self.xy_stack
+                self.raw_writer.close()
+                if self.conversion_format is not None and self.writer_error is None:
+                    self.sig_conversion_job.emit(self.get_conversion_job(acq, acq_list))
             except Exception as e:
                 logger.error(f'{e}')
         elif self.file_extension in (self.tiff_aliases + self.bigtiff_aliases):
@@ -197,16 +493,44 @@ class mesoSPIM_ImageWriter(QtCore.QObject):
                 self.tiff_writer.close()
             except Exception as e:
                 logger.error(f'{e}')
+        self.set_writer_backlog(False)
+        trace.add_span('close files', 'writer', t_start, filename=acq['filename'])
 
-        if acq['processing'] == 'MAX' and self.file_extension in (('.raw',) + self.tiff_aliases + self.bigtiff_aliases):
+        if self.projector is not None:
             try:
-                self.tiff_mip_writer.write(self.mip_image)
-                self.tiff_mip_writer.close()
+                self.projector.save(self.projection_file_root, pixel_size_um=self.cfg.pixelsize[acq['zoom']], z_step_um=acq['z_step'])
             except Exception as e:
-                logger.error(f'{e}')
+                logger.error(f'Projections could not be saved: {e}')
+            self.projector = None
 
+        try:
+            self.write_writer_statistics_to_metadata(acq)
+        except Exception as e:
+            logger.error(f'Writer statistics could not be written: {e}')
         self.running = False
 
+    def get_conversion_job(self, acq, acq_list):
+        '''Parameters for the background conversion of the finished .raw stack, see conversion_queue.convert_raw_stack()'''
+        px_size_um = self.cfg.pixelsize[acq['zoom']]
+        hdf5 = self.cfg.hdf5 if hasattr(self.cfg, 'hdf5') else {}
+        bdv_view = self.get_bdv_view_parameters(acq, acq_list, hdf5.get('flip_xyz', (False, False, False)))
+        ''' One view per converted file '''
+        bdv_view.update(illumination=0, channel=0, angle=0, tile=0)
+        return {'path': self.path,
+                'shape': (self.max_frame, self.x_pixels, self.y_pixels),
+                'target_format': self.conversion_format,
+                'max_read_mb_s': self.conversion_max_read_mb_s,
+                'pixel_size_um': px_size_um,
+                'z_step': acq['z_step'],
+                'hdf5': dict(hdf5),
+                'bdv_view': bdv_view,
+                'zarr': dict(self.cfg.zarr) if hasattr(self.cfg, 'zarr') else {},
+                'zarr_view': {'voxel_size_zyx': (abs(acq['z_step']), px_size_um, px_size_um),
+                              'translation_zyx': (acq['z_start'], acq['y_pos'], acq['x_pos']),
+                              'view_attrs': {'laser': acq['laser'], 'filter': acq['filter'],
+                                             'shutterconfig': acq['shutterconfig'], 'rot': acq['rot'],
+                                             'zoom': acq['zoom'], 'z_step': acq['z_step']}}}
+
     def write_snap_image(self, image):
         timestr = time.strftime("%Y%m%d-%H%M%S")
         filename = timestr + '.tif'
@@ -274,9 +598,9 @@ class mesoSPIM_ImageWriter(QtCore.QObject):
         path = acq['folder'] + '/' + acq['filename']
         metadata_path = os.path.dirname(path) + '/' + os.path.basename(path) + '_meta.txt'
 
-        if acq['filename'][-3:] == '.h5':
-            if acq == acq_list[0]:
-                self.metadata_file = open(metadata_path, 'w')
+        if acq_list.is_single_file_format(acq['filename']):
+            if self.is_first_acquisition(acq, acq_list):
+                self.metadata_file = open(metadata_path, 'a' if self.resuming else 'w')
         else:
             self.metadata_file = open(metadata_path, 'w')
 
@@ -327,12 +651,47 @@ class mesoSPIM_ImageWriter(QtCore.QObject):
         self.write_line(self.metadata_file, 'x_pixels', self.cfg.camera_parameters['x_pixels'])
         self.write_line(self.metadata_file, 'y_pixels', self.cfg.camera_parameters['y_pixels'])
 
-        if acq['filename'][-3:] == '.h5':
+        if acq_list.is_single_file_format(acq['filename']):
             if acq == acq_list[-1]:
                 self.metadata_file.close()
         else:
             self.metadata_file.close()
 
+    def write_writer_statistics_to_metadata(self, acq):
+        '''Appends the writer queue statistics (backpressure) to the metadata file.
+
+        For .h5 files, the metadata file of the whole acquisition list can still be open.
+        '''
+        if self.metadata_file is not None and not self.metadata_file.closed:
+            self.write_writer_statistics(self.metadata_file)
+        else:
+            path = acq['folder'] + '/' + acq['filename']
+            metadata_path = os.path.dirname(path) + '/' + os.path.basename(path) + '_meta.txt'
+            with open(metadata_path, 'a') as file:
+                self.write_writer_statistics(file)
+
+    def write_writer_statistics(self, file):
+        self.write_line(file)
+        self.write_line(file, 'WRITER STATISTICS')
+        self.write_line(file, 'Asynchronous writing', self.async_writing)
+        self.write_line(file, 'Queue depth', self.queue_depth)
+        self.write_line(file, 'Frames written', self.cur_image)
+        self.write_line(file, 'Max queue depth reached', self.writer_stats['max_queue_depth'])
+        self.write_line(file, 'Camera thread blocked (frames)', self.writer_stats['blocked_puts'])
+        self.write_line(file, 'Camera thread blocked (s)', f"{self.writer_stats['time_blocked']:.3f}")
+        self.write_line(file, 'Time spent writing (s)', f"{self.writer_stats['time_writing']:.3f}")
+        if self.frame_ring is not None:
+            self.write_line(file, 'Frame buffers (max in use / slots)', f"{self.frame_ring.stats['max_in_use']} / {self.frame_ring.n_slots}")
+            self.write_line(file, 'Frame buffer overruns (frames)', self.frame_ring.stats['overruns'])
+            self.write_line(file, 'Camera thread waiting for frame buffers (s)', f"{self.frame_ring.stats['time_waiting']:.3f}")
+        if self.writer_stats['time_writing'] > 0:
+            write_speed = self.writer_stats['bytes_written'] / self.writer_stats['time_writing'] / 2**20
+            self.write_line(file, 'Sustained write speed (MB/s)', f"{write_speed:.1f}")
+        if self.file_extension == '.raw' and self.raw_writer is not None:
+            self.write_line(file, 'Raw file preallocated', self.raw_writer.preallocated)
+            self.write_line(file, 'Raw direct I/O', self.raw_writer.direct_io)
+            self.write_line(file, 'Raw disk write speed (MB/s)', f"{self.raw_writer.get_write_speed():.1f}")
+
     def append_timing_info_to_metadata(self, acq, **kwargs):
         '''
         Appends a metadata.txt file
@@ -21,6 +21,8 @@ from .mesoSPIM_ScriptWindow import mesoSPIM_ScriptWindow # do not delete this li
 
 from .mesoSPIM_State import mesoSPIM_StateSingleton
 from .mesoSPIM_Core import mesoSPIM_Core
+from .utils.conversion_queue import ConversionQueue
+from .mesoSPIM_RemoteControl import mesoSPIM_RemoteControl
 from .devices.joysticks.mesoSPIM_JoystickHandlers import mesoSPIM_JoystickHandler
 
 logger = logging.getLogger(__name__)
@@ -158,6 +160,21 @@ class mesoSPIM_MainWindow(QtWidgets.QMainWindow):
         self.optimizer = None
         self.contrast_window = None
 
+        # Background conversion of finished .raw stacks, progress is shown in the status bar
+        self.conversion_queue = None
+        if hasattr(self.cfg, 'conversion') and self.cfg.conversion.get('enabled', False):
+            self.conversion_queue = ConversionQueue(n_workers=self.cfg.conversion.get('n_workers', 1))
+            self.conversion_status_label = QtWidgets.QLabel()
+            self.statusBar().addPermanentWidget(self.conversion_status_label)
+            self.conversion_queue.sig_progress.connect(self.conversion_status_label.setText)
+            self.core.camera_worker.image_writer.sig_conversion_job.connect(self.conversion_queue.add_job)
+            self.core.camera_worker.image_writer.sig_writer_backlog.connect(self.conversion_queue.set_paused)
+
+        # Local remote-control server, its requests are handled like the buttons
+        self.remote_control = None
+        if hasattr(self.cfg, 'remote_control') and self.cfg.remote_control.get('enabled', False):
+            self.launch_remote_control()
+
         # The signal switchboard, MainWindow -> Core
         self.sig_launch_optimizer.connect(self.launch_optimizer)
         self.sig_launch_contrast_window.connect(self.launch_contrast_window)
@@ -177,6 +194,29 @@ class mesoSPIM_MainWindow(QtWidgets.QMainWindow):
 
         self.enable_gui_updates_from_state(False)
 
+    def launch_remote_control(self):
+        rc_cfg = self.cfg.remote_control
+        try:
+            self.remote_control = mesoSPIM_RemoteControl(host=rc_cfg.get('host', '127.0.0.1'),
+                                                         port=rc_cfg.get('port', 8642),
+                                                         token=rc_cfg.get('token', None),
+                                                         max_frame_size=rc_cfg.get('max_frame_size', 512))
+        except (OSError, ValueError) as e:
+            self.display_warning(f'Remote control server could not be started: {e}')
+            return
+        self.remote_control.sig_start.connect(lambda resume: self.resume_acquisition_list() if resume else self.run_acquisition_list())
+        self.remote_control.sig_stop.connect(lambda: self.sig_state_request.emit({'state':'idle'}))
+        self.remote_control.sig_pause.connect(self.core.pause)
+        self.remote_control.sig_state_request.connect(self.sig_state_request.emit)
+        self.remote_control.sig_move_absolute.connect(self.sig_move_absolute.emit)
+        self.remote_control.sig_move_relative.connect(self.sig_move_relative.emit)
+        self.remote_control.sig_acquisition_list.connect(self.acquisition_manager_window.set_acquisition_list)
+        self.core.sig_progress.connect(self.remote_control.publish_progress)
+        self.core.sig_status_message.connect(self.remote_control.publish_status)
+        self.core.sig_warning.connect(self.remote_control.publish_warning)
+        self.core.camera_worker.sig_camera_frame.connect(self.remote_control.set_frame)
+        self.remote_control.start()
+
     def open_webcam_window(self):
         """Open USB webcam window using cam ID specified in config file. Otherwise, try to open with ID=0"""
         if self.webcam_window is None: # first call
@@ -213,6 +253,10 @@ class mesoSPIM_MainWindow(QtWidgets.QMainWindow):
             pass
         if self.contrast_window:
             self.contrast_window.close()
+        if self.conversion_queue:
+            self.conversion_queue.shutdown()
+        if self.remote_control:
+            self.remote_control.shutdown()
         self.close()
 
     def open_tiff(self):
@@ -335,6 +379,7 @@ class mesoSPIM_MainWindow(QtWidgets.QMainWindow):
     def initialize_and_connect_menubar(self):
         self.actionExit.triggered.connect(self.close_app)
         self.actionOpen_TIFF.triggered.connect(self.open_tiff)
+        self.actionResume_Acquisition_List.triggered.connect(self.resume_acquisition_list)
         self.actionOpen_Camera_Window.triggered.connect(self.camera_window.show)
         self.actionOpen_Webcam_Window.triggered.connect(self.open_webcam_window)
         self.actionOpen_Acquisition_Manager.triggered.connect(self.acquisition_manager_window.show)
@@ -639,6 +684,15 @@ class mesoSPIM_MainWindow(QtWidgets.QMainWindow):
             self.win_taskbar_button.progress().setVisible(True)
         '''
 
+    def resume_acquisition_list(self):
+        '''Continue an interrupted acquisition list: finished acquisitions are skipped, the interrupted one is repeated'''
+        self.state['selected_row'] = -1
+        self.sig_state_request.emit({'state':'resume_acquisition_list'})
+        self.enable_mode_control_buttons(False)
+        self.enable_gui_updates_from_state(True)
+        self.enable_stop_button(True)
+        self.enable_gui(False)
+
     def run_lightsheet_alignment_mode(self):
         self.sig_state_request.emit({'state':'lightsheet_alignment_mode'})
         self.set_progressbars_to_busy()
@@ -0,0 +1,294 @@
+'''
+mesoSPIM_RemoteControl.py
+========================================
+
+Local HTTP server to control the mesoSPIM from other programs, e.g. lab automation.
+Requests and replies are JSON; progress, status messages and new frames are published as server-sent events.
+
+    GET  /status                  state, position, progress, predicted times
+    GET  /position                stage position
+    GET  /acquisition_list        acquisition table: list of acquisition dictionaries
+    POST /acquisition_list        replaces the acquisition table, body: list of acquisition dictionaries
+    POST /start                   runs the acquisition table, body (optional): {"resume": true}
+    POST /stop                    stops the running mode, e.g. the acquisition
+    POST /pause                   body: {"paused": true} or {"paused": false}
+    POST /state                   state requests as from the user interface, e.g. {"laser": "488 nm", "intensity": 20}
+    POST /move_absolute           e.g. {"x_abs": 1000, "y_abs": 0}
+    POST /move_relative           e.g. {"z_rel": 10}
+    GET  /frame                   last displayed frame, downsampled, as .npy file (header X-Frame-Number)
+    GET  /events                  server-sent events: progress, status, warning and frame
+
+The server listens on the local host only by default, other hosts require a token. If a token is set
+in the config file, every request needs the header 'Authorization: Bearer <token>'.
+POST requests need the header 'Content-Type: application/json'. Requests from web pages of other sites
+(with an 'Origin' header that is not the local host) are refused, so that a browser cannot be used
+to control the microscope.
+
+The requests are passed on with Qt signals, like the buttons of the user interface:
+the server threads never call the core directly.
+'''
+import io
+import json
+import queue
+import ipaddress
+import logging
+import threading
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from PyQt5 import QtCore
+
+from .mesoSPIM_State import mesoSPIM_StateSingleton
+from .utils.acquisitions import AcquisitionList
+from .utils.acquisition_io import acquisition_list_to_dicts, acquisition_list_from_dicts
+
+logger = logging.getLogger(__name__)
+
+STATUS_KEYS = ('state', 'position', 'laser', 'intensity', 'filter', 'zoom', 'shutterconfig',
+               'predicted_acq_list_time', 'remaining_acq_list_time')
+
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+
+def is_loopback(host):
+    '''True if the host name or address only accepts connections from this computer'''
+    if host in LOCAL_HOSTS:
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class mesoSPIM_RemoteControl(QtCore.QObject):
+    '''Local control server, the requests are emitted as signals connected by the Main Window'''
+    sig_state_request = QtCore.pyqtSignal(dict)
+    sig_start = QtCore.pyqtSignal(bool) # resume
+    sig_stop = QtCore.pyqtSignal()
+    sig_pause = QtCore.pyqtSignal(bool)
+    sig_move_absolute = QtCore.pyqtSignal(dict)
+    sig_move_relative = QtCore.pyqtSignal(dict)
+    sig_acquisition_list = QtCore.pyqtSignal(AcquisitionList)
+
+    def __init__(self, host='127.0.0.1', port=8642, token=None, max_frame_size=512, max_events_queued=1000):
+        super().__init__()
+        if not is_loopback(host) and not token:
+            raise ValueError(f"Remote control: listening on '{host}' requires a token, set 'token' in the config file")
+        self.state = mesoSPIM_StateSingleton()
+        self.token = token
+        self.max_frame_size = max_frame_size
+        self.max_events_queued = max_events_queued
+        self.progress = {}
+        self.frame = None
+        self.frame_number = 0
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), _RequestHandler)
+        self.server.daemon_threads = True
+        self.server.remote_control = self
+        self.server_thread = threading.Thread(target=self.server.serve_forever, name='mesoSPIM_RemoteControl', daemon=True)
+
+    def start(self):
+        self.server_thread.start()
+        logger.info(f'Remote control: listening on http://{self.server.server_address[0]}:{self.server.server_address[1]}')
+
+    def shutdown(self):
+        self.publish('shutdown', {})
+        self.server.shutdown()
+        self.server.server_close()
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.max_events_queued)
+        with self.lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.remove(subscriber)
+
+    def publish(self, event, data):
+        ''' Slow clients lose events, they never block the acquisition '''
+        with self.lock:
+            for subscriber in self.subscribers:
+                try:
+                    subscriber.put_nowait((event, data))
+                except queue.Full:
+                    pass
+
+    @QtCore.pyqtSlot(dict)
+    def publish_progress(self, progress):
+        self.progress = progress
+        self.publish('progress', progress)
+
+    @QtCore.pyqtSlot(str)
+    def publish_status(self, string):
+        self.publish('status', {'message': string})
+
+    @QtCore.pyqtSlot(str)
+    def publish_warning(self, string):
+        self.publish('warning', {'message': string})
+
+    @QtCore.pyqtSlot(np.ndarray)
+    def set_frame(self, image):
+        ''' Downsampled copy, at most max_frame_size pixels wide: it is encoded only when requested '''
+        step = max(1, -(-max(image.shape) // self.max_frame_size))
+        self.frame = image[::step, ::step].copy()
+        self.frame_number += 1
+        self.publish('frame', {'frame_number': self.frame_number, 'shape': self.frame.shape})
+
+    def get_status(self):
+        status = self.state.get_parameter_dict(STATUS_KEYS)
+        status['progress'] = self.progress
+        status['n_acquisitions'] = len(self.state['acq_list'])
+        status['frame_number'] = self.frame_number
+        return status
+
+    def get_frame(self):
+        frame, frame_number = self.frame, self.frame_number
+        if frame is None:
+            return None, frame_number
+        buffer = io.BytesIO()
+        np.save(buffer, frame)
+        return buffer.getvalue(), frame_number
+
+    def handle_get(self, path):
+        if path == '/status':
+            return self.get_status()
+        elif path == '/position':
+            return self.state['position']
+        elif path == '/acquisition_list':
+            return acquisition_list_to_dicts(self.state['acq_list'])
+        raise KeyError(path)
+
+    def check_idle(self):
+        if self.state['state'] != 'idle':
+            raise ValueError(f"The mesoSPIM is busy, state: {self.state['state']}")
+
+    def handle_post(self, path, body):
+        if path == '/acquisition_list':
+            self.check_idle()
+            acq_list = acquisition_list_from_dicts(body)
+            if len(acq_list) == 0:
+                raise ValueError('The acquisition list is empty')
+            self.sig_acquisition_list.emit(acq_list)
+        elif path == '/start':
+            self.check_idle()
+            self.sig_start.emit(bool(body.get('resume', False)))
+        elif path == '/stop':
+            self.sig_stop.emit()
+        elif path == '/pause':
+            self.sig_pause.emit(bool(body['paused']))
+        elif path == '/state':
+            self.sig_state_request.emit(dict(body))
+        elif path == '/move_absolute':
+            self.sig_move_absolute.emit(dict(body))
+        elif path == '/move_relative':
+            self.sig_move_relative.emit(dict(body))
+        else:
+            raise KeyError(path)
+        logger.info(f'Remote control: {path} {body}')
+        return {'accepted': True}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug('Remote control: ' + format % args)
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def is_authorized(self):
+        token = self.server.remote_control.token
+        if token and self.headers.get('Authorization') != f'Bearer {token}':
+            self.send_json({'error': 'unauthorized'}, 401)
+            return False
+        return True
+
+    def do_GET(self):
+        if not self.is_authorized():
+            return
+        remote_control = self.server.remote_control
+        if self.path == '/events':
+            self.stream_events()
+        elif self.path == '/frame':
+            frame, frame_number = remote_control.get_frame()
+            if frame is None:
+                self.send_json({'error': 'no frame yet'}, 404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(frame)))
+            self.send_header('X-Frame-Number', str(frame_number))
+            self.end_headers()
+            self.wfile.write(frame)
+        else:
+            try:
+                self.send_json(remote_control.handle_get(self.path))
+            except KeyError:
+                self.send_json({'error': f'unknown request {self.path}'}, 404)
+
+    def is_local_origin(self):
+        ''' Browsers send the origin of the page with cross-site requests, other clients usually send none '''
+        origin = self.headers.get('Origin')
+        if origin is None:
+            return True
+        host = urlsplit(origin).hostname
+        if host is not None and (is_loopback(host) or host == self.server.server_address[0]):
+            return True
+        self.send_json({'error': f'requests from {origin} are not allowed'}, 403)
+        return False
+
+    def is_json(self):
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type != 'application/json':
+            self.send_json({'error': 'Content-Type must be application/json'}, 415)
+            return False
+        return True
+
+    def do_POST(self):
+        if not (self.is_authorized() and self.is_local_origin() and self.is_json()):
+            self.close_connection = True # the body was not read
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length)) if length else {}
+            expected = list if self.path == '/acquisition_list' else dict
+            if not isinstance(body, expected):
+                raise TypeError(f'the request body must be a JSON {"array" if expected is list else "object"}')
+            self.send_json(self.server.remote_control.handle_post(self.path, body))
+        except KeyError as e:
+            self.send_json({'error': f'unknown request or missing parameter: {e}'}, 404 if self.path in str(e) else 400)
+        except (ValueError, TypeError) as e:
+            self.send_json({'error': str(e)}, 400)
+
+    def stream_events(self):
+        ''' Server-sent events, a comment line is sent every 15 s to detect closed connections '''
+        remote_control = self.server.remote_control
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        subscriber = remote_control.subscribe()
+        try:
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=15)
+                    self.wfile.write(f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'.encode())
+                    if event == 'shutdown':
+                        break
+                except queue.Empty:
+                    self.wfile.write(b': keep-alive\n\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            remote_control.unsubscribe(subscriber)
+            self.close_connection = True
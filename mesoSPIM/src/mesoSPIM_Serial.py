@@ -6,10 +6,12 @@ This thread handles all connections with serial devices such as stages,
 filter wheels, zoom systems etc.
 '''
 
+import time
 import logging
 from PyQt5 import QtCore
 ''' Import mesoSPIM modules '''
 from .mesoSPIM_State import mesoSPIM_StateSingleton
+from .utils.timing_trace import trace
 from .mesoSPIM_FilterWheel import mesoSPIM_DemoFilterWheel, DynamixelFilterWheel, LudlFilterWheel, SutterLambda10BFilterWheel
 from .mesoSPIM_Zoom import DynamixelZoom, DemoZoom
 from .mesoSPIM_Stages import mesoSPIM_PI_1toN, mesoSPIM_PI_NtoN, mesoSPIM_ASI_Tiger_Stage, mesoSPIM_ASI_MS2000_Stage, mesoSPIM_DemoStage, mesoSPIM_GalilStages, mesoSPIM_PI_f_rot_and_Galil_xyz_Stages, mesoSPIM_PI_rot_and_Galil_xyzf_Stages, mesoSPIM_PI_rotz_and_Galil_xyf_Stages, mesoSPIM_PI_rotzf_and_Galil_xy_Stages
@@ -108,6 +110,7 @@ class mesoSPIM_Serial(QtCore.QObject):
         self.parent.sig_mark_rotation_position.connect(self.sig_mark_rotation_position.emit)
         self.parent.sig_go_to_rotation_position.connect(self.go_to_rotation_position)
         self.parent.sig_go_to_rotation_position_and_wait_until_done.connect(lambda: self.go_to_rotation_position(wait_until_done=True), type=3)
+        self.parent.sig_wait_until_serial_done.connect(self.wait_until_done, type=3)
 
     @QtCore.pyqtSlot(dict)
     def state_request_handler(self, sdict, wait_until_done=False):
@@ -131,6 +134,11 @@ class mesoSPIM_Serial(QtCore.QObject):
                 self.enable_ttl_motion(value)
                 logger.info(f'state change: {key}: {value}')
 
+    @QtCore.pyqtSlot()
+    def wait_until_done(self):
+        ''' Called by a blocking signal: returns when all requests queued before it (e.g. moves, TTL settings) are done '''
+        pass
+
     @QtCore.pyqtSlot(str)
     def send_status_message(self, string):
         self.sig_status_message.emit(string)
@@ -145,17 +153,21 @@ class mesoSPIM_Serial(QtCore.QObject):
 
     @QtCore.pyqtSlot(dict)
     def move_relative(self, sdict, wait_until_done=False):
+        t_start = time.perf_counter()
         if wait_until_done:
             self.stage.move_relative(sdict, wait_until_done=True)
         else:
             self.stage.move_relative(sdict)
+        trace.add_span('move relative', 'stage', t_start, wait_until_done=wait_until_done)
 
     @QtCore.pyqtSlot(dict)
     def move_absolute(self, sdict, wait_until_done=False):
+        t_start = time.perf_counter()
         if wait_until_done:
             self.stage.move_absolute(sdict, wait_until_done=True)
         else:
             self.stage.move_absolute(sdict)
+        trace.add_span('move absolute', 'stage', t_start, wait_until_done=wait_until_done)
 
     @QtCore.pyqtSlot(dict)
     def report_position(self, sdict):
@@ -163,19 +175,23 @@ class mesoSPIM_Serial(QtCore.QObject):
 
     @QtCore.pyqtSlot()
     def go_to_rotation_position(self, wait_until_done=False):
+        t_start = time.perf_counter()
         if wait_until_done:
             self.stage.go_to_rotation_position(wait_until_done=True)
         else:
             self.stage.go_to_rotation_position()
+        trace.add_span('go to rotation position', 'stage', t_start, wait_until_done=wait_until_done)
 
     @QtCore.pyqtSlot(str)
     def set_filter(self, sfilter, wait_until_done=False):
         # logger.info('Thread ID during set filter: '+str(int(QtCore.QThread.currentThreadId())))
+        t_start = time.perf_counter()
         if wait_until_done:
             self.filterwheel.set_filter(sfilter, wait_until_done=True)
         else:
             self.filterwheel.set_filter(sfilter, wait_until_done=False)
         self.state['filter'] = sfilter
+        trace.add_span('filter', 'serial', t_start, filter=sfilter, wait_until_done=wait_until_done)
 
     @QtCore.pyqtSlot(str)
     def set_zoom(self, zoom, wait_until_done=False):
@@ -184,10 +200,12 @@ class mesoSPIM_Serial(QtCore.QObject):
         this is to avoid laggy update loops with the GUI.'''
         self.state['zoom'] = zoom
         self.state['pixelsize'] = self.cfg.pixelsize[zoom]
+        t_start = time.perf_counter()
         if wait_until_done:
             self.zoom.set_zoom(zoom, wait_until_done=True)
         else:
             self.zoom.set_zoom(zoom, wait_until_done=False)
+        trace.add_span('zoom', 'serial', t_start, zoom=zoom, wait_until_done=wait_until_done)
 
     def execute_stage_program(self):
         self.stage.execute_program()
@@ -11,7 +11,7 @@ logger = logging.getLogger(__name__)
 
 '''National Instruments Imports'''
 import nidaqmx
-from nidaqmx.constants import AcquisitionType, TaskMode
+from nidaqmx.constants import AcquisitionType, TaskMode, RegenerationMode
 from nidaqmx.constants import LineGrouping, DigitalWidthUnits
 from nidaqmx.types import CtrTime
 
@@ -369,7 +369,7 @@ class mesoSPIM_WaveFormGenerator(QtCore.QObject):
         os.remove(etl_cfg_file)
         os.rename(tmp_etl_cfg_file, etl_cfg_file)
 
-    def create_tasks(self):
+    def create_tasks(self, planes=None):
         """Creates a tasks for the mesoSPIM:
 
         These are:
@@ -382,12 +382,19 @@ class mesoSPIM_WaveFormGenerator(QtCore.QObject):
           be on when the camera is acquiring) and the left/right ETL waveforms.
           This task is bundled with galvo-ETL task if a single DAQmx card is used, because multifunction DAQmx devices
           can only run only 1 AO hardware-timed task at a time (https://knowledge.ni.com/KnowledgeArticleDetails?id=kA00Z0000019KWYSA2&l=en-CH)
+
+        Args:
+            planes (int): continuous stack of this number of planes, the tasks are started and triggered once
+                for the whole stack: the counter tasks output a train of one pulse per sweep and the analog
+                outputs regenerate the waveforms of one sweep, for the same number of sweeps.
+                None: one sweep per run_tasks().
         """
         ah = self.cfg.acquisition_hardware
 
         self.calculate_samples()
         samplerate, sweeptime = self.state.get_parameter_list(['samplerate','sweeptime'])
         samples = self.samples
+        self.planes = planes
         camera_pulse_percent, camera_delay_percent = self.state.get_parameter_list(['camera_pulse_%','camera_delay_%'])
         self.master_trigger_task = nidaqmx.Task()
         self.camera_trigger_task = nidaqmx.Task()
@@ -415,9 +422,7 @@ class mesoSPIM_WaveFormGenerator(QtCore.QObject):
         self.camera_delay = camera_delay_percent*0.01*sweeptime
 
         '''Housekeeping: Setting up the counter task for the camera trigger'''
-        self.camera_trigger_task.co_channels.add_co_pulse_chan_time(ah['camera_trigger_out_line'],
-                                                                    high_time=self.camera_high_time,
-                                                                    initial_delay=self.camera_delay)
+        self.add_trigger_pulses(self.camera_trigger_task, ah['camera_trigger_out_line'], self.camera_high_time, self.camera_delay)
 
         self.camera_trigger_task.triggers.start_trigger.cfg_dig_edge_start_trig(ah['camera_trigger_source'])
 
@@ -430,30 +435,43 @@ class mesoSPIM_WaveFormGenerator(QtCore.QObject):
             stage_delay_percent = self.parent.read_config_parameter('stage_trigger_delay_%', self.cfg.asi_parameters)
             stage_high_time = stage_trigger_pulse_percent * 0.01 * sweeptime
             stage_delay = stage_delay_percent * 0.01 * sweeptime
-            self.stage_trigger_task.co_channels.add_co_pulse_chan_time(trig_line, high_time=stage_high_time, initial_delay=stage_delay)
+            self.add_trigger_pulses(self.stage_trigger_task, trig_line, stage_high_time, stage_delay)
             self.stage_trigger_task.triggers.start_trigger.cfg_dig_edge_start_trig(trig_source)
 
         '''Housekeeping: Setting up the AO task for the Galvo and setting the trigger input'''
         if self.ao_cards == 2:
             self.galvo_etl_task.ao_channels.add_ao_voltage_chan(ah['galvo_etl_task_line'])
-            self.galvo_etl_task.timing.cfg_samp_clk_timing(rate=samplerate,
-                                                       sample_mode=AcquisitionType.FINITE,
-                                                       samps_per_chan=samples)
+            self.configure_ao_timing(self.galvo_etl_task, samplerate, samples)
             self.galvo_etl_task.triggers.start_trigger.cfg_dig_edge_start_trig(ah['galvo_etl_task_trigger_source'])
 
             '''Housekeeping: Setting up the AO task for the ETL and lasers and setting the trigger input'''
             self.laser_task.ao_channels.add_ao_voltage_chan(ah['laser_task_line'])
-            self.laser_task.timing.cfg_samp_clk_timing(rate=samplerate,
-                                                        sample_mode=AcquisitionType.FINITE,
-                                                        samps_per_chan=samples)
+            self.configure_ao_timing(self.laser_task, samplerate, samples)
             self.laser_task.triggers.start_trigger.cfg_dig_edge_start_trig(ah['laser_task_trigger_source'])
         else:
             self.galvo_etl_laser_task.ao_channels.add_ao_voltage_chan(ah['galvo_etl_task_line'] + ',' + ah['laser_task_line'])
-            self.galvo_etl_laser_task.timing.cfg_samp_clk_timing(rate=samplerate,
-                                                       sample_mode=AcquisitionType.FINITE,
-                                                       samps_per_chan=samples)
+            self.configure_ao_timing(self.galvo_etl_laser_task, samplerate, samples)
             self.galvo_etl_laser_task.triggers.start_trigger.cfg_dig_edge_start_trig(ah['galvo_etl_task_trigger_source'])
 
+    def configure_ao_timing(self, task, samplerate, samples):
+        """Sample clock of an analog output task: a single sweep, or for continuous stacks the waveforms
+        of one sweep regenerated once per plane, so that the outputs stop with the last trigger pulse"""
+        if self.planes is None:
+            task.timing.cfg_samp_clk_timing(rate=samplerate, sample_mode=AcquisitionType.FINITE, samps_per_chan=samples)
+        else:
+            task.timing.cfg_samp_clk_timing(rate=samplerate, sample_mode=AcquisitionType.FINITE, samps_per_chan=samples*self.planes)
+            task.out_stream.output_buf_size = samples
+            task.out_stream.regen_mode = RegenerationMode.ALLOW_REGENERATION
+
+    def add_trigger_pulses(self, task, line, high_time, initial_delay):
+        """Adds a counter output channel: a single pulse, or one pulse per sweep for continuous stacks"""
+        if self.planes is None:
+            task.co_channels.add_co_pulse_chan_time(line, high_time=high_time, initial_delay=initial_delay)
+        else:
+            sweeptime = self.state['sweeptime']
+            task.co_channels.add_co_pulse_chan_time(line, low_time=sweeptime-high_time, high_time=high_time, initial_delay=initial_delay)
+            task.timing.cfg_implicit_timing(sample_mode=AcquisitionType.FINITE, samps_per_chan=self.planes)
+
     def write_waveforms_to_tasks(self):
         """Write the waveforms to the slave tasks"""
         if self.ao_cards == 2:
@@ -486,7 +504,7 @@ class mesoSPIM_WaveFormGenerator(QtCore.QObject):
         For this to work, all analog output and counter tasks have to be started so
         that they are waiting for the trigger signal.
         """
-        self.master_trigger_task.write([False, True, True, True, False], auto_start=True)
+        self.trigger_tasks()
 
         '''Wait until everything is done - this is effectively a sleep function.'''
         if self.ao_cards == 2:
@@ -498,6 +516,11 @@ class mesoSPIM_WaveFormGenerator(QtCore.QObject):
         if self.cfg.stage_parameters['stage_type'] in {'TigerASI'}:
             self.stage_trigger_task.wait_until_done()
 
+    def trigger_tasks(self):
+        """Sends the master trigger to the started tasks and returns immediately.
+        For continuous stacks, the tasks then run for all planes of the stack, or until stop_tasks() is called."""
+        self.master_trigger_task.write([False, True, True, True, False], auto_start=True)
+
     def stop_tasks(self):
         """Stops the tasks for triggering, analog and counter outputs"""
         if self.ao_cards == 2:
@@ -532,8 +555,9 @@ class mesoSPIM_DemoWaveFormGenerator(mesoSPIM_WaveFormGenerator):
     def __init__(self, parent):
         super().__init__(parent)
 
-    def create_tasks(self):
+    def create_tasks(self, planes=None):
         """"Demo version of the actual DAQmx-based function."""
+        self.planes = planes
         self.calculate_samples()
         samplerate, sweeptime = self.state.get_parameter_list(['samplerate','sweeptime'])
         camera_pulse_percent, camera_delay_percent = self.state.get_parameter_list(['camera_pulse_%','camera_delay_%'])
@@ -552,6 +576,10 @@ class mesoSPIM_DemoWaveFormGenerator(mesoSPIM_WaveFormGenerator):
         """Demo: runs the tasks for triggering, analog and counter outputs. """
         time.sleep(self.state['sweeptime'])
 
+    def trigger_tasks(self):
+        """Demo: continuous stacks are paced by the demo camera, one frame per sweep. """
+        pass
+
     def stop_tasks(self):
         """"Demo: stop tasks"""
         pass
@@ -0,0 +1,115 @@
+'''
+acquisition_io.py
+========================================
+
+Saving and loading of acquisition lists (tables of the Acquisition Manager).
+
+Acquisition lists are saved as JSON lines: a header line with the format version and the keys,
+followed by one line per acquisition with its values in the order of the keys. The files are
+human-readable, can be loaded line by line, and are independent of the Python classes
+(keys unknown to this version are ignored, missing keys get the default values).
+
+Tables saved by previous versions with pickle can still be loaded. Only the acquisition
+classes (and numpy scalars) are accepted from pickle files, so that they cannot run arbitrary code.
+'''
+import os
+import json
+import pickle
+import logging
+import numpy as np
+from .acquisitions import Acquisition, AcquisitionList
+
+logger = logging.getLogger(__name__)
+
+FILE_FORMAT = 'mesoSPIM acquisition list'
+FILE_VERSION = 1
+
+
+def _to_json(value):
+    ''' numpy scalars (e.g. positions from the stages) are saved as Python numbers '''
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Value {value} of type {type(value)} cannot be saved')
+
+
+def save_acquisition_list(acq_list, path):
+    '''Save the acquisition list as JSON lines. The file is replaced atomically, it is never left half-written.'''
+    keys = acq_list.get_keylist()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        header = {'format': FILE_FORMAT, 'version': FILE_VERSION, 'keys': keys, 'n_acquisitions': len(acq_list)}
+        file.write(json.dumps(header) + '\n')
+        for acq in acq_list:
+            file.write(json.dumps([acq[key] for key in keys], default=_to_json) + '\n')
+    os.replace(tmp_path, path)
+
+
+def acquisition_list_to_dicts(acq_list):
+    '''Acquisitions as dictionaries of Python values, e.g. to send them as JSON'''
+    return [{key: value.item() if isinstance(value, np.generic) else value for key, value in acq.items()} for acq in acq_list]
+
+
+def acquisition_list_from_dicts(acq_dicts):
+    '''Acquisition list from dictionaries of acquisition keys and values, missing keys get the default values.
+    Unknown keys raise a ValueError.'''
+    default_keys = Acquisition().get_keylist()
+    acq_list = AcquisitionList([])
+    for acq_dict in acq_dicts:
+        unknown_keys = [key for key in acq_dict if key not in default_keys]
+        if unknown_keys:
+            raise ValueError(f'Unknown acquisition keys: {unknown_keys}')
+        acq_list.append(Acquisition(**{('theta_pos' if key == 'rot' else key): value for key, value in acq_dict.items()}))
+    return acq_list
+
+
+def is_pickle_file(path):
+    ''' Pickle protocols 2 and later start with the PROTO opcode '''
+    with open(path, 'rb') as file:
+        return file.read(1) == b'\x80'
+
+
+def load_acquisition_list(path):
+    '''Load an acquisition list saved by save_acquisition_list(), or a pickled list of previous versions'''
+    if is_pickle_file(path):
+        return load_pickled_acquisition_list(path)
+    with open(path, 'r') as file:
+        header = json.loads(file.readline())
+        if not isinstance(header, dict) or header.get('format') != FILE_FORMAT:
+            raise ValueError(f'{path} is not a mesoSPIM acquisition list')
+        if header['version'] > FILE_VERSION:
+            raise ValueError(f"{path} was saved by a newer mesoSPIM version (file format version {header['version']})")
+        default_keys = Acquisition().get_keylist()
+        keys = header['keys']
+        unknown_keys = [key for key in keys if key not in default_keys]
+        if unknown_keys:
+            logger.warning(f'Acquisition list {path}: unknown keys ignored: {unknown_keys}')
+        ''' The keys are arguments of Acquisition(), except for the rotation '''
+        arguments = [None if key in unknown_keys else ('theta_pos' if key == 'rot' else key) for key in keys]
+        acq_list = AcquisitionList([])
+        for line in file:
+            if not line.strip():
+                continue
+            acq_list.append(Acquisition(**{argument: value for argument, value in zip(arguments, json.loads(line))
+                                           if argument is not None}))
+    if len(acq_list) == 0:
+        acq_list.append(Acquisition())
+    return acq_list
+
+
+class _AcquisitionUnpickler(pickle.Unpickler):
+    ''' Unpickler that only creates acquisition objects '''
+    def find_class(self, module, name):
+        if module.endswith('utils.acquisitions') and name in ('Acquisition', 'AcquisitionList'):
+            return {'Acquisition': Acquisition, 'AcquisitionList': AcquisitionList}[name]
+        if (module, name) in (('numpy.core.multiarray', 'scalar'), ('numpy._core.multiarray', 'scalar'), ('numpy', 'dtype')):
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f'{module}.{name} is not allowed in acquisition list files')
+
+
+def load_pickled_acquisition_list(path):
+    with open(path, 'rb') as file:
+        acq_list = _AcquisitionUnpickler(file).load()
+    if not isinstance(acq_list, AcquisitionList):
+        raise ValueError(f'{path} does not contain an acquisition list')
+    logger.info(f'Acquisition list {path} loaded from a pickle file (previous format), it is saved as JSON lines from now on')
+    return acq_list
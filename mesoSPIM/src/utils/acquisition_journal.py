@@ -0,0 +1,114 @@
+'''
+acquisition_journal.py
+========================================
+
+Write-ahead progress journal of an acquisition list, used to resume interrupted acquisitions.
+
+The journal is a text file with one JSON record per line, saved next to the data
+(`<first file>_journal.jsonl`). Every record is flushed to disk before the acquisition proceeds,
+so after a crash of the software or PC the journal tells which acquisitions were finished.
+'''
+import os
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_VERSION = 1
+
+
+def get_journal_path(acq_list):
+    acq = acq_list[0]
+    return os.path.realpath(acq['folder'] + '/' + acq['filename']) + '_journal.jsonl'
+
+
+def get_list_signature(acq_list):
+    '''Filenames and plane counts identify the acquisition list the journal belongs to'''
+    return {'filenames': acq_list.get_all_filenames(),
+            'planes': [acq.get_image_count() for acq in acq_list]}
+
+
+class AcquisitionJournal():
+    '''
+    Args:
+        acq_list (AcquisitionList): the acquisition list to be recorded
+        resume (bool): append to the existing journal instead of starting a new one
+    '''
+    def __init__(self, acq_list, resume=False):
+        self.path = get_journal_path(acq_list)
+        self.file = open(self.path, 'a' if resume else 'w')
+        self.record('list_started', version=JOURNAL_VERSION, resumed=resume, **get_list_signature(acq_list))
+
+    def record(self, event, **kwargs):
+        '''Append a record and make sure it reached the disk'''
+        if self.file is None:
+            return
+        entry = {'event': event, 'time': time.strftime("%Y%m%d-%H%M%S")}
+        entry.update(kwargs)
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def acquisition_started(self, index, acq):
+        self.record('acquisition_started', index=index, filename=acq['filename'])
+
+    def planes_acquired(self, index, n_planes):
+        self.record('planes_acquired', index=index, planes=n_planes)
+
+    def acquisition_finished(self, index, acq):
+        self.record('acquisition_finished', index=index, filename=acq['filename'], planes=acq.get_image_count())
+
+    def acquisition_aborted(self, index, acq):
+        self.record('acquisition_aborted', index=index, filename=acq['filename'])
+
+    def close(self, finished=False):
+        if self.file is not None:
+            if finished:
+                self.record('list_finished')
+            self.file.close()
+            self.file = None
+
+
+def read_journal(path):
+    '''Read the records of a journal. A line truncated by a crash is ignored.'''
+    records = []
+    with open(path, 'r') as file:
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning(f'Journal {path}: skipping incomplete record {line!r}')
+    return records
+
+
+def get_journal_progress(acq_list):
+    '''Find out which acquisitions of the list were finished according to its journal.
+
+    Returns:
+        (finished, interrupted, message): a sorted list of finished acquisition indices,
+        the index of the interrupted acquisition (or None) and an error message
+        ('' if the journal is valid for this acquisition list).
+    '''
+    path = get_journal_path(acq_list)
+    if not os.path.exists(path):
+        return [], None, f'No journal found: {path}'
+    records = read_journal(path)
+    if not records or records[0]['event'] != 'list_started':
+        return [], None, f'Journal is empty or damaged: {path}'
+    if records[0].get('version') != JOURNAL_VERSION:
+        return [], None, f"Unsupported journal version {records[0].get('version')}: {path}"
+    signature = get_list_signature(acq_list)
+    if any(records[0].get(key) != value for key, value in signature.items()):
+        return [], None, f'Journal belongs to a different acquisition list: {path}'
+    if records[-1]['event'] == 'list_finished':
+        return [], None, f'Acquisition list was already finished: {path}'
+    finished, interrupted = set(), None
+    for entry in records:
+        if entry['event'] == 'acquisition_finished':
+            finished.add(entry['index'])
+        elif entry['event'] in ('acquisition_started', 'acquisition_aborted'):
+            interrupted = entry['index']
+    if interrupted in finished:
+        interrupted = None
+    return sorted(finished), interrupted, ''
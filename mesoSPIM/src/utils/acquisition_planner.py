@@ -0,0 +1,117 @@
+'''
+acquisition_planner.py
+========================================
+
+Reordering of an acquisition list to reduce the overhead between acquisitions:
+rotations, filter and zoom changes, and stage travel (XY and from the end of a stack to the start of the next).
+
+The overhead of a transition between two acquisitions is estimated from the cost parameters
+(config file: acquisition_planner). The planner builds the new order greedily, always choosing the
+acquisition that is cheapest to reach from the current one. On a tile grid with equal costs this
+gives a serpentine tile order within each rotation, zoom and filter.
+If keep_channel_order is True, the acquisitions of every tile (same x, y, z_start, rotation)
+keep their relative order, e.g. the order of the channels.
+'''
+import logging
+import numpy as np
+from .acquisitions import AcquisitionList
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COSTS = {'stage_speed_um_s': 2000, # XYZ stage travel speed
+                 'rotation_speed_deg_s': 10,
+                 'rotation_s': 5, # fixed overhead of a rotation, e.g. moving to the rotation position and back
+                 'filter_change_s': 1,
+                 'zoom_change_s': 3,
+                 }
+
+
+def get_costs(cfg):
+    costs = dict(DEFAULT_COSTS)
+    if hasattr(cfg, 'acquisition_planner'):
+        costs.update({key: value for key, value in cfg.acquisition_planner.items() if key in DEFAULT_COSTS})
+    return costs
+
+
+def get_transition_costs(acq_list, source, targets, costs):
+    '''Estimated overhead in seconds from the acquisition with index source to the acquisitions with indices targets.
+    source can also be an array of indices of the same length as targets (pairwise transitions).'''
+    x, y = acq_list.get_column('x_pos'), acq_list.get_column('y_pos')
+    z_start, z_end = acq_list.get_column('z_start'), acq_list.get_column('z_end')
+    rot = acq_list.get_column('rot')
+    filters, zooms = acq_list.get_column('filter'), acq_list.get_column('zoom')
+    ''' The stages move simultaneously, the slowest axis counts '''
+    travel = np.maximum.reduce([np.abs(x[targets] - x[source]),
+                                np.abs(y[targets] - y[source]),
+                                np.abs(z_start[targets] - z_end[source])])
+    rotation = np.abs(rot[targets] - rot[source])
+    return (travel / costs['stage_speed_um_s']
+            + rotation / costs['rotation_speed_deg_s'] + (rotation > 0) * costs['rotation_s']
+            + (filters[targets] != filters[source]) * costs['filter_change_s']
+            + (zooms[targets] != zooms[source]) * costs['zoom_change_s'])
+
+
+def estimate_overhead(acq_list, costs=None):
+    '''Estimated total overhead in seconds between the acquisitions of the list, in list order'''
+    costs = costs or DEFAULT_COSTS
+    if len(acq_list) < 2:
+        return 0.
+    n = len(acq_list)
+    return float(get_transition_costs(acq_list, np.arange(n - 1), np.arange(1, n), costs).sum())
+
+
+def plan_acquisition_order(acq_list, costs=None, keep_channel_order=True):
+    '''Order of the acquisitions that reduces the estimated overhead. The first acquisition stays first.
+
+    Returns:
+        list of indices into acq_list
+    '''
+    costs = costs or DEFAULT_COSTS
+    n = len(acq_list)
+    if n < 3:
+        return list(range(n))
+    ''' With keep_channel_order, an acquisition becomes available when the previous acquisition of its tile is done '''
+    next_in_tile = [None] * n
+    available = np.ones(n, dtype=bool)
+    if keep_channel_order:
+        last_in_tile = {}
+        for i, acq in enumerate(acq_list):
+            tile = acq_list.get_tile_index(acq)
+            if tile in last_in_tile:
+                next_in_tile[last_in_tile[tile]] = i
+                available[i] = False
+            last_in_tile[tile] = i
+
+    x, y = acq_list.get_column('x_pos'), acq_list.get_column('y_pos')
+    order = [0]
+    available[0] = False
+    if next_in_tile[0] is not None:
+        available[next_in_tile[0]] = True
+    for _ in range(n - 1):
+        candidates = np.flatnonzero(available)
+        transition_costs = get_transition_costs(acq_list, order[-1], candidates, costs)
+        candidates = candidates[transition_costs == transition_costs.min()]
+        ''' Ties (e.g. when the z travel to the next stack dominates): the closest in XY '''
+        current = candidates[np.argmin(np.hypot(x[candidates] - x[order[-1]], y[candidates] - y[order[-1]]))]
+        order.append(int(current))
+        available[current] = False
+        if next_in_tile[current] is not None:
+            available[next_in_tile[current]] = True
+    return order
+
+
+def optimize_acquisition_list(acq_list, costs=None, keep_channel_order=True):
+    '''Reordered copy of the acquisition list, if it reduces the estimated overhead.
+
+    Returns:
+        (acquisition list, overhead before in s, overhead after in s)
+    '''
+    costs = costs or DEFAULT_COSTS
+    overhead_before = estimate_overhead(acq_list, costs)
+    order = plan_acquisition_order(acq_list, costs, keep_channel_order)
+    planned_list = AcquisitionList([acq_list[i] for i in order])
+    overhead_after = estimate_overhead(planned_list, costs)
+    if overhead_after >= overhead_before:
+        return acq_list, overhead_before, overhead_before
+    logger.info(f'Acquisition order planned: estimated overhead {overhead_before:.0f} s -> {overhead_after:.0f} s')
+    return planned_list, overhead_before, overhead_after
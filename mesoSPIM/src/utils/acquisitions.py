@@ -7,6 +7,8 @@ Helper classes for mesoSPIM acquisitions
 
 import indexed
 import os.path
+import collections
+import numpy as np
 
 class Acquisition(indexed.IndexedOrderedDict):
     '''
@@ -88,8 +90,12 @@ class Acquisition(indexed.IndexedOrderedDict):
         self['processing']=processing
 
 
+    ''' Incremented whenever any acquisition changes, invalidates the cached indices and columns of AcquisitionLists '''
+    revision = 0
+
     def __setitem__(self, key, value):
         super().__setitem__(key, value)
+        Acquisition.revision += 1
 
     def __call__(self, index):
         ''' This way the dictionary is callable with an index '''
@@ -235,8 +241,16 @@ class AcquisitionList(list):
     >10
     acq_list[2]['y_pos'] = 34
 
-
+    The tile, channel, illumination and angle indices are looked up in a cached index
+    (constant time, they are needed for every plane), which is rebuilt after the list
+    or an acquisition is modified. Aggregates over the whole list (image count, time)
+    are computed on cached NumPy columns of the acquisition values, see get_column().
     '''
+    _index = None
+    _index_revision = -1
+    _columns = None
+    _columns_revision = -1
+
     def __init__(self, *args):
         list.__init__(self, *args)
 
@@ -254,6 +268,50 @@ class AcquisitionList(list):
         # '''
         # self.rotation_point = {'x_abs' : None, 'y_abs' : None, 'z_abs' : None}
 
+    def _get_index(self):
+        ''' Unique attribute values and tiles of the list in order of acquisition, mapped to their indices '''
+        if self._index is None or self._index_revision != Acquisition.revision:
+            index = {'tile': {}, 'laser': {}, 'shutterconfig': {}, 'rot': {}}
+            for acq in self:
+                index['tile'].setdefault(self._get_tile_key(acq), len(index['tile']))
+                for key in ('laser', 'shutterconfig', 'rot'):
+                    index[key].setdefault(acq[key], len(index[key]))
+            self._index = index
+            self._index_revision = Acquisition.revision
+        return self._index
+
+    def get_column(self, key):
+        '''Values of key of all acquisitions as np.ndarray, numeric dtype if all values are numbers, else object.
+
+        Columns are cached until the list or an acquisition is modified, they must not be modified by the caller.
+        '''
+        if self._columns is None or self._columns_revision != Acquisition.revision:
+            self._columns = {}
+            self._columns_revision = Acquisition.revision
+        if key not in self._columns:
+            values = [acq[key] for acq in self]
+            if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+                self._columns[key] = np.array(values, dtype=float)
+            else:
+                self._columns[key] = np.array(values, dtype=object)
+        return self._columns[key]
+
+    def get_columns(self):
+        ''' All values of the acquisitions as a dictionary of columns {key: np.ndarray}, see get_column() '''
+        keylist = self.get_keylist() if len(self) > 0 else Acquisition().get_keylist()
+        return {key: self.get_column(key) for key in keylist}
+
+    def get_image_counts(self):
+        ''' Number of planes of every acquisition, as an array '''
+        z_step = self.get_column('z_step')
+        if np.any(z_step == 0):
+            raise ZeroDivisionError('z_step of an acquisition is 0')
+        return np.abs(np.trunc((self.get_column('z_end') - self.get_column('z_start')) / z_step)).astype(np.int64)
+
+    @staticmethod
+    def _get_tile_key(acq):
+        return f"{acq['x_pos']}{acq['y_pos']}{acq['z_start']}{acq['rot']}"
+
     def get_capitalized_keylist(self):
         return self[0].get_capitalized_keylist()
 
@@ -267,21 +325,13 @@ class AcquisitionList(list):
         '''
         Returns total time in seconds of a list of acquisitions
         '''
-        time = 0
-        for i in range(len(self)):
-            time += self[i].get_acquisition_time(framerate)
-
-        return time
+        return self.get_image_count() / framerate
 
     def get_image_count(self):
         '''
         Returns the total number of planes for a list of acquistions
         '''
-        image_count = 0
-        for i in range(len(self)):
-            image_count += self[i].get_image_count()
-
-        return image_count
+        return int(self.get_image_counts().sum())
 
     def get_startpoint(self):
         return self[0].get_startpoint()
@@ -327,12 +377,24 @@ class AcquisitionList(list):
             filename_list.append(filename)
         return filename_list
 
+    def is_single_file_format(self, filename):
+        ''' Returns True for formats where all acquisitions of the list are saved into one file (.h5, .zarr) '''
+        return os.path.splitext(filename)[1] in ('.h5', '.zarr')
+
     def check_for_existing_filenames(self):
-        ''' Returns a list of existing filenames '''
+        ''' Returns a list of existing filenames (OME-Zarr stores are folders).
+        Every folder is listed only once, instead of checking the files one by one. '''
+        folder_contents = {}
         filename_list = []
         for i in range(len(self)):
-            filename = self[i]['folder']+'/'+self[i]['filename']
-            file_exists = os.path.isfile(filename)
+            folder, name = self[i]['folder'], self[i]['filename']
+            filename = folder+'/'+name
+            if '/' in name or os.sep in name:
+                file_exists = os.path.exists(filename)
+            else:
+                if folder not in folder_contents:
+                    folder_contents[folder] = set(map(os.path.normcase, os.listdir(folder))) if os.path.isdir(folder) else set()
+                file_exists = os.path.normcase(name) in folder_contents[folder]
             if file_exists:
                 filename_list.append(filename)
         return filename_list
@@ -352,7 +414,7 @@ class AcquisitionList(list):
         filenames = []
         # Create a list of full file paths
         for i in range(len(self)):
-            if self[i]['filename'][-3:] != '.h5':
+            if not self.is_single_file_format(self[i]['filename']):
                 filename = self[i]['folder']+'/'+self[i]['filename']
                 filenames.append(filename)
         duplicates = self.get_duplicates_in_list(filenames)
@@ -362,58 +424,44 @@ class AcquisitionList(list):
     def check_for_nonexisting_folders(self):
         ''' Returns a list of nonexisting folders '''
         nonexisting_folders = []
+        existing_folders = set()
         for i in range(len(self)):
             folder = self[i]['folder']
-            if not os.path.isdir(folder):
+            if folder in existing_folders:
+                continue
+            if os.path.isdir(folder):
+                existing_folders.add(folder)
+            else:
                 nonexisting_folders.append(folder)
         
         return nonexisting_folders
 
     def get_duplicates_in_list(self, in_list):
-        duplicates = []
-        unique = set(in_list)
-        for each in unique:
-            count = in_list.count(each)
-            if count > 1:
-                duplicates.append(each)
-        return duplicates
+        return [each for each, count in collections.Counter(in_list).items() if count > 1]
 
     def get_n_shutter_configs(self):
         """Get the number of unique shutter configs (1 or 2)"""
-        sconfig_list = [a['shutterconfig'] for a in self]
-        sconfig_set = set(sconfig_list)
-        return len(sconfig_set)
+        return len(self._get_index()['shutterconfig'])
 
     def get_n_angles(self):
         """Get the number of unique angles"""
-        angle_list = [a['rot'] for a in self]
-        angle_set = set(angle_list)
-        return len(angle_set)
+        return len(self._get_index()['rot'])
 
     def get_n_lasers(self):
         """Get the number of unique laser lines"""
-        laser_list = [a['laser'] for a in self]
-        laser_set = set(laser_list)
-        return len(laser_set)
+        return len(self._get_index()['laser'])
 
     def get_n_tiles(self):
         """Get the number of tiles as unique (x,y,z_start,rot) combinations"""
-        tile_list = []
-        for a in self:
-            tile_str = f"{a['x_pos']}{a['y_pos']}{a['z_start']}{a['rot']}"
-            if not tile_str in tile_list:
-                tile_list.append(tile_str)
-        return len(tile_list)
+        return len(self._get_index()['tile'])
 
     def get_tile_index(self, acq):
         """Get the the tile index for given acquisition"""
-        acq_str = f"{acq['x_pos']}{acq['y_pos']}{acq['z_start']}{acq['rot']}"
-        tile_list = []
-        for a in self:
-            tile_str = f"{a['x_pos']}{a['y_pos']}{a['z_start']}{a['rot']}"
-            if not tile_str in tile_list:
-                tile_list.append(tile_str)
-        return tile_list.index(acq_str)
+        tile_key = self._get_tile_key(acq)
+        tiles = self._get_index()['tile']
+        if tile_key not in tiles:
+            raise ValueError(f'{tile_key} is not a tile of the acquisition list')
+        return tiles[tile_key]
 
     def get_unique_attr_list(self, key: str = 'laser') -> list:
         """Return ordered list of acquisition attributes.
@@ -429,11 +477,7 @@ class AcquisitionList(list):
         """
         attributes = ('laser', 'shutterconfig', 'rot')
         assert key in attributes, f'Key {key} must be one of {attributes}.'
-        unique_list = []
-        for acq in self:
-            if acq[key] not in unique_list:
-                unique_list.append(acq[key])
-        return unique_list
+        return list(self._get_index()[key])
 
     def find_value_index(self, value: str = '488 nm', key: str = 'laser'):
         """Find the attribute index in the acquisition list.
@@ -448,9 +492,23 @@ class AcquisitionList(list):
         al.find_value_index('561 nm', 'laser') # -> 1
         al.find_value_index('637 nm', 'laser') # -> 2
         """
-        unique_list = self.get_unique_attr_list(key)
-        assert value in unique_list, f"Value({value}) not found in list {unique_list}"
-        return unique_list.index(value)
+        attributes = ('laser', 'shutterconfig', 'rot')
+        assert key in attributes, f'Key {key} must be one of {attributes}.'
+        unique_values = self._get_index()[key]
+        assert value in unique_values, f"Value({value}) not found in list {list(unique_values)}"
+        return unique_values[value]
+
 
+def _invalidate_index(method):
+    ''' Wraps a list method that modifies the list '''
+    def wrapper(self, *args, **kwargs):
+        self._index = self._columns = None
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
 
 
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'append', 'extend', 'insert',
+              'remove', 'pop', 'clear', 'sort', 'reverse'):
+    setattr(AcquisitionList, _name, _invalidate_index(getattr(list, _name)))
@@ -0,0 +1,208 @@
+'''
+conversion_queue.py
+========================================
+
+Background conversion of finished .raw stacks into .h5 (BigDataViewer), .zarr (OME-Zarr) or .tiff files,
+with resolution pyramids as configured for these formats, while the next stacks are acquired.
+
+Stacks are converted in a pool of worker processes, so that compression and downsampling do not compete
+with the camera and writer threads for the GIL. The workers never starve the live writer:
+    * they run at a lower process priority,
+    * the read rate of every worker is limited to 'max_read_mb_s',
+    * they pause while the writer queue of the acquisition is filling up (see set_paused()).
+The .raw files are kept, every stack is converted into a separate file next to it.
+'''
+import os
+import time
+import ctypes
+import platform
+import logging
+import multiprocessing
+import concurrent.futures
+import numpy as np
+from PyQt5 import QtCore
+
+logger = logging.getLogger(__name__)
+
+CONVERSION_FORMATS = ('.h5', '.zarr', '.tif', '.tiff', '.btf')
+
+
+def get_target_path(raw_path, target_format):
+    return os.path.splitext(raw_path)[0] + target_format
+
+
+def _lower_process_priority():
+    '''Pool initializer: conversions yield the CPU to the acquisition'''
+    try:
+        if platform.system() == 'Windows':
+            BELOW_NORMAL_PRIORITY_CLASS = 0x4000
+            ctypes.windll.kernel32.SetPriorityClass(ctypes.windll.kernel32.GetCurrentProcess(), BELOW_NORMAL_PRIORITY_CLASS)
+        else:
+            os.nice(10)
+    except Exception as e:
+        logger.warning(f'Conversion worker priority could not be lowered: {e}')
+
+
+def convert_raw_stack(job, progress=None, pause_event=None):
+    '''Convert a .raw stack, runs in a worker process.
+
+    Args:
+        job (dict): 'path', 'shape' (z,y,x), 'target_format' and the parameters of the target format,
+            see mesoSPIM_ImageWriter.get_conversion_job()
+        progress (dict): shared dictionary, progress[path] is updated with the converted fraction
+        pause_event (Event): conversion waits while the event is set
+
+    Returns:
+        path of the converted file
+    '''
+    n_frames = job['shape'][0]
+    target_format = job['target_format']
+    target_path = get_target_path(job['path'], target_format)
+    if os.path.exists(target_path):
+        raise FileExistsError(f'{target_path} already exists')
+    source = np.memmap(job['path'], dtype=np.uint16, mode='r', shape=tuple(job['shape']))
+
+    if target_format == '.h5':
+        import npy2bdv
+        hdf5 = job['hdf5']
+        subsamp = hdf5.get('subsamp', ((1, 1, 1),))
+        ''' HDF5 chunks must not be larger than the subsampled planes, e.g. of binned or cropped frames '''
+        blockdim = tuple((1,) + tuple(max(1, min(256, n // f)) for n, f in zip(job['shape'][1:], level[1:]))
+                         for level in subsamp)
+        writer = npy2bdv.BdvWriter(target_path, blockdim=blockdim, subsamp=subsamp, compression=hdf5.get('compression', None))
+        writer.append_view(stack=None, virtual_stack_dim=tuple(job['shape']), **job['bdv_view'])
+    elif target_format == '.zarr':
+        from .omezarr_writer import OMEZarrWriter
+        zarr_cfg = job['zarr']
+        writer = OMEZarrWriter(target_path,
+                               chunks=zarr_cfg.get('chunks', (16, 256, 256)),
+                               n_levels=zarr_cfg.get('levels', 4),
+                               downsampling=zarr_cfg.get('downsampling', (2, 2, 2)),
+                               compression=zarr_cfg.get('compression', 'zstd'),
+                               clevel=zarr_cfg.get('clevel', 3))
+        writer.append_view(tuple(job['shape']), **job['zarr_view'])
+    else:
+        from .tiff_batch_writer import TiffBatchWriter
+        writer = TiffBatchWriter(target_path, tuple(job['shape'][1:]), n_frames, batch_size=16,
+                                 bigtiff=target_format == '.btf' or source.nbytes >= 2**32 - 2**25,
+                                 resolution=(1. / job['pixel_size_um'], 1. / job['pixel_size_um']),
+                                 metadata={'spacing': job['z_step'], 'unit': 'um'})
+
+    max_bytes_per_s = job.get('max_read_mb_s', 0) * 2**20
+    t_start, bytes_read = time.time(), 0
+    for z in range(n_frames):
+        while pause_event is not None and pause_event.is_set():
+            time.sleep(0.2)
+            t_start, bytes_read = time.time(), 0
+        plane = np.array(source[z])
+        if target_format == '.h5':
+            writer.append_plane(plane=plane, z=z)
+        elif target_format == '.zarr':
+            writer.append_plane(plane)
+        else:
+            writer.write(plane)
+        bytes_read += plane.nbytes
+        if max_bytes_per_s > 0:
+            ''' Throttling: sleep until the average read rate is below the limit '''
+            delay = bytes_read / max_bytes_per_s - (time.time() - t_start)
+            if delay > 0:
+                time.sleep(delay)
+        if progress is not None and (z % 16 == 15 or z == n_frames - 1):
+            progress[job['path']] = (z + 1) / n_frames
+
+    if target_format == '.h5':
+        writer.write_xml()
+        writer.close()
+    elif target_format == '.zarr':
+        writer.close_view()
+        writer.close()
+    else:
+        writer.close()
+    del source
+    return target_path
+
+
+class ConversionQueue(QtCore.QObject):
+    '''Queue of .raw stacks converted in the background, lives in the GUI thread.
+
+    Jobs are added with add_job() (e.g. by a signal from the image writer), the progress
+    is polled from the worker processes and emitted as a status bar message by sig_progress.
+    '''
+    sig_progress = QtCore.pyqtSignal(str)
+
+    def __init__(self, n_workers=1, poll_interval_ms=1000):
+        super().__init__()
+        self.n_workers = n_workers
+        self.executor = self.manager = self.progress = self.pause_event = None
+        self.futures = {} # raw path -> Future
+        self.n_converted = self.n_failed = 0
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(poll_interval_ms)
+        self.timer.timeout.connect(self.update_progress)
+
+    def start_pool(self):
+        ''' The worker processes are only started when the first stack is converted '''
+        self.manager = multiprocessing.Manager()
+        self.progress = self.manager.dict()
+        self.pause_event = self.manager.Event()
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.n_workers,
+                                                               initializer=_lower_process_priority)
+        logger.info(f'Conversion queue: {self.n_workers} worker process(es) started')
+
+    @QtCore.pyqtSlot(dict)
+    def add_job(self, job):
+        assert job['target_format'] in CONVERSION_FORMATS, f"Unknown conversion format {job['target_format']}"
+        if self.executor is None:
+            self.start_pool()
+        self.progress[job['path']] = 0.
+        self.futures[job['path']] = self.executor.submit(convert_raw_stack, job, self.progress, self.pause_event)
+        logger.info(f"Conversion queue: {job['path']} -> {job['target_format']} added")
+        self.update_progress()
+        self.timer.start()
+
+    @QtCore.pyqtSlot(bool)
+    def set_paused(self, paused):
+        '''Pause the conversions, e.g. while the writer queue of the acquisition is filling up'''
+        if self.pause_event is None:
+            return
+        if paused:
+            self.pause_event.set()
+        else:
+            self.pause_event.clear()
+
+    def update_progress(self):
+        for path, future in list(self.futures.items()):
+            if future.done():
+                del self.futures[path]
+                self.progress.pop(path, None)
+                if future.cancelled():
+                    continue
+                elif future.exception() is not None:
+                    self.n_failed += 1
+                    logger.error(f'Conversion queue: {path} could not be converted: {future.exception()}')
+                else:
+                    self.n_converted += 1
+                    logger.info(f'Conversion queue: {path} converted to {future.result()}')
+        self.sig_progress.emit(self.get_status_message())
+        if not self.futures:
+            self.timer.stop()
+
+    def get_status_message(self):
+        failed = f', {self.n_failed} failed' if self.n_failed else ''
+        running = [(path, fraction) for path, fraction in self.progress.items() if fraction > 0] if self.futures else []
+        if not self.futures:
+            return f'Conversion: {self.n_converted} file(s) done{failed}'
+        paused = ' (paused)' if self.pause_event.is_set() else ''
+        converting = ', '.join(f'{os.path.basename(path)} {fraction:.0%}' for path, fraction in running)
+        return (f'Conversion{paused}: {len(self.futures) - len(running)} queued, {converting or "starting"}, '
+                f'{self.n_converted} done{failed}')
+
+    def shutdown(self):
+        '''Cancel the queued conversions, the running ones are finished before the program exits'''
+        if self.executor is None:
+            return
+        self.timer.stop()
+        for path, future in self.futures.items():
+            if future.cancel():
+                logger.warning(f'Conversion queue: conversion of {path} cancelled')
+        self.executor.shutdown(wait=False)
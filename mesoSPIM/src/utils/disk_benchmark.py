@@ -0,0 +1,63 @@
+'''
+disk_benchmark.py
+========================================
+
+Pre-flight check of the sustained write speed of the target disks of an acquisition list.
+
+A short sequential write test (including the final flush to the disk) is run in every target folder
+and compared to the data rate of the acquisition: frame size x frame rate x the write amplification
+of the file format (e.g. the additional resolution levels of HDF5 and OME-Zarr files).
+'''
+import os
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def measure_write_speed(folder, size_mb=256, block_mb=8):
+    '''Write a temporary file of size_mb into the folder and return the sustained write speed in MB/s'''
+    path = os.path.join(folder, f'mesoSPIM_disk_benchmark_{os.getpid()}.tmp')
+    ''' Random data, so that compressing file systems do not inflate the result '''
+    block = np.random.default_rng().integers(0, 2**16, size=block_mb * 2**20 // 2, dtype=np.uint16)
+    n_blocks = max(1, size_mb // block_mb)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        t_start = time.time()
+        for _ in range(n_blocks):
+            os.write(fd, block)
+        os.fsync(fd)
+        t_elapsed = time.time() - t_start
+    finally:
+        os.close(fd)
+        os.remove(path)
+    speed = n_blocks * block.nbytes / 2**20 / max(t_elapsed, 1e-6)
+    logger.info(f'Disk benchmark: {folder}: {speed:.0f} MB/s ({n_blocks * block_mb} MB written in {t_elapsed:.2f} s)')
+    return speed
+
+
+def get_write_amplification(filename, cfg):
+    '''Ratio of bytes written to disk to raw frame bytes, for the file format of filename'''
+    extension = os.path.splitext(filename)[1]
+    if extension == '.h5' and hasattr(cfg, 'hdf5'):
+        ''' Every subsampling level is written, compression is not taken into account '''
+        return float(sum(1. / np.prod(level) for level in cfg.hdf5['subsamp']))
+    elif extension == '.zarr':
+        zarr_cfg = cfg.zarr if hasattr(cfg, 'zarr') else {}
+        downsampling = np.prod(zarr_cfg.get('downsampling', (2, 2, 2)))
+        return float(sum(1. / downsampling ** level for level in range(zarr_cfg.get('levels', 4))))
+    else:
+        return 1.0
+
+
+def get_required_write_speed(acq_list, frame_bytes, frame_rate, cfg, skip_acquisitions=()):
+    '''Required sustained write speed in MB/s for every target folder of the acquisition list'''
+    required = {}
+    for i, acq in enumerate(acq_list):
+        if i in skip_acquisitions:
+            continue
+        folder = os.path.realpath(acq['folder'])
+        speed = frame_bytes * frame_rate * get_write_amplification(acq['filename'], cfg) / 2**20
+        required[folder] = max(required.get(folder, 0), speed)
+    return required
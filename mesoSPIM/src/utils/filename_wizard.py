@@ -16,8 +16,8 @@ logger = logging.getLogger(__name__)
 class FilenameWizard(QtWidgets.QWizard):
     wizard_done = QtCore.pyqtSignal()
 
-    num_of_pages = 6
-    (welcome, raw, tiff, bigtiff, single_hdf5, finished) = range(num_of_pages)
+    num_of_pages = 7
+    (welcome, raw, tiff, bigtiff, single_hdf5, single_zarr, finished) = range(num_of_pages)
 
     def __init__(self, parent=None):
         '''Parent is object of class mesoSPIM_AcquisitionManagerWindow()'''
@@ -27,14 +27,15 @@ class FilenameWizard(QtWidgets.QWizard):
         through '''
         self.parent = parent
         self.state = mesoSPIM_StateSingleton()
-        self.file_format = None  # 'raw', 'h5', 'tiff', 'btf'
+        self.file_format = None  # 'raw', 'h5', 'tiff', 'btf', 'zarr'
         self.setWindowTitle('Filename Wizard')
         self.setPage(0, FilenameWizardWelcomePage(self))
         self.setPage(1, FilenameWizardRawSelectionPage(self))
         self.setPage(2, FilenameWizardTiffSelectionPage(self))
         self.setPage(3, FilenameWizardBigTiffSelectionPage(self))
         self.setPage(4, FilenameWizardSingleHDF5SelectionPage(self))
-        self.setPage(5, FilenameWizardCheckResultsPage(self))
+        self.setPage(5, FilenameWizardSingleZarrSelectionPage(self))
+        self.setPage(6, FilenameWizardCheckResultsPage(self))
         self.setStyleSheet(''' font-size: 16px; ''')
         self.show()
 
@@ -123,6 +124,11 @@ class FilenameWizard(QtWidgets.QWizard):
                     filename += self.replace_spaces_with_underscores(self.field('DescriptionHDF5')) + '_'
                 file_suffix = 'bdv.' + self.file_format
 
+            elif self.file_format == 'zarr':
+                if self.field('DescriptionZarr'):
+                    filename += self.replace_spaces_with_underscores(self.field('DescriptionZarr')) + '_'
+                file_suffix = 'ome.' + self.file_format
+
             else:
                 raise ValueError(f"file suffix invalid: {self.file_format}")
 
@@ -151,10 +157,12 @@ class FilenameWizardWelcomePage(QtWidgets.QWizardPage):
         self.tiff_string = 'ImageJ TIFF files: ~.tiff'
         self.bigtiff_string = 'BigTIFF files: ~.btf'
         self.single_hdf5_string = 'BigDataViewer HDF5 file: ~.h5'
+        self.single_zarr_string = 'OME-Zarr multiscale file: ~.zarr'
 
         self.SaveAsComboBoxLabel = QtWidgets.QLabel('Save as:')
         self.SaveAsComboBox = QtWidgets.QComboBox()
-        self.SaveAsComboBox.addItems([self.raw_string, self.tiff_string, self.bigtiff_string, self.single_hdf5_string])
+        self.SaveAsComboBox.addItems([self.raw_string, self.tiff_string, self.bigtiff_string, self.single_hdf5_string,
+                                      self.single_zarr_string])
         self.SaveAsComboBox.setCurrentIndex(3)
 
         self.registerField('SaveAs', self.SaveAsComboBox, 'currentIndex')
@@ -177,6 +185,9 @@ class FilenameWizardWelcomePage(QtWidgets.QWizardPage):
         elif self.SaveAsComboBox.currentText() == self.single_hdf5_string:
             self.parent.file_format = 'h5'
             return self.parent.single_hdf5
+        elif self.SaveAsComboBox.currentText() == self.single_zarr_string:
+            self.parent.file_format = 'zarr'
+            return self.parent.single_zarr
 
 
 class AbstractSelectionPage(QtWidgets.QWizardPage):
@@ -283,6 +294,19 @@ class FilenameWizardSingleHDF5SelectionPage(AbstractSelectionPage):
         return super().validatePage()
 
 
+class FilenameWizardSingleZarrSelectionPage(AbstractSelectionPage):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setTitle("Autogenerate OME-Zarr filename")
+        self.setSubTitle("This puts all raw data into a single chunked OME-Zarr store with a multiscale pyramid, \n"
+                         "accompanied by a metadata file.")
+        self.registerField('DescriptionZarr', self.DescriptionLineEdit)
+
+    def validatePage(self):
+        self.parent.generate_filename_list(increment_number=False)
+        return super().validatePage()
+
+
 class FilenameWizardCheckResultsPage(QtWidgets.QWizardPage):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -304,10 +328,10 @@ class FilenameWizardCheckResultsPage(QtWidgets.QWizardPage):
     def initializePage(self):
         if self.parent.file_format in ('raw', 'tiff', 'btf'):
             file_list = self.parent.filename_list
-        elif self.parent.file_format == 'h5':
+        elif self.parent.file_format in ('h5', 'zarr'):
             file_list = [self.parent.filename_list[0]]
         else:
-            raise ValueError(f"file_format must be in ('raw', 'tiff', 'btf', 'h5'), received {self.parent.file_format}")
+            raise ValueError(f"file_format must be in ('raw', 'tiff', 'btf', 'h5', 'zarr'), received {self.parent.file_format}")
 
         for f in file_list:
             self.mystring += f
@@ -0,0 +1,124 @@
+'''
+frame_ring.py
+========================================
+
+Ring of recycled frame buffers shared by a producer (the camera thread) and consumers (the image writer).
+
+Every slot has a reference count: the producer acquires a free slot (count 1), fills it and hands
+its reference over to a consumer, which releases the slot when done. Consumers that keep the frame
+longer (e.g. a second writer) retain it first. A slot is reused only when its count is back to 0,
+so nobody reads a frame that is being overwritten, and frames are passed on without copies.
+
+If all slots are in use, acquire() waits until a consumer releases one: this is counted as an overrun
+(the consumers are slower than the camera). The slots are allocated on first use, a ring that never
+fills up uses little memory.
+'''
+import time
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FrameSlot:
+    '''A frame buffer of a FrameRing, see FrameRing.acquire()
+
+    Attributes:
+        data (np.ndarray): the frame, valid until the slot is released
+        index (int): slot number in the ring, -1 for frames that do not belong to a ring
+    '''
+    def __init__(self, ring, index, data):
+        self.ring = ring
+        self.index = index
+        self.data = data
+        self.refcount = 0
+
+    def retain(self):
+        if self.ring is not None:
+            self.ring.retain(self)
+        return self
+
+    def release(self):
+        if self.ring is not None:
+            self.ring.release(self)
+
+    @classmethod
+    def unpooled(cls, shape, dtype=np.uint16):
+        '''Frame with its own memory, e.g. for consumers that keep references to the data'''
+        return cls(None, -1, np.empty(shape, dtype=dtype))
+
+
+class FrameRing:
+    '''Ring of n_slots frames of the same shape, with reference counting.
+
+    Args:
+        n_slots (int): maximum number of frames in use at the same time
+        shape (tuple): frame shape
+        dtype: frame data type
+    '''
+    def __init__(self, n_slots, shape, dtype=np.uint16):
+        self.n_slots = n_slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = []
+        self.free_slots = []
+        self.condition = threading.Condition()
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        with self.condition:
+            self.stats = {'frames': 0,
+                          'overruns': 0,
+                          'time_waiting': 0.0,
+                          'max_in_use': self.get_n_in_use(),
+                          }
+
+    def get_n_in_use(self):
+        return len(self.slots) - len(self.free_slots)
+
+    def fits(self, shape, dtype=np.uint16):
+        return self.shape == tuple(shape) and self.dtype == np.dtype(dtype)
+
+    def acquire(self, timeout=None):
+        '''Free slot with a reference count of 1, waits if all slots are in use.
+
+        Returns:
+            FrameSlot, or None if no slot was released within the timeout (s)
+        '''
+        with self.condition:
+            if not self.free_slots and len(self.slots) < self.n_slots:
+                slot = FrameSlot(self, len(self.slots), np.empty(self.shape, dtype=self.dtype))
+                self.slots.append(slot)
+                self.free_slots.append(slot)
+            if not self.free_slots:
+                self.stats['overruns'] += 1
+                t_start = time.perf_counter()
+                self.condition.wait_for(lambda: self.free_slots, timeout)
+                self.stats['time_waiting'] += time.perf_counter() - t_start
+                if not self.free_slots:
+                    logger.error(f'Frame ring: no slot released within {timeout} s')
+                    return None
+            slot = self.free_slots.pop()
+            slot.refcount = 1
+            self.stats['frames'] += 1
+            self.stats['max_in_use'] = max(self.stats['max_in_use'], self.get_n_in_use())
+            return slot
+
+    def retain(self, slot):
+        with self.condition:
+            assert slot.refcount > 0, f'Frame ring: slot {slot.index} retained after it was released'
+            slot.refcount += 1
+
+    def release(self, slot):
+        with self.condition:
+            assert slot.refcount > 0, f'Frame ring: slot {slot.index} released twice'
+            slot.refcount -= 1
+            if slot.refcount == 0:
+                self.free_slots.append(slot)
+                self.condition.notify()
+
+    def wait_until_released(self, timeout=None):
+        '''Wait until all slots are free, returns False on timeout'''
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.free_slots) == len(self.slots), timeout)
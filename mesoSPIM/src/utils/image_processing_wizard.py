@@ -56,12 +56,16 @@ class ImageProcessingWizard(QtWidgets.QWizard):
         row_count = self.parent.model.rowCount()
         processing_column = self.parent.model.getColumnByName('Processing')
          
+        ''' Projection modes are joined by '+', e.g. 'MAX+MEAN' '''
+        modes = []
+        if self.field('maxProjEnabled'):
+            modes.append('MAX')
+        if self.field('meanProjEnabled'):
+            modes.append('MEAN')
+
         for row in range(0, row_count):
             index = self.parent.model.createIndex(row, processing_column)
-            if self.field('maxProjEnabled'):
-                self.parent.model.setData(index, 'MAX')
-            else:
-                self.parent.model.setData(index,  '')
+            self.parent.model.setData(index, '+'.join(modes))
 
 class ImageProcessingWizardWelcomePage(QtWidgets.QWizardPage):
     def __init__(self, parent=None):
@@ -79,12 +83,15 @@ class ImageProcessingWizardSetOptionsPage(QtWidgets.QWizardPage):
         self.setTitle("Select processing options")
         #self.setSubTitle("Select the processing options:")
 
-        self.maxProjectionCheckBox = QtWidgets.QCheckBox('Post-stack MAX projection', self)
-        
+        self.maxProjectionCheckBox = QtWidgets.QCheckBox('MAX projections (XY, XZ, YZ)', self)
+        self.meanProjectionCheckBox = QtWidgets.QCheckBox('MEAN projections (XY, XZ, YZ)', self)
+
         self.registerField('maxProjEnabled', self.maxProjectionCheckBox)
+        self.registerField('meanProjEnabled', self.meanProjectionCheckBox)
 
         self.layout = QtWidgets.QGridLayout()
         self.layout.addWidget(self.maxProjectionCheckBox, 0, 0)
+        self.layout.addWidget(self.meanProjectionCheckBox, 1, 0)
         self.setLayout(self.layout)
 
     def validatePage(self):
@@ -1,11 +1,11 @@
 from PyQt5 import QtWidgets, QtGui, QtCore, QtDesigner
 
 from .acquisitions import Acquisition, AcquisitionList
+from .acquisition_io import save_acquisition_list, load_acquisition_list
 
 from ..mesoSPIM_State import mesoSPIM_StateSingleton
 
 import copy
-import pickle
 
 
 class AcquisitionModel(QtCore.QAbstractTableModel):
@@ -330,9 +330,8 @@ class AcquisitionModel(QtCore.QAbstractTableModel):
             return AcquisitionList([self._table[row]])
 
     def saveModel(self, filename):
-        ''' Allows to serialize a model via pickle '''
-        with open(filename, "wb" ) as file:
-            pickle.dump(self._table, file)
+        ''' Saves the table as JSON lines, see acquisition_io.py '''
+        save_acquisition_list(self._table, filename)
 
     def setTable(self, table):
         self.modelAboutToBeReset.emit()
@@ -340,9 +339,10 @@ class AcquisitionModel(QtCore.QAbstractTableModel):
         self.modelReset.emit()
 
     def loadModel(self, filename):
+        ''' Loads JSON lines tables, and pickled tables of previous versions '''
+        table = load_acquisition_list(filename)
         self.modelAboutToBeReset.emit()
-        with open(filename, "rb" ) as file:
-            self._table = pickle.load(file)
+        self._table = table
         self.modelReset.emit()
 
     def deleteTable(self):
@@ -0,0 +1,213 @@
+'''
+omezarr_writer.py
+========================================
+
+Chunked, compressed OME-Zarr (NGFF v0.4) writer with a multiscale pyramid
+that is built incrementally while planes arrive from the camera.
+
+Every view (unique tile/channel/illumination/angle combination of an AcquisitionList)
+is stored as a separate multiscale image group inside a single .zarr store.
+The layout of all views is written into the root group attributes ('mesospim' key),
+so that viewers and stitching tools can find the views without a conversion pass.
+The layout is updated after every finished view, so it lists the complete views
+if the acquisition is interrupted, and the store can be resumed.
+
+Requires the `zarr` (v2) and `numcodecs` packages: `pip install "zarr<3"`
+'''
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def downsample_block(block, factors):
+    '''Downsample a (z,y,x) block by averaging over bins of size factors=(fz,fy,fx).
+
+    Edges which are not a multiple of the factor are padded by edge values,
+    so that the output shape is ceil(shape/factors).
+    '''
+    pad = [(0, (-n) % f) for n, f in zip(block.shape, factors)]
+    if any(p[1] for p in pad):
+        block = np.pad(block, pad, mode='edge')
+    nz, ny, nx = (n // f for n, f in zip(block.shape, factors))
+    fz, fy, fx = factors
+    binned = block.reshape(nz, fz, ny, fy, nx, fx).mean(axis=(1, 3, 5))
+    return binned.astype(block.dtype)
+
+
+def get_missing_packages():
+    '''Names of the packages required for .zarr files which cannot be imported'''
+    missing = []
+    for package in ('zarr', 'numcodecs'):
+        try:
+            __import__(package)
+        except ImportError:
+            missing.append(package)
+    return missing
+
+
+def get_view_name(tile, channel, illumination, angle):
+    '''Name of the image group of a view inside the store'''
+    return f'tile{tile}_ch{channel}_illum{illumination}_angle{angle}'
+
+
+def read_finished_views(path):
+    '''Names of the views listed in the layout of an existing store'''
+    import zarr
+    layout = zarr.open_group(path, mode='r').attrs.get('mesospim', {})
+    return [view['path'] for view in layout.get('views', [])]
+
+
+class _PyramidLevel():
+    '''One resolution level of a view: buffers planes until a full z-chunk can be written.'''
+    def __init__(self, array):
+        self.array = array
+        self.block = np.zeros((array.chunks[0],) + array.shape[1:], dtype=array.dtype)
+        self.n_block = 0 # planes currently in the block buffer
+        self.z_written = 0 # planes already written to disk
+        self.pending = [] # planes waiting to be downsampled into the next level
+
+    def flush(self):
+        '''Write the buffered planes to disk, as a single chunk-aligned block'''
+        if self.n_block > 0:
+            z_end = min(self.z_written + self.n_block, self.array.shape[0])
+            self.array[self.z_written:z_end] = self.block[:z_end - self.z_written]
+            self.z_written = z_end
+            self.n_block = 0
+
+
+class OMEZarrWriter():
+    '''
+    Writes views of an AcquisitionList into a single OME-Zarr store.
+
+    Args:
+        path (str): path of the .zarr store (a folder)
+        chunks (tuple): (z,y,x) chunk size of the full-resolution level
+        n_levels (int): number of pyramid levels, including full resolution
+        downsampling (tuple): (z,y,x) downsampling factors between consecutive levels
+        compression (str): Blosc compressor name ('zstd', 'lz4', ...) or None
+        clevel (int): compression level
+        resume (bool): open an existing store and keep its finished views
+    '''
+    def __init__(self, path, chunks=(16, 256, 256), n_levels=4, downsampling=(2, 2, 2),
+                 compression='zstd', clevel=3, resume=False):
+        missing = get_missing_packages()
+        if missing:
+            raise ImportError(f'Writing .zarr files requires the packages {", ".join(missing)}: pip install "zarr<3"')
+        import zarr
+        from numcodecs import Blosc
+        self.path = path
+        self.chunks = tuple(chunks)
+        self.n_levels = n_levels
+        self.downsampling = tuple(downsampling)
+        if compression is None:
+            self.compressor = None
+        else:
+            self.compressor = Blosc(cname=compression, clevel=clevel, shuffle=Blosc.BITSHUFFLE)
+        if resume:
+            self.root = zarr.open_group(path, mode='a')
+            self.views = list(self.root.attrs.get('mesospim', {}).get('views', []))
+            logger.info(f'Resuming OME-Zarr store {path} with {len(self.views)} finished views')
+        else:
+            self.root = zarr.open_group(path, mode='w')
+            self.views = []
+        self.levels = []
+        self.view_name = None
+        self.current_view = None
+
+    def append_view(self, shape, tile=0, channel=0, illumination=0, angle=0,
+                    voxel_size_zyx=(1.0, 1.0, 1.0), translation_zyx=(0.0, 0.0, 0.0), view_attrs=None):
+        '''Create the pyramid arrays of a new view and make it the current one.
+
+        Args:
+            shape (tuple): (z,y,x) shape of the full-resolution stack
+            voxel_size_zyx (tuple): physical voxel size in um
+            translation_zyx (tuple): physical position of the stack origin in um
+            view_attrs (dict): additional information stored in the layout (laser, filename etc)
+        '''
+        self.view_name = get_view_name(tile, channel, illumination, angle)
+        group = self.root.create_group(self.view_name, overwrite=True)
+        self.levels = []
+        datasets = []
+        level_shape = tuple(shape)
+        scale = np.array(voxel_size_zyx, dtype=float)
+        for level in range(self.n_levels):
+            chunks = tuple(min(c, n) for c, n in zip(self.chunks, level_shape))
+            array = group.create_dataset(str(level), shape=level_shape, chunks=chunks, dtype='uint16',
+                                         compressor=self.compressor, fill_value=0)
+            self.levels.append(_PyramidLevel(array))
+            datasets.append({'path': str(level),
+                             'coordinateTransformations': [{'type': 'scale', 'scale': scale.tolist()}]})
+            level_shape = tuple(-(-n // f) for n, f in zip(level_shape, self.downsampling))
+            scale = scale * np.array(self.downsampling)
+
+        group.attrs['multiscales'] = [{
+            'version': '0.4',
+            'name': self.view_name,
+            'axes': [{'name': 'z', 'type': 'space', 'unit': 'micrometer'},
+                     {'name': 'y', 'type': 'space', 'unit': 'micrometer'},
+                     {'name': 'x', 'type': 'space', 'unit': 'micrometer'}],
+            'datasets': datasets,
+            'coordinateTransformations': [{'type': 'translation', 'translation': [float(t) for t in translation_zyx]}],
+            'type': 'mean',
+        }]
+        view = {'path': self.view_name, 'tile': tile, 'channel': channel,
+                'illumination': illumination, 'angle': angle, 'shape': list(shape)}
+        if view_attrs is not None:
+            view.update(view_attrs)
+        self.current_view = view
+        logger.info(f'OME-Zarr writer: new view {self.view_name}, shape {shape}')
+
+    def append_plane(self, plane):
+        '''Add the next z-plane to the current view. Lower resolution levels are
+        computed as soon as enough planes for a downsampled z-block have arrived.'''
+        self._add_plane_to_level(plane, 0)
+
+    def _add_plane_to_level(self, plane, level):
+        lvl = self.levels[level]
+        lvl.block[lvl.n_block] = plane
+        lvl.n_block += 1
+        if lvl.n_block == lvl.block.shape[0]:
+            lvl.flush()
+        if level + 1 < self.n_levels:
+            lvl.pending.append(plane)
+            if len(lvl.pending) == self.downsampling[0]:
+                self._downsample_pending(level)
+
+    def _downsample_pending(self, level):
+        lvl = self.levels[level]
+        block = np.stack(lvl.pending)
+        lvl.pending = []
+        reduced = downsample_block(block, (block.shape[0],) + self.downsampling[1:])
+        self._add_plane_to_level(reduced[0], level + 1)
+
+    def close_view(self, complete=True):
+        '''Flush all partially filled z-blocks of the current view, from full to lowest resolution.
+        Only complete views are added to the layout.'''
+        for level, lvl in enumerate(self.levels):
+            if lvl.pending and level + 1 < self.n_levels:
+                self._downsample_pending(level)
+            lvl.flush()
+        self.levels = []
+        if complete and self.current_view is not None:
+            self.views.append(self.current_view)
+        self.current_view = None
+        self.write_layout()
+
+    def set_attribute_labels(self, attribute, labels):
+        '''Store the human-readable labels of 'channel', 'illumination' or 'angle' indices'''
+        layout = dict(self.root.attrs.get('mesospim', {}))
+        layout[attribute + '_labels'] = [str(label) for label in labels]
+        self.root.attrs['mesospim'] = layout
+
+    def write_layout(self):
+        '''Write the layout of all views into the root attributes'''
+        layout = dict(self.root.attrs.get('mesospim', {}))
+        layout['views'] = self.views
+        self.root.attrs['mesospim'] = layout
+
+    def close(self, complete=True):
+        '''Close the store. With complete=False (aborted acquisition) the current view is not added to the layout.'''
+        if self.levels:
+            self.close_view(complete)
+        self.write_layout()
@@ -0,0 +1,129 @@
+'''
+parallel_bdv_writer.py
+========================================
+
+BigDataViewer HDF5 writer that compresses chunks in a thread pool.
+
+With compression enabled, npy2bdv (via h5py) compresses every chunk of every
+subsampling level serially, in the thread that writes the plane. Here, planes are
+subsampled and their chunks are deflate-compressed by a pool of worker threads
+(zlib releases the GIL), and only the final write of the already compressed chunks
+into the HDF5 file is serialised, using h5py's direct chunk write.
+
+It can also reopen a partially written file, to resume an interrupted acquisition list.
+'''
+import os
+import zlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import h5py
+import numpy as np
+import npy2bdv
+
+logger = logging.getLogger(__name__)
+
+GZIP_LEVEL = 4 # h5py default for compression='gzip'
+
+
+class ParallelBdvWriter(npy2bdv.BdvWriter):
+    '''
+    Drop-in replacement for npy2bdv.BdvWriter for virtual stacks written plane by plane.
+
+    Args:
+        n_workers (int): number of compression threads.
+        resume (bool): keep the views of an existing file and append new views to it,
+            views already in the file are registered with append_existing_view().
+        All other arguments are passed to npy2bdv.BdvWriter.
+
+    Only 'gzip' compression of chunks with z-size 1 can be parallelized,
+    other settings fall back to the serial npy2bdv.BdvWriter.append_plane().
+    '''
+    def __init__(self, filename, n_workers=4, resume=False, **kwargs):
+        if resume and os.path.exists(filename):
+            ''' npy2bdv refuses to open existing files: the writer is created on a new file,
+            then the partial file is swapped back in and reopened '''
+            partial_filename = filename + '.partial'
+            os.replace(filename, partial_filename)
+            super().__init__(filename, **kwargs)
+            self._file_object_h5.close()
+            os.replace(partial_filename, filename)
+            self._file_object_h5 = h5py.File(filename, 'a')
+            self._write_setups_header()
+            logger.info(f'Resuming HDF5 file {filename}')
+        else:
+            super().__init__(filename, **kwargs)
+        self.parallel = n_workers > 0 and self.compression == 'gzip' and all(chunk[0] == 1 for chunk in self.chunks)
+        if self.parallel:
+            self.pool = ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix='mesoSPIM_BdvCompression')
+            logger.info(f'HDF5 chunks are compressed in parallel by {n_workers} threads')
+        else:
+            self.pool = None
+            logger.info(f'HDF5 compression {self.compression} with chunks {self.chunks} is not parallelized')
+
+    def append_plane(self, plane, z, time=0, illumination=0, channel=0, tile=0, angle=0):
+        '''Append a plane to a virtual stack, see npy2bdv.BdvWriter.append_plane()'''
+        if not self.parallel:
+            super().append_plane(plane, z, time=time, illumination=illumination, channel=channel, tile=tile, angle=angle)
+            return
+        assert self.virtual_stacks, "Appending planes requires initialization with virtual stack, " \
+                                    "see append_view(stack=None,...)"
+        isetup = self._determine_setup_id(illumination, channel, tile, angle)
+        self._update_setup_id_present(isetup, time)
+        assert plane.shape == self.stack_shapes[isetup][1:], f"Plane dimensions {plane.shape} do not match (y,x) size" \
+                                                             f" of virtual stack {self.stack_shapes[isetup][1:]}."
+        assert z < self.stack_shapes[isetup][0], f"Plane index {z} must be less than " \
+                                                 f"virtual stack z-dimension {self.stack_shapes[isetup][0]}."
+        ''' Compression of all chunks of all levels runs in the pool '''
+        jobs = []
+        for ilevel in range(self.nlevels):
+            level_plane = self._subsample_plane(plane, self.subsamp[ilevel]).astype('int16')
+            _, chunk_y, chunk_x = self.chunks[ilevel]
+            for y0 in range(0, level_plane.shape[0], chunk_y):
+                for x0 in range(0, level_plane.shape[1], chunk_x):
+                    future = self.pool.submit(self._compress_chunk, level_plane, (y0, x0), chunk_y, chunk_x)
+                    jobs.append((ilevel, (z, y0, x0), future))
+        ''' Writing to the HDF5 file is serialized in the calling thread '''
+        for ilevel, offset, future in jobs:
+            dataset = self._file_object_h5[self._fmt.format(time, isetup, ilevel)]["cells"]
+            dataset.id.write_direct_chunk(offset, future.result())
+
+    def append_existing_view(self, virtual_stack_dim, time=0, illumination=0, channel=0, tile=0, angle=0,
+                             m_affine=None, name_affine='manually defined',
+                             voxel_size_xyz=(1, 1, 1), voxel_units='px', calibration=(1, 1, 1),
+                             exposure_time=0, exposure_units='s'):
+        '''Register a view which is already in the file (resumed acquisition), without touching its data.
+        Arguments as in npy2bdv.BdvWriter.append_view(), the view is included in the XML file.'''
+        if time > self.ntimes - 1:
+            self.ntimes = time + 1
+        isetup = self._determine_setup_id(illumination, channel, tile, angle)
+        for ilevel in range(self.nlevels):
+            group_name = self._fmt.format(time, isetup, ilevel)
+            assert group_name in self._file_object_h5, f'View {group_name} not found in {self.filename_h5}'
+        self._update_setup_id_present(isetup, time)
+        self.stack_shapes[isetup] = virtual_stack_dim
+        self.virtual_stacks = True
+        if m_affine is not None:
+            self.affine_matrices[isetup] = m_affine.copy()
+            self.affine_names[isetup] = name_affine
+        self.calibrations[isetup] = calibration
+        self.voxel_size_xyz[isetup] = voxel_size_xyz
+        self.voxel_units[isetup] = voxel_units
+        self.exposure_time[isetup] = exposure_time
+        self.exposure_units[isetup] = exposure_units
+
+    def _compress_chunk(self, level_plane, offset, chunk_y, chunk_x):
+        y0, x0 = offset
+        chunk = level_plane[y0:y0 + chunk_y, x0:x0 + chunk_x]
+        if chunk.shape != (chunk_y, chunk_x):
+            ''' Edge chunks are stored with full chunk size in HDF5 '''
+            padded = np.zeros((chunk_y, chunk_x), dtype=chunk.dtype)
+            padded[:chunk.shape[0], :chunk.shape[1]] = chunk
+            chunk = padded
+        return zlib.compress(np.ascontiguousarray(chunk).tobytes(), GZIP_LEVEL)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+        super().close()
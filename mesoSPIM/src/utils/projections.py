@@ -0,0 +1,95 @@
+'''
+projections.py
+========================================
+
+Streaming projections of a stack along all three axes, for quality control without loading the full volume.
+
+The projections are updated plane by plane while the stack is written (in the writer thread if
+asynchronous writing is enabled), using in-place numpy operations:
+    XY: projection along z, updated by every plane
+    XZ: projection along the image rows (y), one row per plane
+    YZ: projection along the image columns (x), one row per plane
+'''
+import logging
+import numpy as np
+import tifffile
+
+logger = logging.getLogger(__name__)
+
+PROJECTION_MODES = ('MAX', 'MEAN')
+''' The XY max projection keeps the file name of earlier versions, <file_root>_MAX.tiff '''
+FILE_SUFFIXES = {'MAX_XY': 'MAX'}
+
+
+def get_projection_modes(processing):
+    '''Projection modes from the 'processing' string of an acquisition, e.g. 'MAX' or 'MAX+MEAN' '''
+    options = [option.strip().upper() for option in processing.split('+')] if processing else []
+    return tuple(mode for mode in PROJECTION_MODES if mode in options)
+
+
+class StackProjector():
+    '''
+    Args:
+        shape (tuple): (z,y,x) shape of the stack
+        modes (tuple): projection modes, 'MAX' and/or 'MEAN'
+    '''
+    def __init__(self, shape, modes=('MAX',)):
+        self.shape = tuple(shape)
+        self.modes = tuple(modes)
+        n_planes, ny, nx = self.shape
+        self.n_planes = 0
+        if 'MAX' in self.modes:
+            self.max_xy = np.zeros((ny, nx), dtype=np.uint16)
+            self.max_xz = np.zeros((n_planes, nx), dtype=np.uint16)
+            self.max_yz = np.zeros((n_planes, ny), dtype=np.uint16)
+        if 'MEAN' in self.modes:
+            self.sum_xy = np.zeros((ny, nx), dtype=np.uint64) # sums of uint16 values, exact for any stack size
+            self.mean_xz = np.zeros((n_planes, nx), dtype=np.float32)
+            self.mean_yz = np.zeros((n_planes, ny), dtype=np.float32)
+
+    def add_plane(self, plane):
+        '''Update the projections with the next plane of the stack'''
+        z = self.n_planes
+        if z >= self.shape[0]:
+            logger.warning(f'Projections: plane {z} exceeds the stack size {self.shape[0]}, ignored')
+            return
+        if 'MAX' in self.modes:
+            np.maximum(self.max_xy, plane, out=self.max_xy)
+            np.max(plane, axis=0, out=self.max_xz[z])
+            np.max(plane, axis=1, out=self.max_yz[z])
+        if 'MEAN' in self.modes:
+            np.add(self.sum_xy, plane, out=self.sum_xy, casting='unsafe')
+            np.mean(plane, axis=0, dtype=np.float32, out=self.mean_xz[z])
+            np.mean(plane, axis=1, dtype=np.float32, out=self.mean_yz[z])
+        self.n_planes += 1
+
+    def get_projections(self):
+        '''Dictionary of projections {'MAX_XY': array, ...}, cropped to the planes added so far'''
+        projections = {}
+        n = self.n_planes
+        if 'MAX' in self.modes:
+            projections.update({'MAX_XY': self.max_xy, 'MAX_XZ': self.max_xz[:n], 'MAX_YZ': self.max_yz[:n]})
+        if 'MEAN' in self.modes:
+            mean_xy = (self.sum_xy / max(n, 1)).astype(np.float32)
+            projections.update({'MEAN_XY': mean_xy, 'MEAN_XZ': self.mean_xz[:n], 'MEAN_YZ': self.mean_yz[:n]})
+        return projections
+
+    def save(self, file_root, pixel_size_um=1.0, z_step_um=1.0):
+        '''Write every projection as an ImageJ TIFF file <file_root>_<MODE>_<PLANE>.tiff,
+        except the XY max projection: <file_root>_MAX.tiff
+
+        Returns:
+            list of the written paths
+        '''
+        paths = []
+        for name, image in self.get_projections().items():
+            path = f'{file_root}_{FILE_SUFFIXES.get(name, name)}.tiff'
+            if name.endswith('XY'):
+                resolution = (1. / pixel_size_um, 1. / pixel_size_um)
+            else:
+                ''' Rows of XZ and YZ projections are z planes '''
+                resolution = (1. / pixel_size_um, 1. / abs(z_step_um))
+            tifffile.imwrite(path, image, imagej=True, resolution=resolution, metadata={'unit': 'um'})
+            paths.append(path)
+        logger.info(f'Projections of {self.n_planes} planes saved: {paths}')
+        return paths
@@ -0,0 +1,126 @@
+'''
+raw_writer.py
+========================================
+
+Sequential writer for .raw stacks (headerless uint16 planes).
+
+Instead of mapping the whole stack into memory with np.memmap (which leaves the OS page cache
+with gigabytes of dirty pages that are flushed in bursts), the file is preallocated once and
+frames are appended with large sequential os.write() calls. Optionally, the page cache is
+bypassed with O_DIRECT (Linux), in which case frames are staged in a page-aligned buffer.
+'''
+import os
+import mmap
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ALIGNMENT = 4096 # bytes, covers the sector size of common disks and the memory page size
+
+
+def align_up(n_bytes, alignment=ALIGNMENT):
+    return -(-n_bytes // alignment) * alignment
+
+
+class RawWriter():
+    '''
+    Args:
+        path (str): file path
+        frame_shape (tuple): shape of a single frame
+        n_frames (int): number of frames, used to preallocate the file
+        direct_io (bool): bypass the OS page cache (only where os.O_DIRECT is available)
+        batch_size_mb (int): size of the aligned staging buffer for direct I/O
+    '''
+    def __init__(self, path, frame_shape, n_frames, direct_io=False, batch_size_mb=64):
+        self.path = path
+        self.frame_bytes = int(np.prod(frame_shape)) * np.dtype(np.uint16).itemsize
+        self.total_bytes = self.frame_bytes * n_frames
+        self.direct_io = direct_io and hasattr(os, 'O_DIRECT')
+        if direct_io and not self.direct_io:
+            logger.warning('Raw writer: O_DIRECT is not available on this platform, using buffered I/O')
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+        if self.direct_io:
+            flags |= os.O_DIRECT
+        self.fd = os.open(path, flags, 0o644)
+        self.preallocated = self.preallocate()
+
+        self.bytes_written = 0 # payload bytes, without alignment padding
+        self.time_writing = 0.0
+        if self.direct_io:
+            batch_frames = max(1, batch_size_mb * 2**20 // self.frame_bytes)
+            ''' Anonymous mmap memory is page-aligned, as required by O_DIRECT.
+            The extra page holds the unaligned tail of the previous batch. '''
+            self.staging = mmap.mmap(-1, align_up(batch_frames * self.frame_bytes) + ALIGNMENT)
+            self.staging_view = memoryview(self.staging)
+            self.n_staged = 0
+
+    def preallocate(self):
+        '''Reserve the disk space of the whole stack, to avoid fragmentation and out-of-space errors mid-stack'''
+        try:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(self.fd, 0, align_up(self.total_bytes))
+            else:
+                os.ftruncate(self.fd, self.total_bytes)
+            return True
+        except OSError as e:
+            logger.warning(f'Raw writer: file could not be preallocated: {e}')
+            return False
+
+    def write(self, image):
+        '''Append a frame. Contiguous uint16 frames are written without copying.'''
+        frame = np.ascontiguousarray(image, dtype=np.uint16)
+        assert frame.nbytes == self.frame_bytes, f'Frame size {frame.nbytes} does not match {self.frame_bytes} bytes'
+        if self.direct_io:
+            if self.n_staged + self.frame_bytes > len(self.staging):
+                self._write_staging()
+            self.staging_view[self.n_staged:self.n_staged + self.frame_bytes] = frame.reshape(-1).view(np.uint8)
+            self.n_staged += self.frame_bytes
+        else:
+            self._write_all(memoryview(frame.reshape(-1)).cast('B'))
+        self.bytes_written += self.frame_bytes
+
+    def _write_staging(self, last=False):
+        '''O_DIRECT requires aligned sizes: only the aligned part of the staged frames is written, the
+        remaining bytes are moved to the start of the buffer and written with the next batch.
+        The last batch is padded, the padding is truncated when the file is closed.'''
+        if last:
+            n_aligned = align_up(self.n_staged)
+            self.staging_view[self.n_staged:n_aligned] = bytes(n_aligned - self.n_staged)
+        else:
+            n_aligned = self.n_staged // ALIGNMENT * ALIGNMENT
+        if n_aligned > 0:
+            self._write_all(self.staging_view[:n_aligned])
+        n_remaining = max(0, self.n_staged - n_aligned)
+        if n_remaining > 0:
+            self.staging.move(0, n_aligned, n_remaining)
+        self.n_staged = n_remaining
+
+    def _write_all(self, buffer):
+        t_start = time.time()
+        while len(buffer) > 0:
+            n = os.write(self.fd, buffer)
+            buffer = buffer[n:]
+        self.time_writing += time.time() - t_start
+
+    def get_write_speed(self):
+        '''Sustained disk write speed in MB/s'''
+        if self.time_writing > 0:
+            return self.bytes_written / self.time_writing / 2**20
+        else:
+            return 0.0
+
+    def close(self):
+        '''Write staged frames and truncate the file to the frames actually written (padding, aborted stacks)'''
+        if self.fd is None:
+            return
+        if self.direct_io:
+            self._write_staging(last=True)
+            self.staging_view.release()
+            self.staging.close()
+        os.ftruncate(self.fd, self.bytes_written)
+        os.close(self.fd)
+        self.fd = None
+        logger.info(f'Raw writer: {self.bytes_written / 2**20:.0f} MB written at {self.get_write_speed():.0f} MB/s '
+                    f'(direct I/O: {self.direct_io}, preallocated: {self.preallocated})')
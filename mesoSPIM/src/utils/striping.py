@@ -0,0 +1,117 @@
+'''
+striping.py
+========================================
+
+Distribution of the files of an acquisition list over several target folders (disks),
+so that the write bandwidth scales with the number of disks.
+
+Every acquisition keeps its folder in the acquisition list (the logical folder). A striped copy
+of the list is acquired, where the folder of each file is replaced by <target folder>/<name of the
+logical folder>. Files shared by several acquisitions (.h5, .zarr) stay on one target.
+A manifest (JSON) in the logical folder of the first acquisition maps every acquisition to its
+physical location.
+'''
+import os
+import copy
+import json
+import time
+import shutil
+import logging
+
+logger = logging.getLogger(__name__)
+
+STRIPING_MODES = ('round_robin', 'free_space')
+
+
+def get_manifest_path(acq_list):
+    acq = acq_list[0]
+    return os.path.realpath(acq['folder'] + '/' + acq['filename']) + '_manifest.json'
+
+
+def get_physical_folder(target_folder, logical_folder):
+    return os.path.join(target_folder, os.path.basename(os.path.normpath(logical_folder)))
+
+
+def get_existing_parent(folder):
+    '''The folder itself or its closest existing parent: the disk of a physical folder before it is created'''
+    folder = os.path.realpath(folder)
+    while not os.path.isdir(folder) and os.path.dirname(folder) != folder:
+        folder = os.path.dirname(folder)
+    return folder
+
+
+def assign_target_folders(acq_list, target_folders, mode='round_robin', frame_bytes=0):
+    '''Choose a target folder for every acquisition.
+
+    Args:
+        mode (str): 'round_robin' cycles through the targets file by file,
+            'free_space' puts every file on the target with the most free space left after the files before.
+        frame_bytes (int): size of a frame, used by 'free_space'
+
+    Returns:
+        list of target folders, one per acquisition
+    '''
+    assert mode in STRIPING_MODES, f'Unknown striping mode {mode}, must be one of {STRIPING_MODES}'
+    free_bytes = [shutil.disk_usage(folder).free for folder in target_folders]
+    assignment, file_targets = [], {}
+    for acq in acq_list:
+        path = acq['folder'] + '/' + acq['filename']
+        if path not in file_targets:
+            ''' A new file: all acquisitions of a shared file (.h5, .zarr) follow its first acquisition '''
+            if mode == 'round_robin':
+                target = len(file_targets) % len(target_folders)
+            else:
+                target = max(range(len(target_folders)), key=lambda k: free_bytes[k])
+            file_targets[path] = target
+        target = file_targets[path]
+        free_bytes[target] -= acq.get_image_count() * frame_bytes
+        assignment.append(target_folders[target])
+    return assignment
+
+
+def stripe_acquisition_list(acq_list, target_folders, mode='round_robin', frame_bytes=0, resume=False):
+    '''Copy of the acquisition list with the folders of the files distributed over the target folders.
+
+    When an interrupted list is resumed, the distribution is read from the manifest of the previous run.
+    The physical folders are only created by write_manifest(), once the list passed all checks.
+    '''
+    manifest_path = get_manifest_path(acq_list)
+    physical_folders = None
+    if resume and os.path.exists(manifest_path):
+        manifest = read_manifest(manifest_path)
+        if [entry['filename'] for entry in manifest['acquisitions']] == [acq['filename'] for acq in acq_list]:
+            physical_folders = [entry['physical_folder'] for entry in manifest['acquisitions']]
+        else:
+            logger.warning(f'Manifest {manifest_path} does not match the acquisition list, files are distributed again')
+    if physical_folders is None:
+        targets = assign_target_folders(acq_list, target_folders, mode, frame_bytes)
+        physical_folders = [get_physical_folder(target, acq['folder']) for target, acq in zip(targets, acq_list)]
+
+    striped_list = copy.deepcopy(acq_list)
+    for acq, folder in zip(striped_list, physical_folders):
+        acq['folder'] = folder
+    return striped_list
+
+
+def write_manifest(acq_list, striped_list, mode):
+    '''Create the physical folders and save the physical location of every acquisition of the list'''
+    for striped_acq in striped_list:
+        os.makedirs(striped_acq['folder'], exist_ok=True)
+    manifest = {'created': time.strftime("%Y%m%d-%H%M%S"),
+                'striping': mode,
+                'acquisitions': [{'index': i,
+                                  'filename': acq['filename'],
+                                  'logical_folder': acq['folder'],
+                                  'physical_folder': striped_acq['folder'],
+                                  'path': os.path.join(striped_acq['folder'], striped_acq['filename'])}
+                                 for i, (acq, striped_acq) in enumerate(zip(acq_list, striped_list))]}
+    path = get_manifest_path(acq_list)
+    with open(path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    logger.info(f'Striping manifest saved: {path}')
+    return path
+
+
+def read_manifest(path):
+    with open(path, 'r') as file:
+        return json.load(file)
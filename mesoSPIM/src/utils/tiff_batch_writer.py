@@ -0,0 +1,69 @@
+'''
+tiff_batch_writer.py
+========================================
+
+Batched writer for uncompressed (Big)TIFF and ImageJ stacks.
+
+Writing planes one by one with tifffile encodes the tags, resolution and metadata of every
+page in the calling thread. Here, the TIFF structure of the whole stack (all page headers,
+ImageJ metadata) is written once when the file is created, and the image data, which is
+stored contiguously, is filled in with one large write per batch of planes.
+'''
+import logging
+import numpy as np
+import tifffile
+
+logger = logging.getLogger(__name__)
+
+
+class TiffBatchWriter():
+    '''
+    Args:
+        path (str): file path
+        frame_shape (tuple): shape of a single frame
+        n_frames (int): number of frames of the stack
+        batch_size (int): number of frames accumulated in memory before they are written
+        bigtiff (bool): write BigTIFF instead of ImageJ-compatible TIFF
+        resolution (tuple): (x,y) resolution in pixels per unit
+        metadata (dict): ImageJ metadata such as {'spacing': z_step, 'unit': 'um'}
+    '''
+    def __init__(self, path, frame_shape, n_frames, batch_size=16, bigtiff=False, resolution=None, metadata=None):
+        self.path = path
+        self.frame_shape = tuple(frame_shape)
+        self.n_frames = n_frames
+        self.frame_bytes = int(np.prod(frame_shape)) * np.dtype(np.uint16).itemsize
+        writer_kwargs = dict(bigtiff=True) if bigtiff else dict(imagej=True)
+        metadata = dict(metadata or {}, axes='ZYX') # otherwise ImageJ interprets the frames as channels
+        ''' Without data, tifffile writes the complete TIFF structure and reserves space for the image data '''
+        with tifffile.TiffWriter(path, **writer_kwargs) as tif:
+            self.data_offset, _ = tif.write(shape=(n_frames,) + self.frame_shape, dtype='uint16',
+                                            resolution=resolution, metadata=metadata, returnoffset=True)
+        self.file = open(path, 'r+b', buffering=0)
+        self.batch = np.zeros((max(1, batch_size),) + self.frame_shape, dtype=np.uint16)
+        self.n_batch = 0
+        self.n_written = 0
+
+    def write(self, image):
+        '''Add a frame to the batch, the batch is written when full'''
+        assert self.n_written + self.n_batch < self.n_frames, f'TIFF stack is full ({self.n_frames} frames)'
+        self.batch[self.n_batch] = image
+        self.n_batch += 1
+        if self.n_batch == self.batch.shape[0]:
+            self.flush()
+
+    def flush(self):
+        '''Write all frames of the batch with a single call'''
+        if self.n_batch > 0:
+            self.file.seek(self.data_offset + self.n_written * self.frame_bytes)
+            self.file.write(memoryview(self.batch[:self.n_batch]).cast('B'))
+            self.n_written += self.n_batch
+            self.n_batch = 0
+
+    def close(self):
+        if self.file is None:
+            return
+        self.flush()
+        self.file.close()
+        self.file = None
+        if self.n_written < self.n_frames:
+            logger.info(f'TIFF writer: {self.n_written} of {self.n_frames} frames written, remaining frames are empty')
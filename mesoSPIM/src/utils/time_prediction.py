@@ -0,0 +1,174 @@
+'''
+time_prediction.py
+========================================
+
+Prediction of the duration of acquisition lists from the recorded durations of previous acquisitions.
+
+The predictor learns the cost of every operation between and during stacks:
+the time per plane (relative to the nominal framerate) and the fixed time per stack
+(camera preparation, file closing) for every file format, the stage moves (fixed time plus
+time per mm of travel, by linear regression), rotations, filter and zoom changes.
+The costs are learned separately for every combination of stage and filter wheel type,
+as exponentially weighted averages, so that they follow changes of the hardware.
+They are saved in a JSON history file and used for the next predictions.
+
+Until enough acquisitions have been recorded, the costs of the acquisition planner are used
+(config file: acquisition_planner).
+'''
+import os
+import json
+import logging
+import numpy as np
+from .acquisition_planner import get_costs
+
+logger = logging.getLogger(__name__)
+
+FILE_VERSION = 1
+DEFAULT_STACK_S = 2. # camera preparation and file closing, until learned
+MIN_TRAVEL_VARIANCE_MM2 = 0.01 # below, the stage speed is not learned from the regression
+
+
+def get_hardware_key(cfg):
+    return f"{cfg.stage_parameters['stage_type']}/{cfg.filterwheel_parameters['filterwheel_type']}"
+
+
+def get_extension(filename):
+    return os.path.splitext(filename)[1].lower()
+
+
+class AcquisitionTimePredictor:
+    '''Predicts the duration of acquisitions, learns the operation costs from the recorded durations.
+
+    Args:
+        cfg: mesoSPIM configuration, for the hardware key and the default costs
+        history_path (str): JSON file of learned costs, None: the costs are not saved
+        learning_rate (float): weight of the last recorded acquisition in the averages
+    '''
+    def __init__(self, cfg, history_path=None, learning_rate=0.2):
+        self.history_path = history_path
+        self.learning_rate = learning_rate
+        self.hardware_key = get_hardware_key(cfg)
+        default_costs = get_costs(cfg)
+        self.defaults = {'move_s': 0.,
+                         's_per_mm': 1000 / default_costs['stage_speed_um_s'],
+                         'rotation_s': default_costs['rotation_s'],
+                         'filter_change_s': default_costs['filter_change_s'],
+                         'zoom_change_s': default_costs['zoom_change_s'],
+                         'settings_s': 0.,
+                         }
+        self.history = {'version': FILE_VERSION, 'models': {}}
+        if history_path is not None and os.path.exists(history_path):
+            try:
+                with open(history_path, 'r') as file:
+                    history = json.load(file)
+                if history.get('version') == FILE_VERSION:
+                    self.history = history
+            except (OSError, ValueError) as e:
+                logger.warning(f'Acquisition time history {history_path} could not be read: {e}')
+        self.model = self.history['models'].setdefault(self.hardware_key, {})
+
+    def get(self, operation, default=None):
+        '''Learned cost of the operation in seconds, or the default'''
+        if operation in self.model:
+            return self.model[operation]['value']
+        return self.defaults.get(operation, default)
+
+    def update(self, operation, value):
+        ''' Exponentially weighted average, the first value is taken as it is '''
+        if operation in self.model:
+            entry = self.model[operation]
+            entry['value'] += self.learning_rate * (value - entry['value'])
+            entry['n'] += 1
+        else:
+            self.model[operation] = {'value': value, 'n': 1}
+
+    def get_move_model(self):
+        '''Fixed time and time per mm of the stage moves: linear regression of the recorded moves'''
+        regression = self.model.get('move_regression')
+        s_per_mm = self.get('s_per_mm')
+        if regression is None:
+            return self.get('move_s'), s_per_mm
+        mean_travel, mean_time = regression['sx'] / regression['w'], regression['sy'] / regression['w']
+        variance = regression['sxx'] / regression['w'] - mean_travel ** 2
+        if variance > MIN_TRAVEL_VARIANCE_MM2:
+            s_per_mm = max((regression['sxy'] / regression['w'] - mean_travel * mean_time) / variance, 0.)
+        ''' With (nearly) equal travel, e.g. on a regular tile grid, only the fixed time is learned '''
+        return max(mean_time - s_per_mm * mean_travel, 0.), s_per_mm
+
+    def update_move_model(self, travel_mm, duration):
+        regression = self.model.setdefault('move_regression', {'w': 0., 'sx': 0., 'sy': 0., 'sxx': 0., 'sxy': 0.})
+        decay = 1 - self.learning_rate
+        for key, value in (('w', 1.), ('sx', travel_mm), ('sy', duration),
+                           ('sxx', travel_mm ** 2), ('sxy', travel_mm * duration)):
+            regression[key] = decay * regression[key] + value
+
+    def predict(self, acq_list, framerate):
+        '''Predicted duration in seconds of every acquisition of the list, including the transition
+        from the previous acquisition. The move to the first acquisition is not included.
+
+        Returns:
+            np.array of durations
+        '''
+        n = len(acq_list)
+        extensions = [get_extension(filename) for filename in acq_list.get_column('filename')]
+        plane_factors = np.array([self.get('plane_factor' + extension, 1.) for extension in extensions])
+        stack_times = np.array([self.get('stack_s' + extension, DEFAULT_STACK_S) for extension in extensions])
+        durations = acq_list.get_image_counts() * plane_factors / framerate + stack_times + self.get('settings_s')
+        if n > 1:
+            x, y = acq_list.get_column('x_pos'), acq_list.get_column('y_pos')
+            z_start, z_end = acq_list.get_column('z_start'), acq_list.get_column('z_end')
+            rot, filters, zooms = acq_list.get_column('rot'), acq_list.get_column('filter'), acq_list.get_column('zoom')
+            travel_mm = np.maximum.reduce([np.abs(np.diff(x)), np.abs(np.diff(y)), np.abs(z_start[1:] - z_end[:-1])]) / 1000
+            move_s, s_per_mm = self.get_move_model()
+            durations[1:] += (move_s + s_per_mm * travel_mm
+                              + (np.abs(np.diff(rot)) > 0.1) * self.get('rotation_s')
+                              + (filters[1:] != filters[:-1]) * self.get('filter_change_s')
+                              + (zooms[1:] != zooms[:-1]) * self.get('zoom_change_s'))
+        return durations
+
+    def learn_acquisition(self, acq, previous_acq, phase_timing, acquire_s, framerate):
+        '''Update the operation costs with the recorded durations of an acquisition.
+
+        Args:
+            acq: the acquisition
+            previous_acq: the acquisition before, None for the first one of a list
+            phase_timing (dict): durations of the phases between stacks, see mesoSPIM_Core.end_phase()
+            acquire_s (float): duration of the image acquisition
+            framerate (float): nominal framerate
+        '''
+        extension = get_extension(acq['filename'])
+        planes = acq.get_image_count()
+        if planes > 0 and acquire_s > 0:
+            self.update('plane_factor' + extension, acquire_s / planes * framerate)
+        self.update('stack_s' + extension, sum(phase_timing.get(phase, 0.) for phase in
+                                               ('waiting for previous stack files', 'camera preparation', 'closing')))
+        if previous_acq is None:
+            return
+        settings_s = phase_timing.get('filter, zoom, laser', 0.)
+        filter_changed, zoom_changed = acq['filter'] != previous_acq['filter'], acq['zoom'] != previous_acq['zoom']
+        if filter_changed and not zoom_changed:
+            self.update('filter_change_s', max(settings_s - self.get('settings_s'), 0.))
+        elif zoom_changed and not filter_changed:
+            self.update('zoom_change_s', max(settings_s - self.get('settings_s'), 0.))
+        elif not filter_changed:
+            self.update('settings_s', settings_s)
+
+        travel_mm = max(abs(acq['x_pos'] - previous_acq['x_pos']), abs(acq['y_pos'] - previous_acq['y_pos']),
+                        abs(acq['z_start'] - previous_acq['z_end'])) / 1000
+        move_s = phase_timing.get('move', 0.)
+        if abs(acq['rot'] - previous_acq['rot']) > 0.1:
+            fixed_s, s_per_mm = self.get_move_model()
+            self.update('rotation_s', max(move_s - fixed_s - s_per_mm * travel_mm, 0.))
+        else:
+            self.update_move_model(travel_mm, move_s)
+
+    def save(self):
+        if self.history_path is None:
+            return
+        try:
+            tmp_path = self.history_path + '.tmp'
+            with open(tmp_path, 'w') as file:
+                json.dump(self.history, file, indent=1)
+            os.replace(tmp_path, self.history_path)
+        except OSError as e:
+            logger.error(f'Acquisition time history {self.history_path} could not be saved: {e}')
@@ -0,0 +1,104 @@
+'''
+timing_trace.py
+========================================
+
+Lightweight timing trace of the acquisition: the core, camera, image writer, waveform and
+serial workers record spans (e.g. prepare, move, filter, snap, write, flush, close) into an
+in-memory ring buffer. The spans of an acquisition list are exported as a Chrome trace JSON file,
+which can be opened in Perfetto (https://ui.perfetto.dev) or chrome://tracing.
+
+Recording a span costs about a microsecond (two clock readings and a deque append), so that it
+can be used for every frame. The ring buffer keeps the most recent 'max_events' spans.
+
+Usage:
+    from .utils.timing_trace import trace
+    with trace.span('move', 'stage'):
+        ...
+'''
+import os
+import json
+import time
+import logging
+import threading
+import collections
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class TimingTrace:
+    '''Ring buffer of timed spans, shared by all threads'''
+    def __init__(self, max_events=100000, enabled=False):
+        self.enabled = enabled
+        self.events = collections.deque(maxlen=max_events)
+        self.thread_names = {}
+        self.n_recorded = 0
+        self.t_zero = time.perf_counter()
+
+    def configure(self, enabled=True, max_events=100000):
+        self.enabled = enabled
+        if max_events != self.events.maxlen:
+            self.events = collections.deque(self.events, maxlen=max_events)
+
+    def clear(self):
+        '''Start a new trace, e.g. for every acquisition list'''
+        self.events.clear()
+        self.n_recorded = 0
+        self.t_zero = time.perf_counter()
+
+    def add_span(self, name, category, t_start, duration=None, **args):
+        '''Record a span that started at t_start (time.perf_counter()) and lasted until now, or for duration seconds'''
+        if not self.enabled:
+            return
+        if duration is None:
+            duration = time.perf_counter() - t_start
+        thread_id = threading.get_ident()
+        if thread_id not in self.thread_names:
+            name_of_thread = threading.current_thread().name
+            ''' Threads started by Qt are unknown to Python, they are named after the first category recorded '''
+            self.thread_names[thread_id] = category if name_of_thread.startswith('Dummy') else name_of_thread
+        self.events.append((name, category, t_start, duration, thread_id, args))
+        self.n_recorded += 1
+
+    @contextmanager
+    def span(self, name, category, **args):
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, category, t_start, **args)
+
+    def get_summary(self):
+        '''Total duration and count of the spans in the buffer, by category and name'''
+        summary = collections.defaultdict(lambda: [0., 0])
+        for name, category, _, duration, _, _ in list(self.events):
+            summary[(category, name)][0] += duration
+            summary[(category, name)][1] += 1
+        return dict(summary)
+
+    def to_chrome_trace(self):
+        '''Trace in the Chrome trace event format (complete events, times in microseconds)'''
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id, 'args': {'name': name}}
+                  for thread_id, name in list(self.thread_names.items())]
+        for name, category, t_start, duration, thread_id, args in list(self.events):
+            event = {'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': thread_id,
+                     'ts': round((t_start - self.t_zero) * 1e6, 1), 'dur': round(duration * 1e6, 1)}
+            if args:
+                event['args'] = args
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': {'spans_recorded': self.n_recorded,
+                              'spans_dropped': self.n_recorded - len(self.events)}}
+
+    def export(self, path):
+        '''Write the trace to a JSON file'''
+        with open(path, 'w') as file:
+            json.dump(self.to_chrome_trace(), file, default=str)
+        if self.n_recorded > len(self.events):
+            logger.warning(f'Timing trace: the ring buffer was full, {self.n_recorded - len(self.events)} '
+                           f'of the first spans are missing in {path}')
+        logger.info(f'Timing trace saved: {path}')
+
+
+trace = TimingTrace()
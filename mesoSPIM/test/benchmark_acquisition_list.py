@@ -0,0 +1,94 @@
+# To run the benchmark:
+# python -m test.benchmark_acquisition_list [number of acquisitions]
+'''
+Benchmark of AcquisitionList methods on a large tile grid: the cached columns and indices
+compared to the previous row-by-row implementation (reproduced below).
+'''
+import os
+import sys
+import time
+import shutil
+import tempfile
+from src.utils.acquisitions import Acquisition, AcquisitionList
+
+N_ACQUISITIONS = 5000
+
+
+def make_acq_list(n, folder):
+    lasers = ('488 nm', '561 nm')
+    return AcquisitionList([Acquisition(x_pos=(i // 2) % 50 * 1000, y_pos=(i // 2) // 50 * 1000, z_start=0,
+                                        z_end=2000, z_step=5, laser=lasers[i % 2],
+                                        folder=folder, filename=f'tile{i:05d}.raw')
+                            for i in range(n)])
+
+
+''' Row-by-row reference implementation '''
+def rowwise_image_count(acq_list):
+    return sum(acq.get_image_count() for acq in acq_list)
+
+
+def rowwise_acquisition_time(acq_list, framerate):
+    return sum(acq.get_acquisition_time(framerate) for acq in acq_list)
+
+
+def rowwise_tile_keys(acq_list):
+    tile_list = []
+    for a in acq_list:
+        tile_str = f"{a['x_pos']}{a['y_pos']}{a['z_start']}{a['rot']}"
+        if not tile_str in tile_list:
+            tile_list.append(tile_str)
+    return tile_list
+
+
+def rowwise_n_tiles(acq_list):
+    return len(rowwise_tile_keys(acq_list))
+
+
+def rowwise_tile_index(acq_list, acq):
+    return rowwise_tile_keys(acq_list).index(f"{acq['x_pos']}{acq['y_pos']}{acq['z_start']}{acq['rot']}")
+
+
+def rowwise_existing_filenames(acq_list):
+    return [acq['folder'] + '/' + acq['filename'] for acq in acq_list
+            if os.path.exists(acq['folder'] + '/' + acq['filename'])]
+
+
+def rowwise_duplicates(acq_list):
+    in_list = [acq['folder'] + '/' + acq['filename'] for acq in acq_list]
+    return [each for each in set(in_list) if in_list.count(each) > 1]
+
+
+def timeit(function, repeat=3):
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - t_start) / repeat * 1000, result
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else N_ACQUISITIONS
+    folder = tempfile.mkdtemp()
+    t_ms, acq_list = timeit(lambda: make_acq_list(n, folder), repeat=1)
+    print(f'Building a list of {n} acquisitions: {t_ms:.0f} ms')
+    for i in range(0, n, 10):
+        open(os.path.join(folder, acq_list[i]['filename']), 'w').close()
+
+    acq = acq_list[n // 2]
+    cases = [('image count', lambda: rowwise_image_count(acq_list), lambda: acq_list.get_image_count()),
+             ('acquisition time', lambda: rowwise_acquisition_time(acq_list, 10.), lambda: acq_list.get_acquisition_time(10.)),
+             ('number of tiles', lambda: rowwise_n_tiles(acq_list), lambda: acq_list.get_n_tiles()),
+             ('tile index (per plane)', lambda: rowwise_tile_index(acq_list, acq), lambda: acq_list.get_tile_index(acq)),
+             ('existing filenames', lambda: rowwise_existing_filenames(acq_list), lambda: acq_list.check_for_existing_filenames()),
+             ('duplicated filenames', lambda: rowwise_duplicates(acq_list), lambda: acq_list.check_for_duplicated_filenames()),
+             ]
+    print(f"{'':<24}{'row-wise (ms)':>16}{'columnar (ms)':>16}{'speedup':>10}")
+    for name, rowwise, columnar in cases:
+        t_rowwise, result_rowwise = timeit(rowwise)
+        ''' The first call after a modification of the list builds the cache '''
+        acq_list[0]['intensity'] = 0
+        t_first, _ = timeit(columnar, repeat=1)
+        t_columnar, result_columnar = timeit(columnar)
+        assert result_rowwise == result_columnar or sorted(result_rowwise) == sorted(result_columnar), name
+        print(f'{name:<24}{t_rowwise:>16.3f}{t_columnar:>16.3f}{t_rowwise / max(t_columnar, 1e-6):>9.0f}x'
+              f'   (first call {t_first:.3f} ms)')
+    shutil.rmtree(folder)
@@ -0,0 +1,49 @@
+# To run the benchmark:
+# python -m test.benchmark_acquisition_list_io [number of acquisitions]
+'''
+Benchmark of saving and loading acquisition lists: JSON lines (acquisition_io.py) compared to pickle (previous format).
+'''
+import os
+import sys
+import time
+import pickle
+import shutil
+import tempfile
+from src.utils.acquisitions import Acquisition, AcquisitionList
+from src.utils.acquisition_io import save_acquisition_list, load_acquisition_list
+
+N_ACQUISITIONS = (1000, 5000, 20000)
+
+
+def make_acq_list(n):
+    lasers = ('488 nm', '561 nm')
+    return AcquisitionList([Acquisition(x_pos=(i // 2) % 50 * 1000.5, y_pos=(i // 2) // 50 * 1000.5, z_end=2000, z_step=5,
+                                        laser=lasers[i % 2], folder='D:/data/sample', filename=f'tile{i:05d}.raw')
+                            for i in range(n)])
+
+
+def save_pickle(acq_list, path):
+    with open(path, 'wb') as file:
+        pickle.dump(acq_list, file)
+
+
+def timeit(function, *args):
+    t_start = time.perf_counter()
+    result = function(*args)
+    return (time.perf_counter() - t_start) * 1000, result
+
+
+if __name__ == '__main__':
+    sizes = [int(sys.argv[1])] if len(sys.argv) > 1 else N_ACQUISITIONS
+    folder = tempfile.mkdtemp()
+    print(f"{'acquisitions':>12}{'format':>12}{'save (ms)':>12}{'load (ms)':>12}{'size (kB)':>12}")
+    for n in sizes:
+        acq_list = make_acq_list(n)
+        for name, save in (('pickle', save_pickle), ('JSON lines', save_acquisition_list)):
+            path = os.path.join(folder, f'table_{n}.{name[:4]}')
+            t_save, _ = timeit(save, acq_list, path)
+            ''' Pickle files are loaded by the restricted unpickler of acquisition_io '''
+            t_load, loaded = timeit(load_acquisition_list, path)
+            assert loaded == acq_list
+            print(f'{n:>12}{name:>12}{t_save:>12.0f}{t_load:>12.0f}{os.path.getsize(path) / 1024:>12.0f}')
+    shutil.rmtree(folder)
@@ -0,0 +1,61 @@
+# To run the benchmark:
+# python -m test.benchmark_continuous_stacks [sweeptime in s] [number of planes]
+'''
+Frame rate of a stack acquired plane by plane and as a continuous stack, in demo mode (demo config,
+headless, .raw file in a temporary folder). Plane by plane, the waveform tasks are started, waited for
+and stopped and the stage is moved for every plane. A continuous stack is triggered once, the demo camera
+then delivers one frame per sweep like a triggered camera: the frame rate is at most 1/sweeptime in both modes.
+'''
+import os
+import sys
+import time
+import shutil
+import tempfile
+import importlib.util
+from PyQt5 import QtCore
+from src.mesoSPIM_State import mesoSPIM_StateSingleton
+from src.mesoSPIM_Headless import mesoSPIM_HeadlessRunner
+from src.utils.acquisitions import Acquisition, AcquisitionList
+from src.utils.acquisition_io import save_acquisition_list
+
+SWEEPTIME = 0.02
+N_PLANES = 200
+
+
+def load_demo_config(package_directory):
+    spec = importlib.util.spec_from_file_location('demo_config', os.path.join(package_directory, 'config', 'demo_config.py'))
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    config.timing_trace = {'enabled': False}
+    config.time_prediction = {'history_file': None}
+    return config
+
+
+def acquire_stack(app, package_directory, config, n_planes):
+    ''' Runs a single stack, returns the frame rate between the first and the last plane '''
+    folder = tempfile.mkdtemp()
+    table_path = os.path.join(folder, 'table.json')
+    save_acquisition_list(AcquisitionList([Acquisition(z_start=0, z_end=n_planes * 2, z_step=2, folder=folder,
+                                                       filename='stack.raw')]), table_path)
+    runner = mesoSPIM_HeadlessRunner(package_directory, config, table_path, progress_interval=3600)
+    QtCore.QTimer.singleShot(0, runner.start)
+    app.exec_()
+    core = runner.core
+    fps = n_planes / (core.image_acq_end_time - core.image_acq_start_time)
+    shutil.rmtree(folder)
+    return fps
+
+
+if __name__ == '__main__':
+    sweeptime = float(sys.argv[1]) if len(sys.argv) > 1 else SWEEPTIME
+    n_planes = int(sys.argv[2]) if len(sys.argv) > 2 else N_PLANES
+    package_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    app = QtCore.QCoreApplication(sys.argv)
+    config = load_demo_config(package_directory)
+    mesoSPIM_StateSingleton()['sweeptime'] = sweeptime
+    print(f'{n_planes} planes, sweeptime {sweeptime * 1000:.0f} ms (at most {1 / sweeptime:.1f} fps), '
+          f'frames {config.camera_parameters["x_pixels"]}x{config.camera_parameters["y_pixels"]}')
+    for continuous in (False, True):
+        config.continuous_stacks = continuous
+        fps = acquire_stack(app, package_directory, config, n_planes)
+        print(f"{'continuous stack' if continuous else 'plane by plane':<30}{fps:>10.1f} fps")
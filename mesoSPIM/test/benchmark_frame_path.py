@@ -0,0 +1,104 @@
+# To run the benchmark:
+# python -m test.benchmark_frame_path [frame size in pixels] [display subsampling]
+'''
+Benchmark of the camera frame path: rotation, display frame and frame handed to the image writer.
+
+Previous path (reproduced below): np.rot90() view, the display frame is a strided view of it (copied by the
+camera window to display it) and the writer copies the rotated view with np.ascontiguousarray().
+Current path (mesoSPIM_Camera.add_images_to_series): one blocked rotation into a recycled frame buffer
+of the writer (utils/frame_ring.py), the display frame is subsampled from it (a small copy, kept by the display).
+
+Bytes moved are the bytes read and written by the copies; allocated bytes are measured by tracemalloc.
+'''
+import sys
+import time
+import tracemalloc
+import numpy as np
+from src.utils.frame_path import rotate_frame, downsample_frame
+from src.utils.frame_ring import FrameRing
+
+FRAME_SIZE = 2048
+SUBSAMPLING = 2
+N_FRAMES = 50
+
+
+''' Previous implementation '''
+def previous_camera_thread(image, subsampling):
+    image = np.rot90(image)
+    display_frame = image[::subsampling, ::subsampling]
+    writer_frame = np.ascontiguousarray(image)
+    return display_frame, writer_frame
+
+
+def display_copy(display_frame):
+    ''' The camera window needs a contiguous image, strided views are copied '''
+    return np.ascontiguousarray(display_frame)
+
+
+def previous_path(image, subsampling):
+    display_frame, writer_frame = previous_camera_thread(image, subsampling)
+    return display_copy(display_frame), writer_frame
+
+
+''' Current implementation '''
+class CurrentCameraThread:
+    ''' Frame buffers as in mesoSPIM_ImageWriter.acquire_frame(), the writer releases them immediately '''
+    def __init__(self, n_slots):
+        self.n_slots = n_slots
+        self.frame_ring = None
+
+    def __call__(self, image, subsampling):
+        if self.frame_ring is None:
+            self.frame_ring = FrameRing(self.n_slots, image.shape[::-1], image.dtype)
+        frame = self.frame_ring.acquire()
+        rotate_frame(image, out=frame.data)
+        display_frame = downsample_frame(frame.data, subsampling)
+        frame.release()
+        return display_frame, frame.data
+
+
+def measure(function, frames, subsampling):
+    ''' Returns ms per frame and the result of the last frame '''
+    function(frames[0], subsampling) # warm-up, e.g. buffer allocation
+    t_start = time.perf_counter()
+    for frame in frames:
+        result = function(frame, subsampling)
+    return (time.perf_counter() - t_start) / len(frames) * 1000, result
+
+
+def allocated_per_frame(function, frames, subsampling, n=8):
+    ''' MB allocated per frame, the results are kept alive like frames in the writer queue (previous path) '''
+    function(frames[0], subsampling)
+    tracemalloc.start()
+    results = [function(frame, subsampling) for frame in frames[:n]]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return allocated / n / 1e6
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else FRAME_SIZE
+    subsampling = int(sys.argv[2]) if len(sys.argv) > 2 else SUBSAMPLING
+    frames = [np.random.randint(0, 4000, (size, size), dtype=np.uint16) for _ in range(4)] * (N_FRAMES // 4)
+    frame_mb = frames[0].nbytes / 1e6
+    display_mb = frame_mb / subsampling ** 2
+    print(f'Frame {size}x{size} uint16 ({frame_mb:.1f} MB), display subsampling {subsampling}')
+    print(f"{'':<32}{'camera (ms)':>12}{'display (ms)':>13}{'copies':>8}{'moved (MB)':>12}{'allocated (MB)':>16}")
+
+    ''' Both paths copy the full frame once and the display frame once (read + write) '''
+    moved_mb = 2 * frame_mb + 2 * display_mb
+    t_camera, (display_frame, writer_frame) = measure(previous_camera_thread, frames, subsampling)
+    t_display, _ = measure(lambda frame, s: display_copy(np.rot90(frame)[::s, ::s]), frames, subsampling)
+    allocated = allocated_per_frame(previous_path, frames, subsampling)
+    print(f"{'previous':<32}{t_camera:>12.2f}{t_display:>13.2f}{2:>8}{moved_mb:>12.1f}{allocated:>16.1f}")
+
+    for name, n_slots in (('current, asynchronous writing', 66), ('current, synchronous writing', 1)):
+        camera_thread = CurrentCameraThread(n_slots)
+        t_camera, (display_frame, writer_frame) = measure(camera_thread, frames, subsampling)
+        expected = np.rot90(frames[-1])
+        assert np.array_equal(writer_frame, expected) and np.array_equal(display_frame, expected[::subsampling, ::subsampling])
+        assert display_frame.flags.c_contiguous and writer_frame.flags.c_contiguous
+        allocated = allocated_per_frame(camera_thread, frames, subsampling)
+        ''' The display frame is contiguous: the camera window displays it without copy '''
+        print(f"{name:<32}{t_camera:>12.2f}{0:>13.2f}{2:>8}{moved_mb:>12.1f}{allocated:>16.1f}")
@@ -0,0 +1,73 @@
+# To run the benchmark:
+# python -m test.benchmark_hdf5_compression [path/to/config.py]
+'''
+Benchmark of BigDataViewer HDF5 writing speed (frames/s) for subsampling and compression settings.
+
+The subsampling levels of the hdf5 dictionary in the config file are combined with all compression
+options, written serially by npy2bdv.BdvWriter and in parallel by ParallelBdvWriter.
+Frames are synthetic, with sample-like structures and noise (random data does not compress).
+'''
+import os
+import sys
+import time
+import shutil
+import tempfile
+import importlib.util
+import numpy as np
+import npy2bdv
+from src.utils.parallel_bdv_writer import ParallelBdvWriter
+
+N_FRAMES = 50
+
+
+def load_config(path):
+    spec = importlib.util.spec_from_file_location('module.name', path)
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    return config
+
+
+def make_frames(n, y_pixels, x_pixels):
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:y_pixels, 0:x_pixels]
+    background = 100 + 400 * (np.sin(xx / 40.) * np.cos(yy / 60.)) ** 2
+    return [rng.poisson(background * (1 + 0.1 * i / n)).astype(np.uint16) for i in range(n)]
+
+
+def benchmark(path, frames, subsamp, compression, n_workers):
+    kwargs = dict(blockdim=((1, 256, 256),), subsamp=subsamp, compression=compression)
+    if n_workers > 0:
+        writer = ParallelBdvWriter(path, n_workers=n_workers, **kwargs)
+    else:
+        writer = npy2bdv.BdvWriter(path, **kwargs)
+    writer.append_view(stack=None, virtual_stack_dim=(len(frames),) + frames[0].shape)
+    t_start = time.time()
+    for z, frame in enumerate(frames):
+        writer.append_plane(plane=frame, z=z)
+    writer.close()
+    return len(frames) / (time.time() - t_start)
+
+
+if __name__ == '__main__':
+    cfg_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join('config', 'demo_config.py')
+    cfg = load_config(cfg_path)
+    y_pixels, x_pixels = cfg.camera_parameters['y_pixels'], cfg.camera_parameters['x_pixels']
+    n_workers = cfg.hdf5.get('compression_workers', 4) if hasattr(cfg, 'hdf5') else 4
+    subsamp_options = [((1, 1, 1),)]
+    if hasattr(cfg, 'hdf5') and tuple(map(tuple, cfg.hdf5['subsamp'])) not in subsamp_options:
+        subsamp_options.append(tuple(map(tuple, cfg.hdf5['subsamp'])))
+    frames = make_frames(N_FRAMES, y_pixels, x_pixels)
+    folder = tempfile.mkdtemp()
+    print(f'Frame size {y_pixels}x{x_pixels}, {N_FRAMES} frames, {n_workers} compression threads')
+    print(f"{'subsamp':<30}{'compression':<14}{'writer':<12}{'frames/s':>10}")
+    try:
+        for subsamp in subsamp_options:
+            for compression in (None, 'lzf', 'gzip'):
+                for workers in ((0, n_workers) if compression == 'gzip' else (0,)):
+                    path = os.path.join(folder, 'benchmark.h5')
+                    fps = benchmark(path, frames, subsamp, compression, workers)
+                    os.remove(path)
+                    writer_name = 'parallel' if workers > 0 else 'serial'
+                    print(f"{str(subsamp):<30}{str(compression):<14}{writer_name:<12}{fps:>10.1f}")
+    finally:
+        shutil.rmtree(folder)
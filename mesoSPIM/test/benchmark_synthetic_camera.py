@@ -0,0 +1,72 @@
+# To run the benchmark:
+# python -m test.benchmark_synthetic_camera [frame size in pixels] [number of frames]
+'''
+Benchmark of the demo camera frames: the previous generator (reproduced below) compared to the
+precomputed synthetic frames, and the frame rate of the camera-to-writer path with synthetic frames
+(rotation into a recycled frame buffer, .raw file written in a temporary folder).
+'''
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+from src.utils.synthetic_frames import SyntheticFrameSource
+from src.utils.frame_path import rotate_frame
+from src.utils.frame_ring import FrameRing
+from src.utils.raw_writer import RawWriter
+
+FRAME_SIZE = 2048
+N_FRAMES = 500
+
+
+class PreviousDemoFrames:
+    ''' Previous mesoSPIM_DemoCamera._create_random_image() '''
+    def __init__(self, x_pixels, y_pixels):
+        self.x_pixels, self.y_pixels = x_pixels, y_pixels
+        self.count = 0
+        self.line = 400 * np.sin(np.linspace(0, 6 * np.pi, x_pixels)) + 1200
+
+    def get_frame(self):
+        data = np.array([np.roll(self.line, 4 * i + self.count) for i in range(0, self.y_pixels)], dtype='uint16')
+        data = data + (np.random.normal(size=(self.x_pixels, self.y_pixels)) * 100)
+        data = np.around(data).astype('uint16')
+        self.count += 20
+        return data
+
+
+def frames_per_second(function, n):
+    t_start = time.perf_counter()
+    for _ in range(n):
+        function()
+    return n / (time.perf_counter() - t_start)
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else FRAME_SIZE
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else N_FRAMES
+    frame_mb = size * size * 2 / 2**20
+    print(f'Frames {size}x{size} uint16 ({frame_mb:.1f} MB)')
+
+    previous = PreviousDemoFrames(size, size)
+    print(f"{'previous demo camera':<40}{frames_per_second(previous.get_frame, max(n // 50, 3)):>10.1f} fps")
+    t_start = time.perf_counter()
+    source = SyntheticFrameSource((size, size), seed=0)
+    print(f"{'synthetic frames, precomputation':<40}{time.perf_counter() - t_start:>10.2f} s")
+    print(f"{'synthetic frames':<40}{frames_per_second(source.get_frame, n):>10.1f} fps")
+
+    ''' Camera thread and synchronous .raw writer, as in mesoSPIM_Camera.add_images_to_series() '''
+    folder = tempfile.mkdtemp()
+    ring = FrameRing(1, (size, size))
+    writer = RawWriter(os.path.join(folder, 'stack.raw'), (size, size), n)
+
+    def camera_to_writer():
+        frame = ring.acquire()
+        rotate_frame(source.get_frame(), out=frame.data)
+        writer.write(frame.data)
+        frame.release()
+
+    fps = frames_per_second(camera_to_writer, n)
+    writer.close()
+    print(f"{'synthetic frames, rotated and written':<40}{fps:>10.1f} fps {fps * frame_mb:>8.0f} MB/s")
+    shutil.rmtree(folder)
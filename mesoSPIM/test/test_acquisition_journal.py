@@ -0,0 +1,61 @@
+# To run the test:
+# python -m test.test_acquisition_journal
+import os
+import shutil
+import tempfile
+import unittest
+from src.utils.acquisitions import Acquisition, AcquisitionList
+from src.utils.acquisition_journal import AcquisitionJournal, get_journal_progress, get_journal_path
+
+
+class TestAcquisitionJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.acq_list = AcquisitionList([Acquisition(folder=self.folder, filename=f'tile{i}.raw', z_end=100, z_step=1)
+                                         for i in range(4)])
+
+    def test_interrupted_list(self):
+        journal = AcquisitionJournal(self.acq_list)
+        for i in range(2):
+            journal.acquisition_started(i, self.acq_list[i])
+            journal.acquisition_finished(i, self.acq_list[i])
+        journal.acquisition_started(2, self.acq_list[2])
+        journal.planes_acquired(2, 50)
+        journal.file.close() # crash, no close() record
+        finished, interrupted, message = get_journal_progress(self.acq_list)
+        self.assertEqual((finished, interrupted, message), ([0, 1], 2, ''))
+
+    def test_resumed_and_finished_list(self):
+        journal = AcquisitionJournal(self.acq_list)
+        journal.acquisition_started(0, self.acq_list[0])
+        journal.file.close()
+        journal = AcquisitionJournal(self.acq_list, resume=True)
+        for i in range(4):
+            journal.acquisition_started(i, self.acq_list[i])
+            journal.acquisition_finished(i, self.acq_list[i])
+        journal.close(finished=True)
+        finished, interrupted, message = get_journal_progress(self.acq_list)
+        self.assertTrue(message.startswith('Acquisition list was already finished'))
+
+    def test_truncated_record_and_other_list(self):
+        journal = AcquisitionJournal(self.acq_list)
+        journal.acquisition_started(0, self.acq_list[0])
+        journal.acquisition_finished(0, self.acq_list[0])
+        journal.file.write('{"event": "acquisition_sta')
+        journal.file.close()
+        self.assertEqual(get_journal_progress(self.acq_list), ([0], None, ''))
+        self.acq_list[3]['z_end'] = 200
+        finished, interrupted, message = get_journal_progress(self.acq_list)
+        self.assertTrue(message.startswith('Journal belongs to a different acquisition list'))
+
+    def test_no_journal(self):
+        self.assertFalse(os.path.exists(get_journal_path(self.acq_list)))
+        finished, interrupted, message = get_journal_progress(self.acq_list)
+        self.assertTrue(message.startswith('No journal found'))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+# To run the test:
+# python -m test.test_acquisition_planner
+import unittest
+from src.utils.acquisitions import Acquisition, AcquisitionList
+from src.utils.acquisition_planner import optimize_acquisition_list, estimate_overhead
+
+
+class TestAcquisitionPlanner(unittest.TestCase):
+    def setUp(self) -> None:
+        ''' 4x4 tile grid, two channels per tile with different filters, interleaved '''
+        self.acq_list = AcquisitionList([Acquisition(x_pos=column * 1000, y_pos=row * 1000, z_start=0, z_end=1000,
+                                                     laser=laser, filter=filter, filename=f'{row}_{column}_{laser}.raw')
+                                         for row in range(4) for column in range(4)
+                                         for laser, filter in (('488 nm', '515LP'), ('561 nm', '561LP'))])
+
+    def test_serpentine_channel_major_order(self):
+        planned_list, overhead_before, overhead_after = optimize_acquisition_list(self.acq_list)
+        self.assertLess(overhead_after, overhead_before)
+        self.assertEqual(overhead_after, estimate_overhead(planned_list))
+        self.assertEqual(sorted(acq['filename'] for acq in planned_list), sorted(acq['filename'] for acq in self.acq_list))
+        ''' One filter change, serpentine tile order '''
+        self.assertEqual([acq['filter'] for acq in planned_list], ['515LP'] * 16 + ['561LP'] * 16)
+        self.assertEqual([(acq['x_pos'], acq['y_pos']) for acq in planned_list[3:6]], [(3000, 0), (3000, 1000), (2000, 1000)])
+
+    def test_channel_order_within_tiles(self):
+        for i in range(0, len(self.acq_list), 4):
+            self.acq_list[i]['laser'], self.acq_list[i + 1]['laser'] = '561 nm', '488 nm'
+        planned_list, _, _ = optimize_acquisition_list(self.acq_list, keep_channel_order=True)
+        for tile in range(self.acq_list.get_n_tiles()):
+            lasers = [acq['laser'] for acq in planned_list if self.acq_list.get_tile_index(acq) == tile]
+            expected = [acq['laser'] for acq in self.acq_list if self.acq_list.get_tile_index(acq) == tile]
+            self.assertEqual(lasers, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# To run the test:
+# python -m test.test_acquisitions
+import os
+import copy
+import pickle
+import tempfile
+import unittest
+import numpy as np
+from src.utils.acquisitions import Acquisition, AcquisitionList
+from src.utils.acquisition_io import save_acquisition_list, load_acquisition_list
+
+
+class TestAcquisitionListIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.acq_list = AcquisitionList([Acquisition(x_pos=x, laser=laser, shutterconfig=shutter)
+                                         for x in (0, 100, 200)
+                                         for laser in ('488 nm', '561 nm')
+                                         for shutter in ('Left', 'Right')])
+
+    def test_indices(self):
+        self.assertEqual(self.acq_list.get_n_tiles(), 3)
+        self.assertEqual(self.acq_list.get_n_lasers(), 2)
+        self.assertEqual(self.acq_list.get_n_shutter_configs(), 2)
+        self.assertEqual(self.acq_list.get_n_angles(), 1)
+        self.assertEqual(self.acq_list.get_unique_attr_list('laser'), ['488 nm', '561 nm'])
+        self.assertEqual(self.acq_list.find_value_index('561 nm', 'laser'), 1)
+        self.assertEqual(self.acq_list.find_value_index('Right', 'shutterconfig'), 1)
+        self.assertEqual([self.acq_list.get_tile_index(acq) for acq in self.acq_list[::4]], [0, 1, 2])
+
+    def test_index_is_updated_after_acquisition_changes(self):
+        self.assertEqual(self.acq_list.get_n_lasers(), 2)
+        self.acq_list[0]['laser'] = '637 nm'
+        self.assertEqual(self.acq_list.get_unique_attr_list('laser'), ['637 nm', '488 nm', '561 nm'])
+        self.acq_list[0]['x_pos'] = 300
+        self.assertEqual(self.acq_list.get_tile_index(self.acq_list[0]), 0)
+        self.assertEqual(self.acq_list.get_tile_index(self.acq_list[1]), 1)
+        self.assertEqual(self.acq_list.get_n_tiles(), 4)
+
+    def test_index_is_updated_after_list_changes(self):
+        self.assertEqual(self.acq_list.get_n_tiles(), 3)
+        self.acq_list.append(Acquisition(x_pos=300))
+        self.assertEqual(self.acq_list.get_n_tiles(), 4)
+        self.acq_list.reverse()
+        self.assertEqual(self.acq_list.get_tile_index(Acquisition(x_pos=300)), 0)
+        del self.acq_list[0]
+        self.assertEqual(self.acq_list.get_n_tiles(), 3)
+        self.acq_list[0:4] = []
+        self.assertEqual(self.acq_list.get_n_tiles(), 2)
+        with self.assertRaises(ValueError):
+            self.acq_list.get_tile_index(Acquisition(x_pos=200))
+
+    def test_aggregates(self):
+        self.acq_list[1]['z_end'] = -95
+        self.acq_list[2]['z_step'] = 3
+        self.assertEqual(self.acq_list.get_image_count(), sum(acq.get_image_count() for acq in self.acq_list))
+        self.assertEqual(list(self.acq_list.get_column('x_pos')[::4]), [0, 100, 200])
+        self.acq_list.append(Acquisition(z_end=1000))
+        self.assertEqual(self.acq_list.get_acquisition_time(10.), sum(acq.get_acquisition_time(10.) for acq in self.acq_list))
+
+    def test_copy(self):
+        self.assertEqual(self.acq_list.get_n_tiles(), 3)
+        acq_list_copy = copy.deepcopy(self.acq_list)
+        acq_list_copy[0]['x_pos'] = 300
+        self.assertEqual(acq_list_copy.get_n_tiles(), 4)
+        self.assertEqual(self.acq_list.get_n_tiles(), 3)
+
+
+class TestAcquisitionListFiles(unittest.TestCase):
+    def setUp(self) -> None:
+        self.path = tempfile.mktemp()
+        self.acq_list = AcquisitionList([Acquisition(x_pos=np.float64(10.5 * i), filename=f'tile{i}.raw', processing='MAX')
+                                         for i in range(3)])
+
+    def test_round_trip(self):
+        save_acquisition_list(self.acq_list, self.path)
+        acq_list = load_acquisition_list(self.path)
+        self.assertEqual(acq_list, self.acq_list)
+        self.assertEqual(acq_list.get_keylist(), self.acq_list.get_keylist())
+
+    def test_unknown_and_missing_keys(self):
+        with open(self.path, 'w') as file:
+            file.write('{"format": "mesoSPIM acquisition list", "version": 1, "keys": ["x_pos", "new_key"]}\n')
+            file.write('[100, "new value"]\n')
+        acq_list = load_acquisition_list(self.path)
+        self.assertEqual(acq_list[0]['x_pos'], 100)
+        self.assertEqual(acq_list[0]['filename'], Acquisition()['filename'])
+        self.assertNotIn('new_key', acq_list[0].keys())
+
+    def test_pickle_import(self):
+        with open(self.path, 'wb') as file:
+            pickle.dump(self.acq_list, file)
+        self.assertEqual(load_acquisition_list(self.path), self.acq_list)
+        with open(self.path, 'wb') as file:
+            pickle.dump(AcquisitionList([Acquisition(filename=os.system)]), file)
+        with self.assertRaises(pickle.UnpicklingError):
+            load_acquisition_list(self.path)
+
+    def tearDown(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
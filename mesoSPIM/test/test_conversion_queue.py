@@ -0,0 +1,92 @@
+# To run the test:
+# python -m test.test_conversion_queue
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import h5py
+import tifffile
+import zarr
+from PyQt5 import QtCore
+from src.utils.conversion_queue import ConversionQueue, convert_raw_stack, get_target_path
+
+SHAPE = (20, 64, 48) # z, x_pixels, y_pixels of the .raw stack
+
+
+class TestConversionQueue(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.stack = np.random.default_rng(0).integers(0, 4096, SHAPE, dtype=np.uint16)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder)
+
+    def create_job(self, target_format, filename='stack.raw'):
+        ''' A finished .raw stack and its conversion job, as from mesoSPIM_ImageWriter.get_conversion_job() '''
+        path = os.path.join(self.folder, filename)
+        self.stack.tofile(path)
+        return {'path': path,
+                'shape': SHAPE,
+                'target_format': target_format,
+                'max_read_mb_s': 0,
+                'pixel_size_um': 2.0,
+                'z_step': 5,
+                'hdf5': {'subsamp': ((1, 1, 1), (1, 2, 2))},
+                'bdv_view': dict(illumination=0, channel=0, angle=0, tile=0, voxel_units='um',
+                                 voxel_size_xyz=(2.0, 2.0, 5)),
+                'zarr': {'chunks': (8, 32, 32), 'levels': 2},
+                'zarr_view': {'voxel_size_zyx': (5, 2.0, 2.0)}}
+
+    def test_convert_h5(self):
+        target_path = convert_raw_stack(self.create_job('.h5'))
+        with h5py.File(target_path, 'r') as file:
+            np.testing.assert_array_equal(file['t00000/s00/0/cells'][:], self.stack)
+            self.assertEqual(file['t00000/s00/1/cells'].shape, (20, 32, 24))
+
+    def test_convert_zarr(self):
+        target_path = convert_raw_stack(self.create_job('.zarr'))
+        root = zarr.open_group(target_path, mode='r')
+        np.testing.assert_array_equal(root['tile0_ch0_illum0_angle0/0'][:], self.stack)
+
+    def test_convert_tiff(self):
+        for target_format in ('.tiff', '.btf'):
+            target_path = convert_raw_stack(self.create_job(target_format))
+            np.testing.assert_array_equal(tifffile.imread(target_path), self.stack)
+
+    def test_progress_and_existing_target(self):
+        job = self.create_job('.tiff')
+        progress = {}
+        convert_raw_stack(job, progress)
+        self.assertEqual(progress[job['path']], 1.0)
+        with self.assertRaises(FileExistsError):
+            convert_raw_stack(job)
+
+    def test_queue(self):
+        ''' Stacks are converted in worker processes, the .raw files are kept, failures are counted '''
+        queue = ConversionQueue(n_workers=2, poll_interval_ms=50)
+        messages = []
+        queue.sig_progress.connect(messages.append)
+        jobs = [self.create_job('.tiff', f'stack{i}.raw') for i in range(3)]
+        for job in jobs:
+            queue.add_job(job)
+        queue.add_job(dict(self.create_job('.tiff', 'truncated.raw'), shape=(40,) + SHAPE[1:]))
+        t_start = time.time()
+        while queue.futures and time.time() - t_start < 60:
+            self.app.processEvents()
+            time.sleep(0.01)
+        queue.shutdown()
+        self.assertEqual((queue.n_converted, queue.n_failed), (3, 1))
+        self.assertEqual(messages[-1], 'Conversion: 3 file(s) done, 1 failed')
+        for job in jobs:
+            self.assertTrue(os.path.exists(job['path']))
+            np.testing.assert_array_equal(tifffile.imread(get_target_path(job['path'], '.tiff')), self.stack)
+
+
+if __name__ == '__main__':
+    unittest.main()
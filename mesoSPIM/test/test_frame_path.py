@@ -0,0 +1,55 @@
+# To run the test:
+# python -m test.test_frame_path
+import time
+import unittest
+import numpy as np
+from src.utils.frame_path import rotate_frame, downsample_frame, DisplayGovernor, PENDING_TIMEOUT
+
+
+class TestFramePath(unittest.TestCase):
+    def test_rotate_frame(self):
+        ''' Frame sizes that are not multiples of the block size '''
+        image = np.random.randint(0, 4000, (300, 517), dtype=np.uint16)
+        rotated = rotate_frame(image, block=64)
+        np.testing.assert_array_equal(rotated, np.rot90(image))
+        self.assertTrue(rotated.flags.c_contiguous)
+        out = np.empty((517, 300), dtype=np.uint16)
+        self.assertIs(rotate_frame(image, out=out), out)
+        np.testing.assert_array_equal(out, np.rot90(image))
+
+    def test_downsample_frame(self):
+        ''' Display frames are never overwritten by the following frames, the receivers keep them '''
+        frame = np.arange(100 * 60, dtype=np.uint16).reshape(100, 60)
+        displayed = [downsample_frame(frame, 4)]
+        frame[:] = 0
+        displayed.append(downsample_frame(frame, 4))
+        self.assertEqual(displayed[0].shape, (25, 15))
+        self.assertTrue(displayed[0].flags.c_contiguous)
+        np.testing.assert_array_equal(displayed[0], np.arange(100 * 60, dtype=np.uint16).reshape(100, 60)[::4, ::4])
+        self.assertFalse(displayed[1].any())
+        self.assertEqual(downsample_frame(np.rot90(frame), 2).shape, (30, 50))
+
+    def test_display_governor(self):
+        ''' 1000 frames in about 0.2 s at 20 fps: about 5 displayed, the forced last frame too '''
+        governor = DisplayGovernor(max_fps=20)
+        for i in range(1000):
+            governor.is_due(force=i == 999)
+            time.sleep(0.0002)
+        self.assertEqual(governor.stats['acquired'], 1000)
+        self.assertGreaterEqual(governor.stats['displayed'], 2)
+        self.assertLessEqual(governor.stats['displayed'], 10)
+
+    def test_display_acknowledgement(self):
+        ''' No frame rate limit, but at most 2 frames waiting for the camera window '''
+        governor = DisplayGovernor(max_fps=0, max_pending=2)
+        self.assertEqual([governor.is_due() for _ in range(4)], [True, True, False, False])
+        governor.frame_displayed()
+        self.assertEqual([governor.is_due() for _ in range(2)], [True, False])
+        ''' Frames lost by the window do not stop the display '''
+        governor.last_time -= PENDING_TIMEOUT
+        self.assertTrue(governor.is_due())
+        self.assertEqual(governor.get_summary(), 'displayed 4 of 7 frames')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# To run the test:
+# python -m test.test_frame_ring
+import time
+import queue
+import threading
+import unittest
+import numpy as np
+from src.utils.frame_ring import FrameRing, FrameSlot
+
+
+class TestFrameRing(unittest.TestCase):
+    def test_reference_counting(self):
+        ring = FrameRing(2, (4, 3))
+        first = ring.acquire()
+        first.retain() # e.g. a second consumer
+        second = ring.acquire()
+        self.assertEqual(len(ring.slots), 2)
+        first.release()
+        ''' Still referenced: not reused '''
+        self.assertIsNone(ring.acquire(timeout=0.01))
+        self.assertEqual(ring.stats['overruns'], 1)
+        first.release()
+        self.assertIs(ring.acquire(), first)
+        second.release()
+        first.release()
+        with self.assertRaises(AssertionError):
+            first.release()
+        self.assertTrue(ring.wait_until_released(timeout=0))
+        self.assertEqual(ring.stats['max_in_use'], 2)
+        ''' Unpooled frames are not recycled '''
+        FrameSlot.unpooled((4, 3)).release()
+
+    def test_producer_consumer(self):
+        ''' A slow consumer: the producer waits for released slots, no frame is overwritten before it is read '''
+        ring = FrameRing(4, (64, 64))
+        frames = queue.Queue()
+        read = []
+
+        def consume():
+            while True:
+                frame = frames.get()
+                if frame is None:
+                    break
+                time.sleep(0.002)
+                read.append(int(frame.data.max()) == int(frame.data.min()) == len(read))
+                frame.release()
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        for i in range(50):
+            frame = ring.acquire()
+            frame.data[:] = i
+            frames.put(frame)
+        frames.put(None)
+        consumer.join()
+        self.assertEqual(read, [True] * 50)
+        self.assertLessEqual(len(ring.slots), 4)
+        self.assertGreater(ring.stats['overruns'], 0)
+        self.assertTrue(ring.wait_until_released(timeout=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
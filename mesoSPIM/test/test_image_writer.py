@@ -0,0 +1,111 @@
+# To run the test:
+# python -m test.test_image_writer
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+import numpy as np
+import tifffile
+from PyQt5 import QtCore
+from src.mesoSPIM_State import mesoSPIM_StateSingleton
+from src.mesoSPIM_ImageWriter import mesoSPIM_ImageWriter
+from src.utils.acquisitions import Acquisition, AcquisitionList
+
+SHAPE = (64, 48) # (x_pixels, y_pixels): shape of the rotated frames handed to the writer
+N_FRAMES = 10
+
+
+class TestImageWriter(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        ''' Errors of the writer thread are queued signals '''
+        cls.app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        mesoSPIM_StateSingleton()['camera_binning'] = '1x1'
+        self.acq = Acquisition(z_start=0, z_end=N_FRAMES, z_step=1, folder=self.folder, filename='stack.raw')
+        self.acq_list = AcquisitionList([self.acq])
+        self.errors = []
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder)
+
+    def create_writer(self, async_writing=True, queue_depth=2, write_delay=0., fail_at=None):
+        cfg = SimpleNamespace(camera_parameters={'x_pixels': SHAPE[0], 'y_pixels': SHAPE[1], 'binning': '1x1'},
+                              writer_parameters={'async_writing': async_writing, 'queue_depth': queue_depth},
+                              pixelsize={self.acq['zoom']: 2.0})
+        writer = mesoSPIM_ImageWriter(SimpleNamespace(cfg=cfg))
+        writer.sig_writer_error.connect(self.errors.append)
+        write_plane = writer.write_plane
+
+        def slow_write_plane(image, acq, acq_list):
+            ''' A slow or failing disk '''
+            time.sleep(write_delay)
+            if writer.cur_image == fail_at:
+                raise OSError('No space left on device')
+            write_plane(image, acq, acq_list)
+        writer.write_plane = slow_write_plane
+        writer.prepare_acquisition(self.acq, self.acq_list)
+        return writer
+
+    def write_frames(self, writer, n_frames=N_FRAMES):
+        for i in range(n_frames):
+            frame = writer.acquire_frame(SHAPE)
+            frame.data[:] = i
+            writer.write_image(frame, self.acq, self.acq_list)
+
+    def read_frames(self):
+        return np.fromfile(os.path.join(self.folder, 'stack.raw'), dtype=np.uint16).reshape(-1, *SHAPE)
+
+    def test_backpressure_and_drain(self):
+        ''' The queue holds 2 frames: the camera thread waits for the slow writer, no frame is lost '''
+        writer = self.create_writer(write_delay=0.01)
+        self.write_frames(writer)
+        self.assertGreater(writer.writer_stats['blocked_puts'], 0)
+        writer.end_acquisition(self.acq, self.acq_list)
+        self.assertEqual(writer.frame_ring.get_n_in_use(), 0)
+        np.testing.assert_array_equal(self.read_frames()[:, 0, 0], np.arange(N_FRAMES))
+        self.assertEqual(self.errors, [])
+
+    def test_abort(self):
+        ''' Frames still queued are discarded and released, the file contains the frames written before '''
+        writer = self.create_writer(queue_depth=8, write_delay=0.05)
+        self.write_frames(writer)
+        writer.abort_writing()
+        self.assertEqual(writer.frame_ring.get_n_in_use(), 0)
+        frames = self.read_frames()
+        self.assertLess(len(frames), N_FRAMES)
+        np.testing.assert_array_equal(frames[:, 0, 0], np.arange(len(frames)))
+
+    def test_error(self):
+        ''' The first error is reported once, the following frames are discarded '''
+        for async_writing in (True, False):
+            self.errors.clear()
+            writer = self.create_writer(async_writing=async_writing, fail_at=3)
+            self.write_frames(writer)
+            writer.end_acquisition(self.acq, self.acq_list)
+            self.app.processEvents()
+            self.assertEqual(len(self.errors), 1)
+            self.assertIn('No space left on device', self.errors[0])
+            self.assertIsInstance(writer.writer_error, OSError)
+            self.assertEqual(writer.frame_ring.get_n_in_use(), 0)
+            np.testing.assert_array_equal(self.read_frames()[:, 0, 0], np.arange(3))
+
+    def test_projections(self):
+        ''' _MAX (XY), _MAX_XZ and _MAX_YZ projections are saved next to the stack, in the orientation of the written planes '''
+        self.acq['processing'] = 'MAX'
+        writer = self.create_writer()
+        self.write_frames(writer)
+        writer.end_acquisition(self.acq, self.acq_list)
+        stack = self.read_frames()
+        for suffix, axis in (('MAX', 0), ('MAX_XZ', 1), ('MAX_YZ', 2)):
+            projection = tifffile.imread(os.path.join(self.folder, f'stack_{suffix}.tiff'))
+            np.testing.assert_array_equal(projection, stack.max(axis=axis))
+        self.assertEqual(self.errors, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+# To run the test:
+# python -m test.test_omezarr_writer
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import zarr
+from src.utils.omezarr_writer import OMEZarrWriter, downsample_block, read_finished_views
+
+SHAPE = (37, 50, 70) # z is not a multiple of the chunk size
+
+
+class TestOMEZarrWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.path = self.folder + '/stack.zarr'
+        rng = np.random.default_rng(0)
+        self.stacks = [rng.integers(0, 4096, SHAPE, dtype=np.uint16) for _ in range(2)]
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder)
+
+    def write_views(self, writer, stacks, complete=True):
+        for tile, stack in enumerate(stacks):
+            writer.append_view(stack.shape, tile=tile)
+            for plane in stack:
+                writer.append_plane(plane)
+            if tile < len(stacks) - 1 or complete:
+                writer.close_view()
+        writer.close(complete=complete)
+
+    def test_round_trip(self):
+        writer = OMEZarrWriter(self.path, chunks=(8, 32, 32), n_levels=3)
+        self.write_views(writer, self.stacks)
+        root = zarr.open_group(self.path, mode='r')
+        for tile, stack in enumerate(self.stacks):
+            group = root[f'tile{tile}_ch0_illum0_angle0']
+            np.testing.assert_array_equal(group['0'][:], stack)
+            np.testing.assert_array_equal(group['1'][:], downsample_block(stack, (2, 2, 2)))
+            self.assertEqual(group['2'].shape, (10, 13, 18))
+            self.assertEqual(len(group.attrs['multiscales'][0]['datasets']), 3)
+        self.assertEqual(read_finished_views(self.path), ['tile0_ch0_illum0_angle0', 'tile1_ch0_illum0_angle0'])
+
+    def test_interrupted_and_resumed(self):
+        ''' An unfinished view is not listed, resuming keeps the finished views '''
+        self.write_views(OMEZarrWriter(self.path, chunks=(8, 32, 32), n_levels=2), self.stacks, complete=False)
+        self.assertEqual(read_finished_views(self.path), ['tile0_ch0_illum0_angle0'])
+        writer = OMEZarrWriter(self.path, chunks=(8, 32, 32), n_levels=2, resume=True)
+        writer.append_view(SHAPE, tile=1)
+        for plane in self.stacks[1]:
+            writer.append_plane(plane)
+        writer.close()
+        root = zarr.open_group(self.path, mode='r')
+        for tile, stack in enumerate(self.stacks):
+            np.testing.assert_array_equal(root[f'tile{tile}_ch0_illum0_angle0']['0'][:], stack)
+        self.assertEqual(len(read_finished_views(self.path)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# To run the test:
+# python -m test.test_parallel_bdv_writer
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+import h5py
+import numpy as np
+import npy2bdv
+from src.utils.parallel_bdv_writer import ParallelBdvWriter
+
+SHAPE = (6, 300, 280) # z, y, x: not a multiple of the chunk size
+WRITER_KWARGS = dict(ntiles=2, blockdim=((1, 128, 128),), subsamp=((1, 1, 1), (1, 2, 2)), compression='gzip')
+
+
+class TestParallelBdvWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.stacks = [rng.poisson(200, SHAPE).astype(np.uint16) for _ in range(2)]
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder)
+
+    def write_view(self, writer, stack, tile):
+        writer.append_view(stack=None, virtual_stack_dim=stack.shape, tile=tile)
+        for z, plane in enumerate(stack):
+            writer.append_plane(plane=plane, z=z, tile=tile)
+
+    def read_chunks(self, path):
+        ''' Compressed bytes of every chunk of every dataset '''
+        chunks = {}
+        with h5py.File(path, 'r') as file:
+            def visit(name, node):
+                if isinstance(node, h5py.Dataset) and name.endswith('cells'):
+                    for i in range(node.id.get_num_chunks()):
+                        offset = node.id.get_chunk_info(i).chunk_offset
+                        chunks[(name, offset)] = node.id.read_direct_chunk(offset)
+            file.visititems(visit)
+        return chunks
+
+    def test_identical_to_serial_writer(self):
+        paths = [os.path.join(self.folder, name) for name in ('serial.h5', 'parallel.h5')]
+        for path, writer in zip(paths, (npy2bdv.BdvWriter(paths[0], **WRITER_KWARGS),
+                                        ParallelBdvWriter(paths[1], n_workers=4, **WRITER_KWARGS))):
+            for tile, stack in enumerate(self.stacks):
+                self.write_view(writer, stack, tile)
+            writer.write_xml()
+            writer.close()
+        serial, parallel = (self.read_chunks(path) for path in paths)
+        self.assertEqual(len(serial), 2 * 6 * (3 * 3 + 2 * 2))
+        self.assertEqual(serial, parallel)
+
+    def test_resume(self):
+        ''' An interrupted file is reopened, its finished view is kept and the next view is appended '''
+        path = os.path.join(self.folder, 'stack.h5')
+        writer = ParallelBdvWriter(path, **WRITER_KWARGS)
+        self.write_view(writer, self.stacks[0], tile=0)
+        writer.close() # interrupted: no XML file
+        writer = ParallelBdvWriter(path, resume=True, **WRITER_KWARGS)
+        writer.append_existing_view(virtual_stack_dim=SHAPE, tile=0)
+        self.write_view(writer, self.stacks[1], tile=1)
+        writer.write_xml()
+        writer.close()
+        with h5py.File(path, 'r') as file:
+            for setup, stack in enumerate(self.stacks):
+                np.testing.assert_array_equal(file[f't00000/s{setup:02d}/0/cells'][:], stack.astype(np.int16))
+                self.assertEqual(file[f't00000/s{setup:02d}/1/cells'].shape, (6, 150, 140))
+            self.assertEqual(len(file['s00/subdivisions']), 2)
+        setups = ET.parse(os.path.splitext(path)[0] + '.xml').getroot().findall('.//ViewSetup')
+        self.assertEqual(len(setups), 2)
+        self.assertFalse(os.path.exists(path + '.partial'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# To run the test:
+# python -m test.test_projections
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import tifffile
+from src.utils.projections import StackProjector, get_projection_modes
+
+SHAPE = (12, 40, 30) # z, y, x
+
+
+class TestProjections(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.stack = np.random.default_rng(0).integers(0, 65535, SHAPE, dtype=np.uint16)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder)
+
+    def project(self, stack, modes=('MAX', 'MEAN')):
+        projector = StackProjector(SHAPE, modes)
+        for plane in stack:
+            projector.add_plane(plane)
+        return projector
+
+    def test_get_projection_modes(self):
+        self.assertEqual(get_projection_modes('MAX'), ('MAX',))
+        self.assertEqual(get_projection_modes('mean + MAX'), ('MAX', 'MEAN'))
+        self.assertEqual(get_projection_modes(''), ())
+        self.assertEqual(get_projection_modes('NONE'), ())
+
+    def test_projections(self):
+        projections = self.project(self.stack).get_projections()
+        np.testing.assert_array_equal(projections['MAX_XY'], self.stack.max(axis=0))
+        np.testing.assert_array_equal(projections['MAX_XZ'], self.stack.max(axis=1))
+        np.testing.assert_array_equal(projections['MAX_YZ'], self.stack.max(axis=2))
+        np.testing.assert_allclose(projections['MEAN_XY'], self.stack.mean(axis=0), rtol=1e-6)
+        np.testing.assert_allclose(projections['MEAN_XZ'], self.stack.mean(axis=1), rtol=1e-5)
+        np.testing.assert_allclose(projections['MEAN_YZ'], self.stack.mean(axis=2), rtol=1e-5)
+
+    def test_incomplete_stack(self):
+        ''' Projections of an aborted stack are cropped to the planes acquired, extra planes are ignored '''
+        projections = self.project(self.stack[:5]).get_projections()
+        self.assertEqual(projections['MAX_XZ'].shape, (5, SHAPE[2]))
+        np.testing.assert_array_equal(projections['MAX_YZ'], self.stack[:5].max(axis=2))
+        projector = self.project(np.concatenate([self.stack, self.stack[:2]]), ('MAX',))
+        self.assertEqual(projector.n_planes, SHAPE[0])
+
+    def test_save(self):
+        file_root = os.path.join(self.folder, 'stack')
+        paths = self.project(self.stack, ('MAX',)).save(file_root, pixel_size_um=2.0, z_step_um=-5.0)
+        self.assertEqual(paths, [file_root + '_MAX.tiff', file_root + '_MAX_XZ.tiff', file_root + '_MAX_YZ.tiff'])
+        for path, axis in zip(paths, (0, 1, 2)):
+            np.testing.assert_array_equal(tifffile.imread(path), self.stack.max(axis=axis))
+        with tifffile.TiffFile(paths[1]) as tif:
+            x_resolution, y_resolution = (tif.pages[0].tags[tag].value for tag in ('XResolution', 'YResolution'))
+        self.assertAlmostEqual(x_resolution[0] / x_resolution[1], 0.5)
+        self.assertAlmostEqual(y_resolution[0] / y_resolution[1], 0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
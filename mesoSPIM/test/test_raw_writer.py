@@ -0,0 +1,54 @@
+# To run the test:
+# python -m test.test_raw_writer
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from src.utils.raw_writer import RawWriter
+
+
+class TestRawWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'stack.raw')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder)
+
+    def write_and_read(self, shape, n_frames, n_written=None, **kwargs):
+        ''' Writes n_written frames of a stack of n_frames, returns the written and the read frames '''
+        n_written = n_frames if n_written is None else n_written
+        frames = (np.arange(n_written, dtype=np.uint16)[:, None, None] * 7
+                  + np.arange(np.prod(shape), dtype=np.uint16).reshape(shape))
+        writer = RawWriter(self.path, shape, n_frames, **kwargs)
+        for frame in frames:
+            writer.write(frame)
+        writer.close()
+        return frames, np.fromfile(self.path, dtype=np.uint16).reshape(-1, *shape)
+
+    def test_buffered(self):
+        frames, read = self.write_and_read((100, 120), 20)
+        np.testing.assert_array_equal(read, frames)
+
+    def test_direct_io_unaligned_frames(self):
+        ''' 1000x1000 uint16 frames are not a multiple of 4096 bytes: batches must not leave padding inside the file '''
+        frames, read = self.write_and_read((1000, 1000), 50, direct_io=True, batch_size_mb=4)
+        self.assertEqual(os.path.getsize(self.path), frames.nbytes)
+        np.testing.assert_array_equal(read, frames)
+
+    def test_direct_io_small_batches(self):
+        ''' Frames larger than the batch size, odd frame size '''
+        frames, read = self.write_and_read((1023, 1025), 5, direct_io=True, batch_size_mb=1)
+        np.testing.assert_array_equal(read, frames)
+
+    def test_aborted_stack(self):
+        ''' The preallocated file is truncated to the frames actually written '''
+        for direct_io in (False, True):
+            frames, read = self.write_and_read((300, 301), 20, n_written=7, direct_io=direct_io)
+            self.assertEqual(os.path.getsize(self.path), frames.nbytes)
+            np.testing.assert_array_equal(read, frames)
+
+
+if __name__ == '__main__':
+    unittest.main()
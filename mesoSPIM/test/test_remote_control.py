@@ -0,0 +1,105 @@
+# To run the test:
+# python -m test.test_remote_control
+import io
+import json
+import unittest
+import urllib.request
+import urllib.error
+import numpy as np
+from PyQt5 import QtCore
+from src.mesoSPIM_State import mesoSPIM_StateSingleton
+from src.mesoSPIM_RemoteControl import mesoSPIM_RemoteControl
+from src.utils.acquisitions import Acquisition, AcquisitionList
+
+
+class TestRemoteControl(unittest.TestCase):
+    def setUp(self) -> None:
+        self.state = mesoSPIM_StateSingleton()
+        self.state['state'] = 'idle'
+        self.state['acq_list'] = AcquisitionList([Acquisition(x_pos=1000, filename='a.raw'), Acquisition(x_pos=2000, filename='b.raw')])
+        self.remote_control = mesoSPIM_RemoteControl(port=0, token='secret', max_frame_size=100)
+        self.remote_control.start()
+        self.url = f'http://127.0.0.1:{self.remote_control.server.server_address[1]}'
+
+    def request(self, path, body=None, token='secret', headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = dict({'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}, **(headers or {}))
+        request = urllib.request.Request(self.url + path, data=data, headers=headers)
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.read(), response.headers
+
+    def test_requests(self):
+        status = json.loads(self.request('/status')[0])
+        self.assertEqual(status['state'], 'idle')
+        self.assertEqual(status['n_acquisitions'], 2)
+        acq_dicts = json.loads(self.request('/acquisition_list')[0])
+        self.assertEqual([acq['x_pos'] for acq in acq_dicts], [1000, 2000])
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.request('/status', token='wrong')
+        self.assertEqual(context.exception.code, 401)
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.request('/acquisition_list', [{'x_pos': 0, 'unknown_key': 1}])
+        self.assertEqual(context.exception.code, 400)
+
+    def test_post_requests(self):
+        ''' POST requests must be JSON and must not come from web pages of other sites '''
+        received = []
+        self.remote_control.sig_pause.connect(received.append, QtCore.Qt.DirectConnection) # emitted in the server thread
+        self.assertEqual(json.loads(self.request('/pause', {'paused': True})[0]), {'accepted': True})
+        self.request('/pause', {'paused': False}, headers={'Origin': 'http://localhost:8000'})
+        self.assertEqual(received, [True, False])
+        for headers, code in (({'Content-Type': 'text/plain'}, 415),
+                              ({'Content-Type': 'application/x-www-form-urlencoded'}, 415),
+                              ({'Origin': 'http://example.com'}, 403),
+                              ({'Origin': 'null'}, 403)):
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self.request('/pause', {'paused': True}, headers=headers)
+            self.assertEqual(context.exception.code, code)
+        self.assertEqual(received, [True, False])
+
+    def test_body_types(self):
+        ''' The acquisition list is sent as a JSON array, all other requests as JSON objects '''
+        for path, body in (('/start', [1]), ('/start', 1), ('/pause', 'paused'), ('/move_relative', []),
+                           ('/acquisition_list', {'x_pos': 0})):
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self.request(path, body)
+            self.assertEqual(context.exception.code, 400)
+
+    def test_host_requires_token(self):
+        with self.assertRaises(ValueError):
+            mesoSPIM_RemoteControl(host='0.0.0.0', port=0)
+        remote_control = mesoSPIM_RemoteControl(host='localhost', port=0)
+        remote_control.server.server_close()
+
+    def test_signals(self):
+        ''' Requests are passed on as signals, the table sent back is the same as the one read '''
+        received = []
+        self.remote_control.sig_acquisition_list.connect(received.append)
+        self.remote_control.sig_start.connect(received.append)
+        acq_dicts = json.loads(self.request('/acquisition_list')[0])
+        self.remote_control.handle_post('/acquisition_list', acq_dicts)
+        self.remote_control.handle_post('/start', {'resume': True})
+        self.assertEqual(received[0].get_column('x_pos').tolist(), [1000, 2000])
+        self.assertEqual(received[0][1]['filename'], 'b.raw')
+        self.assertIs(received[1], True)
+        self.state['state'] = 'run_acquisition_list'
+        with self.assertRaises(ValueError):
+            self.remote_control.handle_post('/start', {})
+        with self.assertRaises(ValueError):
+            self.remote_control.handle_post('/acquisition_list', acq_dicts)
+        self.assertEqual(len(received), 2)
+
+    def test_frame(self):
+        self.remote_control.set_frame(np.arange(1024 * 2048, dtype=np.uint16).reshape(1024, 2048))
+        data, headers = self.request('/frame')
+        self.assertEqual(headers['X-Frame-Number'], '1')
+        frame = np.load(io.BytesIO(data))
+        self.assertLessEqual(max(frame.shape), 100)
+        self.assertEqual(frame[1, 0], 21 * 2048)
+
+    def tearDown(self) -> None:
+        self.remote_control.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# To run the test:
+# python -m test.test_striping
+import os
+import shutil
+import tempfile
+import unittest
+from collections import namedtuple
+from unittest import mock
+from src.utils.acquisitions import Acquisition, AcquisitionList
+from src.utils.striping import (assign_target_folders, stripe_acquisition_list, write_manifest, read_manifest,
+                                get_manifest_path, get_existing_parent)
+
+DiskUsage = namedtuple('DiskUsage', ['total', 'used', 'free'])
+
+
+class TestStriping(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+        self.logical_folder = os.path.join(self.root, 'sample')
+        os.makedirs(self.logical_folder)
+        self.targets = [os.path.join(self.root, f'disk{i}') for i in range(3)]
+        for target in self.targets:
+            os.makedirs(target)
+        self.acq_list = AcquisitionList([Acquisition(z_start=0, z_end=10 * (i + 1), z_step=1, folder=self.logical_folder,
+                                                     filename=f'tile{i}.raw') for i in range(5)])
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root)
+
+    def test_round_robin(self):
+        targets = assign_target_folders(self.acq_list, self.targets, 'round_robin')
+        self.assertEqual(targets, [self.targets[i % 3] for i in range(5)])
+
+    def test_shared_file(self):
+        ''' All acquisitions of a .h5 file stay on the target of its first acquisition '''
+        for acq in self.acq_list[:3]:
+            acq['filename'] = 'stack.h5'
+        targets = assign_target_folders(self.acq_list, self.targets, 'round_robin')
+        self.assertEqual(targets, [self.targets[0]] * 3 + [self.targets[1], self.targets[2]])
+
+    def test_free_space(self):
+        ''' Every file goes to the target with the most free space left, after the files assigned before '''
+        free = {self.targets[0]: 1000, self.targets[1]: 800, self.targets[2]: 0}
+        with mock.patch('shutil.disk_usage', lambda folder: DiskUsage(0, 0, free[folder])):
+            targets = assign_target_folders(self.acq_list, self.targets, 'free_space', frame_bytes=10)
+        ''' Files of 100, 200, 300, 400 and 500 bytes '''
+        self.assertEqual(targets, [self.targets[i] for i in (0, 0, 1, 0, 1)])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(AssertionError):
+            assign_target_folders(self.acq_list, self.targets, 'random')
+
+    def test_folders_created_with_manifest(self):
+        ''' The physical folders are only created when the manifest is written, after the pre-flight checks '''
+        striped_list = stripe_acquisition_list(self.acq_list, self.targets)
+        physical_folders = [os.path.join(self.targets[i % 3], 'sample') for i in range(5)]
+        self.assertEqual([acq['folder'] for acq in striped_list], physical_folders)
+        self.assertEqual({acq['folder'] for acq in self.acq_list}, {self.logical_folder})
+        self.assertFalse(any(os.path.exists(folder) for folder in physical_folders))
+        self.assertEqual(get_existing_parent(physical_folders[0]), os.path.realpath(self.targets[0]))
+
+        path = write_manifest(self.acq_list, striped_list, 'round_robin')
+        self.assertEqual(path, get_manifest_path(self.acq_list))
+        self.assertTrue(all(os.path.isdir(folder) for folder in physical_folders))
+        manifest = read_manifest(path)
+        self.assertEqual(manifest['striping'], 'round_robin')
+        for i, entry in enumerate(manifest['acquisitions']):
+            self.assertEqual(entry['logical_folder'], self.logical_folder)
+            self.assertEqual(entry['path'], os.path.join(physical_folders[i], f'tile{i}.raw'))
+
+    def test_resume(self):
+        ''' A resumed list keeps the distribution of the manifest, even if the targets change '''
+        write_manifest(self.acq_list, stripe_acquisition_list(self.acq_list, self.targets), 'round_robin')
+        resumed_list = stripe_acquisition_list(self.acq_list, self.targets[::-1], resume=True)
+        self.assertEqual([acq['folder'] for acq in resumed_list],
+                         [os.path.join(self.targets[i % 3], 'sample') for i in range(5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
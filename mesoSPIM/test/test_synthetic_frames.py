@@ -0,0 +1,30 @@
+# To run the test:
+# python -m test.test_synthetic_frames
+import unittest
+import numpy as np
+from src.utils.synthetic_frames import SyntheticFrameSource
+
+
+class TestSyntheticFrames(unittest.TestCase):
+    def test_frames(self):
+        source = SyntheticFrameSource((200, 300), bit_depth=12, n_buffers=4, seed=1)
+        frames = [source.get_frame() for _ in range(5)]
+        self.assertEqual(frames[0].shape, (200, 300))
+        self.assertEqual(frames[0].dtype, np.uint16)
+        self.assertLessEqual(max(frame.max() for frame in frames), 4095)
+        ''' Moving structures: consecutive frames differ, also after a cycle of the buffers '''
+        self.assertFalse(np.array_equal(frames[0], frames[1]))
+        self.assertFalse(np.array_equal(frames[0], frames[4]))
+        out = np.empty((200, 300), dtype=np.uint16)
+        self.assertIs(source.get_frame(out=out), out)
+
+    def test_seed(self):
+        first, second = (SyntheticFrameSource((64, 64), n_buffers=2, seed=3) for _ in range(2))
+        for _ in range(3):
+            np.testing.assert_array_equal(first.get_frame(), second.get_frame())
+        other = SyntheticFrameSource((64, 64), n_buffers=2, seed=4)
+        self.assertFalse(np.array_equal(other.get_frame(), SyntheticFrameSource((64, 64), n_buffers=2, seed=3).get_frame()))
+
+
+if __name__ == '__main__':
+    unittest.main()
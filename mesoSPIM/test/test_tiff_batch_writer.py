@@ -0,0 +1,61 @@
+# To run the test:
+# python -m test.test_tiff_batch_writer
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import tifffile
+from src.utils.tiff_batch_writer import TiffBatchWriter
+
+SHAPE = (50, 70)
+N_FRAMES = 21 # not a multiple of the batch size
+
+
+class TestTiffBatchWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'stack.tif')
+        self.frames = np.random.default_rng(0).integers(0, 65535, (N_FRAMES,) + SHAPE, dtype=np.uint16)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder)
+
+    def write(self, frames, **kwargs):
+        writer = TiffBatchWriter(self.path, SHAPE, N_FRAMES, batch_size=4, **kwargs)
+        for frame in frames:
+            writer.write(frame)
+        writer.close()
+
+    def test_imagej(self):
+        self.write(self.frames, resolution=(2.0, 2.0), metadata={'spacing': 5, 'unit': 'um'})
+        with tifffile.TiffFile(self.path) as tif:
+            self.assertTrue(tif.is_imagej)
+            self.assertEqual(tif.imagej_metadata['spacing'], 5)
+            self.assertEqual(len(tif.pages), N_FRAMES)
+            np.testing.assert_array_equal(tif.asarray(), self.frames)
+
+    def test_bigtiff(self):
+        self.write(self.frames, bigtiff=True)
+        with tifffile.TiffFile(self.path) as tif:
+            self.assertTrue(tif.is_bigtiff)
+            np.testing.assert_array_equal(tif.asarray(), self.frames)
+
+    def test_incomplete_stack(self):
+        ''' An aborted stack keeps the written frames, the remaining frames are empty '''
+        self.write(self.frames[:6])
+        stack = tifffile.imread(self.path)
+        np.testing.assert_array_equal(stack[:6], self.frames[:6])
+        self.assertFalse(stack[6:].any())
+
+    def test_full_stack(self):
+        writer = TiffBatchWriter(self.path, SHAPE, 2)
+        writer.write(self.frames[0])
+        writer.write(self.frames[1])
+        with self.assertRaises(AssertionError):
+            writer.write(self.frames[2])
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
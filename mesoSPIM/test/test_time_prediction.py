@@ -0,0 +1,66 @@
+# To run the test:
+# python -m test.test_time_prediction
+import os
+import types
+import tempfile
+import unittest
+from src.utils.acquisitions import Acquisition, AcquisitionList
+from src.utils.time_prediction import AcquisitionTimePredictor
+
+cfg = types.SimpleNamespace(stage_parameters={'stage_type': 'DemoStage'},
+                            filterwheel_parameters={'filterwheel_type': 'Demo'})
+
+
+class TestTimePrediction(unittest.TestCase):
+    def setUp(self) -> None:
+        self.path = tempfile.mktemp(suffix='.json')
+        ''' Two rows of tiles with 100 planes, the second row with another filter '''
+        self.acq_list = AcquisitionList([Acquisition(x_pos=column * 2000, y_pos=row * 1000, z_start=0, z_end=1000, z_step=10,
+                                                     filter=('515LP', '561LP')[row], filename=f'{row}_{column}.raw')
+                                         for row in range(2) for column in range(5)])
+
+    def record(self, predictor, acq_list):
+        ''' Simulated hardware: 0.5 s + 1 s/mm per move, 3 s per filter change, 1.5 s per stack, 20 fps at nominal 10 fps '''
+        durations = []
+        for i, acq in enumerate(acq_list):
+            previous_acq = acq_list[i - 1] if i > 0 else None
+            phase_timing = {'move': 0., 'filter, zoom, laser': 0.2, 'camera preparation': 1., 'closing': 0.5}
+            if previous_acq is not None:
+                travel_mm = max(abs(acq['x_pos'] - previous_acq['x_pos']), abs(acq['y_pos'] - previous_acq['y_pos']),
+                                abs(acq['z_start'] - previous_acq['z_end'])) / 1000
+                phase_timing['move'] = 0.5 + travel_mm
+                phase_timing['filter, zoom, laser'] += 3. * (acq['filter'] != previous_acq['filter'])
+            acquire_s = acq.get_image_count() / 20
+            predictor.learn_acquisition(acq, previous_acq, phase_timing, acquire_s, framerate=10.)
+            durations.append(sum(phase_timing.values()) + acquire_s)
+        return durations
+
+    def test_learning(self):
+        predictor = AcquisitionTimePredictor(cfg, self.path, learning_rate=0.5)
+        for _ in range(5):
+            durations = self.record(predictor, self.acq_list)
+        predicted = predictor.predict(self.acq_list, framerate=10.)
+        ''' The move to the first acquisition is not predicted '''
+        self.assertAlmostEqual(predicted[0], durations[0], delta=0.05)
+        for prediction, duration in zip(predicted[1:], durations[1:]):
+            self.assertAlmostEqual(prediction, duration, delta=0.05)
+
+    def test_history(self):
+        predictor = AcquisitionTimePredictor(cfg, self.path)
+        untrained_prediction = predictor.predict(self.acq_list, framerate=10.).sum()
+        self.record(predictor, self.acq_list)
+        predictor.save()
+        loaded_predictor = AcquisitionTimePredictor(cfg, self.path)
+        self.assertEqual(loaded_predictor.predict(self.acq_list, 10.).sum(), predictor.predict(self.acq_list, 10.).sum())
+        self.assertNotEqual(loaded_predictor.predict(self.acq_list, 10.).sum(), untrained_prediction)
+        ''' Other hardware: not learned yet '''
+        other_cfg = types.SimpleNamespace(stage_parameters={'stage_type': 'TigerASI'}, filterwheel_parameters={'filterwheel_type': 'Demo'})
+        self.assertEqual(AcquisitionTimePredictor(other_cfg, self.path).predict(self.acq_list, 10.).sum(), untrained_prediction)
+
+    def tearDown(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
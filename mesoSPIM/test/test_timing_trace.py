@@ -0,0 +1,48 @@
+# To run the test:
+# python -m test.test_timing_trace
+import os
+import json
+import tempfile
+import threading
+import unittest
+from src.utils.timing_trace import TimingTrace
+
+
+class TestTimingTrace(unittest.TestCase):
+    def setUp(self) -> None:
+        self.trace = TimingTrace(max_events=10, enabled=True)
+        self.path = tempfile.mktemp(suffix='.json')
+
+    def test_chrome_trace_export(self):
+        with self.trace.span('move', 'core', filename='stack.raw'):
+            pass
+        thread = threading.Thread(target=lambda: self.trace.add_span('write', 'writer', 0., 0.001), name='writer thread')
+        thread.start()
+        thread.join()
+        self.trace.export(self.path)
+        with open(self.path) as file:
+            events = json.load(file)['traceEvents']
+        spans = {event['name']: event for event in events if event['ph'] == 'X'}
+        self.assertEqual(spans['move']['args'], {'filename': 'stack.raw'})
+        self.assertEqual(spans['write']['dur'], 1000.)
+        thread_names = {event['tid']: event['args']['name'] for event in events if event['ph'] == 'M'}
+        self.assertEqual(thread_names[spans['write']['tid']], 'writer thread')
+
+    def test_ring_buffer(self):
+        for i in range(25):
+            self.trace.add_span('snap', 'waveform', i, 0.5)
+        chrome_trace = self.trace.to_chrome_trace()
+        self.assertEqual(len([event for event in chrome_trace['traceEvents'] if event['ph'] == 'X']), 10)
+        self.assertEqual(chrome_trace['otherData']['spans_dropped'], 15)
+        self.assertEqual(self.trace.get_summary()[('waveform', 'snap')], [5., 10])
+        self.trace.enabled = False
+        self.trace.add_span('snap', 'waveform', 0, 0.5)
+        self.assertEqual(self.trace.n_recorded, 25)
+
+    def tearDown(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# To run the test:
+# python -m test.test_waveform_generator
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from PyQt5 import QtCore
+from src.mesoSPIM_State import mesoSPIM_StateSingleton
+
+''' The NI-DAQmx driver is replaced by mocks: the test checks how the tasks are configured.
+Only the nidaqmx modules are added, the modules imported with the waveform generator must stay loaded. '''
+nidaqmx = sys.modules.setdefault('nidaqmx', mock.MagicMock())
+for name in ('constants', 'types'):
+    sys.modules.setdefault(f'nidaqmx.{name}', getattr(nidaqmx, name))
+from src.mesoSPIM_WaveFormGenerator import mesoSPIM_WaveFormGenerator
+AcquisitionType, RegenerationMode = nidaqmx.constants.AcquisitionType, nidaqmx.constants.RegenerationMode
+
+SAMPLERATE, SWEEPTIME = 100000, 0.02
+SAMPLES = int(SAMPLERATE * SWEEPTIME)
+
+
+@unittest.skipUnless(isinstance(nidaqmx, mock.MagicMock), 'the NI-DAQmx driver was imported before the mocks')
+class TestWaveFormGenerator(unittest.TestCase):
+    def setUp(self) -> None:
+        self.state = mesoSPIM_StateSingleton()
+        self.state.set_parameters({'samplerate': SAMPLERATE, 'sweeptime': SWEEPTIME, 'camera_pulse_%': 10, 'camera_delay_%': 5})
+        nidaqmx.Task.side_effect = lambda: mock.MagicMock()
+        ''' Without __init__(), which reads the ETL configuration of the microscope '''
+        self.waveformer = mesoSPIM_WaveFormGenerator.__new__(mesoSPIM_WaveFormGenerator)
+        QtCore.QObject.__init__(self.waveformer)
+        self.waveformer.state = self.state
+        self.waveformer.cfg = SimpleNamespace(acquisition_hardware={'master_trigger_out_line': 'PXI6259/port0/line1',
+                                                                    'camera_trigger_source': '/PXI6259/PFI0',
+                                                                    'camera_trigger_out_line': '/PXI6259/ctr0',
+                                                                    'galvo_etl_task_line': 'PXI6259/ao0:3',
+                                                                    'galvo_etl_task_trigger_source': '/PXI6259/PFI0',
+                                                                    'laser_task_line': 'PXI6733/ao0:3',
+                                                                    'laser_task_trigger_source': '/PXI6259/PFI0'},
+                                              stage_parameters={'stage_type': 'DemoStage'})
+
+    def test_single_sweep(self):
+        self.waveformer.create_tasks()
+        camera_channel = self.waveformer.camera_trigger_task.co_channels.add_co_pulse_chan_time
+        camera_channel.assert_called_once_with('/PXI6259/ctr0', high_time=0.1 * SWEEPTIME, initial_delay=0.05 * SWEEPTIME)
+        self.waveformer.camera_trigger_task.timing.cfg_implicit_timing.assert_not_called()
+        for task in (self.waveformer.galvo_etl_task, self.waveformer.laser_task):
+            task.timing.cfg_samp_clk_timing.assert_called_once_with(rate=SAMPLERATE, sample_mode=AcquisitionType.FINITE,
+                                                                    samps_per_chan=SAMPLES)
+
+    def test_continuous_stack(self):
+        ''' One camera pulse per sweep for all planes, the analog outputs regenerate one sweep for the same duration '''
+        planes = 50
+        self.waveformer.create_tasks(planes=planes)
+        camera_task = self.waveformer.camera_trigger_task
+        camera_task.co_channels.add_co_pulse_chan_time.assert_called_once_with('/PXI6259/ctr0',
+                                                                               low_time=SWEEPTIME - 0.1 * SWEEPTIME,
+                                                                               high_time=0.1 * SWEEPTIME,
+                                                                               initial_delay=0.05 * SWEEPTIME)
+        camera_task.timing.cfg_implicit_timing.assert_called_once_with(sample_mode=AcquisitionType.FINITE, samps_per_chan=planes)
+        for task in (self.waveformer.galvo_etl_task, self.waveformer.laser_task):
+            task.timing.cfg_samp_clk_timing.assert_called_once_with(rate=SAMPLERATE, sample_mode=AcquisitionType.FINITE,
+                                                                    samps_per_chan=SAMPLES * planes)
+            self.assertEqual(task.out_stream.output_buf_size, SAMPLES)
+            self.assertIs(task.out_stream.regen_mode, RegenerationMode.ALLOW_REGENERATION)
+
+    def test_stage_trigger(self):
+        ''' TTL stage steps: a pulse train like the camera trigger '''
+        self.waveformer.cfg.stage_parameters = {'stage_type': 'TigerASI'}
+        self.waveformer.cfg.asi_parameters = {'stage_trigger_out_line': '/PXI6259/ctr1', 'stage_trigger_source': '/PXI6259/PFI0',
+                                              'stage_trigger_pulse_%': 20, 'stage_trigger_delay_%': 90}
+        self.waveformer.parent = SimpleNamespace(read_config_parameter=lambda key, dictionary: dictionary[key])
+        self.waveformer.create_tasks(planes=10)
+        stage_task = self.waveformer.stage_trigger_task
+        low_time = stage_task.co_channels.add_co_pulse_chan_time.call_args.kwargs['low_time']
+        self.assertAlmostEqual(low_time, 0.8 * SWEEPTIME)
+        stage_task.timing.cfg_implicit_timing.assert_called_once_with(sample_mode=AcquisitionType.FINITE, samps_per_chan=10)
+        stage_task.triggers.start_trigger.cfg_dig_edge_start_trig.assert_called_once_with('/PXI6259/PFI0')
+
+
+if __name__ == '__main__':
+    unittest.main()